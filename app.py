@@ -1,22 +1,54 @@
 from __future__ import annotations
 import os, json, re
-from datetime import date
-from typing import Optional, Dict, Any
+import asyncio
+import functools
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from typing import Optional, Dict, Any, List
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Body
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Body, Request, Response, Depends
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy import select, delete
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, update, func, exists, tuple_, and_, or_
+from sqlalchemy.orm import Session
 import io
 import csv
 
-from db.models import Base, make_engine, make_session, Entity, Payment, EvidenceItem, Alias, Identifier, ReviewMatch
+from db.models import Base, SQLITE_PRAGMAS, make_engine, make_async_engine, make_session, ensure_columns, ensure_indexes, pool_stats, Entity, Payment, EvidenceItem, Alias, Identifier, ReviewMatch, EntityValidation, ValidationJob
+from db.writer import WriteQueue
+from db.pagination import encode_cursor, decode_cursor, estimate_count
 from core.utils import normalize_name, normalize_address, safe_int, safe_float, best_effort_zip
+from core.normalize import NORMALIZER
 from scoring.engine import compute_scores
+from scoring.history import list_score_runs, top_movers, entity_score_history, latest_run_ids, run_city
 from services.matching import propose_match
-from services.records_requests import build_request
-from services.entity_networks import find_name_based_clusters
+from services.records_requests import (
+    LETTER_FORMATS, LETTER_MEDIA_TYPES, build_request, request_period, aliases_by_entity, request_batch_query,
+    create_request_drafts, stream_request_letters,
+)
+from services.entity_graph import SIGNALS, ensure_entity_graph, update_entity_graph, rebuild_entity_graph, list_networks
+from services.response_cache import ResponseCache, get_data_version, bump_data_version, make_etag, etag_matches
+from services.exports import EXPORT_KINDS, EXPORT_QUERIES, EXPORT_FORMATS, stream_export
+from services.graph_export import GRAPH_FORMATS, GRAPH_MEDIA_TYPES, GRAPH_EXTENSIONS, stream_network
+from services.lookup_cache import LOOKUP_CACHE, LOOKUP_KINDS
+from services.gazetteer import GAZETTEER, resolve_columns, load_address_points, gazetteer_coverage, check_entity_addresses
+from services.validation_runner import VALIDATION_SOURCE, VALIDATION_CONCURRENCY, risky_entities, validate_entities, store_validation_results
+from services.validation_jobs import (
+    RUNNING, PAUSED, VALIDATION_BATCH_SIZE, VALIDATION_FRESHNESS_DAYS, HEARTBEAT_STALE, create_validation_job,
+    claim_validation_job, orphaned_validation_jobs, next_validation_batch, record_validation_batch,
+    fail_validation_job, set_validation_job_status, list_validation_jobs, validation_scores, job_dict,
+)
+from services.network_metrics import METRIC_SORTS, metrics_stale, refresh_network_metrics, list_network_metrics
+from services.renormalize import renormalize_city, renormalize_address_points, ensure_name_keys
+from services.search import ensure_search_schema, index_entities, reindex_city, search_entities
+from services.tagging import update_payments
+from services.source_stats import ensure_source_stats, refresh_source_stats, sources_summary, category_summary
+from services.cleanup import count_matching_payments, duplicate_counts_by_source, delete_duplicate_payments
+from services.timeseries import refresh_payment_year_totals, entity_year_series, top_spikes
 from connectors.csv_seed import CSVSeedConnector
 
 # Use Railway's DATABASE_URL if available (PostgreSQL), otherwise fall back to SQLite
@@ -32,9 +64,31 @@ else:
     DB_URL = "sqlite:///./city_fraud_finder.db"
     print("🔌 Using SQLite (local development)")
 
+# Connection pool settings (ignored where the pool type has no such knob)
+POOL_SETTINGS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+    "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") not in ("0", "false", "False"),
+}
+
+# SQLite production profile (applied only to SQLite engines); defaults in db.models.SQLITE_PRAGMAS
+SQLITE_PRAGMA_SETTINGS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", SQLITE_PRAGMAS["journal_mode"]),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", SQLITE_PRAGMAS["synchronous"]),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(SQLITE_PRAGMAS["mmap_size"]))),
+    "cache_size": int(os.getenv("SQLITE_CACHE_SIZE", str(SQLITE_PRAGMAS["cache_size"]))),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT", str(SQLITE_PRAGMAS["busy_timeout"]))),
+    "temp_store": os.getenv("SQLITE_TEMP_STORE", SQLITE_PRAGMAS["temp_store"]),
+}
+
 try:
-    ENGINE = make_engine(DB_URL)
+    ENGINE = make_engine(DB_URL, sqlite_pragmas=SQLITE_PRAGMA_SETTINGS, **POOL_SETTINGS)
     Base.metadata.create_all(ENGINE)
+    ensure_columns(ENGINE)
+    ensure_indexes(ENGINE)
+    ensure_search_schema(ENGINE)
     print("✅ Database connection successful")
 except Exception as e:
     print(f"❌ DATABASE ERROR: {e}")
@@ -44,8 +98,40 @@ except Exception as e:
     if DB_URL.startswith("postgresql://"):
         print("⚠️ PostgreSQL failed, falling back to SQLite")
         DB_URL = "sqlite:///./city_fraud_finder.db"
-        ENGINE = make_engine(DB_URL)
+        ENGINE = make_engine(DB_URL, sqlite_pragmas=SQLITE_PRAGMA_SETTINGS, **POOL_SETTINGS)
         Base.metadata.create_all(ENGINE)
+        ensure_columns(ENGINE)
+        ensure_indexes(ENGINE)
+        ensure_search_schema(ENGINE)
+
+# Validation lookups (search, DNS, website, geocode) persist to the lookup_cache table
+LOOKUP_CACHE.bind(ENGINE)
+GAZETTEER.bind(ENGINE)
+
+# Backfill per-city source stats, name keys and the entity graph for databases created before those existed
+with make_session(ENGINE) as _session:
+    _keyed = ensure_name_keys(_session)
+    _rebuilt = ensure_entity_graph(_session)
+    # Graphs built before the name keys existed lack their edges
+    for _city_key in set(_keyed) - set(_rebuilt):
+        rebuild_entity_graph(_session, _city_key)
+    if ensure_source_stats(_session) + _keyed + _rebuilt:
+        _session.commit()
+
+# Optional async engine (aiosqlite/asyncpg) for read-only endpoints
+ASYNC_ENGINE = None
+if os.getenv("ASYNC_DB", "0") in ("1", "true", "True"):
+    ASYNC_ENGINE = make_async_engine(DB_URL, sqlite_pragmas=SQLITE_PRAGMA_SETTINGS, **POOL_SETTINGS)
+    print("⚡ Async reads enabled" if ASYNC_ENGINE is not None else "⚠️ ASYNC_DB set but no async driver installed, using sync reads")
+
+# Dedicated workers for heavy jobs, so they never starve the request threadpool
+HEAVY_EXECUTOR = ThreadPoolExecutor(max_workers=int(os.getenv("HEAVY_WORKERS", "2")), thread_name_prefix="heavy")
+
+# SQLite has a single writer: serialize bulk writes through one queue instead of
+# letting them fight over the lock (on by default for SQLite, off elsewhere)
+WRITE_QUEUE = None
+if os.getenv("SINGLE_WRITER", "1" if ENGINE.dialect.name == "sqlite" else "0") in ("1", "true", "True"):
+    WRITE_QUEUE = WriteQueue()
 
 def load_city_config() -> Dict[str, Any]:
     with open("city_config.json", "r", encoding="utf-8") as f:
@@ -53,18 +139,121 @@ def load_city_config() -> Dict[str, Any]:
 
 CITY_CONFIG = load_city_config()
 
+# How many score runs (snapshots) to keep per city
+SCORE_HISTORY_RETENTION = int(os.getenv("SCORE_HISTORY_RETENTION", "30"))
+
+# In-process cache of read-heavy responses, keyed on the city's data version
+RESPONSE_CACHE = ResponseCache(maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "256")))
+
 app = FastAPI(title="City Fraud Finder", version="0.1.0")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
+def get_db():
+    """Request-scoped ORM session, always closed (and its connection returned) afterwards."""
+    session = make_session(ENGINE)
+    try:
+        yield session
+    finally:
+        session.close()
+
+def _read_sync(fn, *args):
+    with ENGINE.connect() as conn:
+        return fn(conn, *args)
+
+async def run_read(fn, *args):
+    """Run fn(conn, *args) for a read-only endpoint on a Core connection.
+
+    With the async engine enabled the queries go through the async driver
+    (run_sync) and never occupy a worker thread; otherwise they run on a sync
+    connection in the threadpool, as a plain `def` endpoint would.
+    """
+    if ASYNC_ENGINE is not None:
+        async with ASYNC_ENGINE.connect() as conn:
+            return await conn.run_sync(fn, *args)
+    return await run_in_threadpool(_read_sync, fn, *args)
+
+async def run_heavy(fn, *args):
+    """Run blocking/CPU-heavy work (ingest, matching, scoring, clustering) on HEAVY_EXECUTOR."""
+    return await asyncio.get_running_loop().run_in_executor(HEAVY_EXECUTOR, functools.partial(fn, *args))
+
+async def run_write(fn, *args):
+    """Run a bulk write job through the single-writer queue, or HEAVY_EXECUTOR if it is disabled."""
+    if WRITE_QUEUE is not None:
+        return await WRITE_QUEUE.run(fn, *args)
+    return await run_heavy(fn, *args)
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    # Let queued writes finish before the process exits
+    if WRITE_QUEUE is not None:
+        WRITE_QUEUE.shutdown(wait=True)
+    HEAVY_EXECUTOR.shutdown(wait=False)
+
 @app.get("/", response_class=HTMLResponse)
 def home():
     with open("static/index.html", "r", encoding="utf-8") as f:
         return f.read()
 
+@app.get("/meta/cache")
+def meta_cache():
+    """Response cache hit/miss counters for this worker"""
+    return RESPONSE_CACHE.stats()
+
+@app.get("/meta/lookup-cache")
+def meta_lookup_cache():
+    """Validation lookup cache: per-kind hit/miss counters for this worker and stored entry counts"""
+    return LOOKUP_CACHE.stats()
+
+@app.post("/meta/lookup-cache/purge")
+def meta_lookup_cache_purge(kind: Optional[str] = None, expired_only: bool = True):
+    """Delete expired validation lookups (or, with expired_only=false, every entry), optionally of one kind"""
+    if kind and kind not in LOOKUP_KINDS:
+        raise HTTPException(400, f"kind must be one of: {', '.join(LOOKUP_KINDS)}")
+    return {"deleted": LOOKUP_CACHE.purge(kind, expired_only)}
+
+@app.get("/meta/normalize")
+def meta_normalize():
+    """Active address normalization profile and the name/address memo counters for this worker"""
+    return {"profile": NORMALIZER.profile, "memo": NORMALIZER.cache_info()}
+
+@app.get("/meta/pool")
+def meta_pool():
+    """Connection pool usage (and single-writer queue depth) for this worker"""
+    stats = pool_stats(ENGINE)
+    if WRITE_QUEUE is not None:
+        stats["write_queue"] = WRITE_QUEUE.stats()
+    return stats
+
 @app.get("/meta/cities")
 def meta_cities():
     return {"cities": [{"city_key": k, "display_name": v.get("display_name", k)} for k, v in CITY_CONFIG.items()]}
 
+def cached_json(request: Request, session, city_key: str, build) -> Response:
+    """Serve a read endpoint through the versioned response cache.
+
+    `build()` returns (payload, extra_headers) and only runs on a cache miss.
+    Clients that send back the ETag in If-None-Match get a 304 while the
+    city's data version is unchanged.
+    """
+    version = get_data_version(session, city_key)
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())), version)
+    etag = make_etag(key)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    cached = RESPONSE_CACHE.get(key)
+    state = "hit"
+    if cached is None:
+        payload, headers = build()
+        body = json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+        cached = (body.encode("utf-8"), headers)
+        RESPONSE_CACHE.put(key, cached)
+        state = "miss"
+    body, headers = cached
+    return Response(
+        content=body, media_type="application/json",
+        headers={**headers, "ETag": etag, "Cache-Control": "no-cache", "X-Cache": state}
+    )
+
 def get_city_cfg(city_key: str) -> Dict[str, Any]:
     if city_key not in CITY_CONFIG:
         raise HTTPException(404, f"Unknown city_key: {city_key}")
@@ -137,13 +326,17 @@ def upsert_entity(session, city_key: str, entity_type: str, name: str, address:
     return ent
 
 @app.post("/ingest/configured")
-def ingest_configured(city_key: str = "boston_ma"):
+async def ingest_configured(city_key: str = "boston_ma", session: Session = Depends(get_db)):
+    return await run_write(_ingest_configured, session, city_key)
+
+def _ingest_configured(session, city_key: str):
     try:
         city_cfg = get_city_cfg(city_key)
         connectors = city_cfg.get("connectors", {})
 
-        session = make_session(ENGINE)
         added_entities = added_payments = added_evidence = review_queue = 0
+        paid_entity_ids = set()
+        touched_entity_ids = set()
 
         for cname, cfg in connectors.items():
             ctype = cfg.get("type")
@@ -165,6 +358,7 @@ def ingest_configured(city_key: str = "boston_ma"):
                             npi=r.get("npi"),
                             id_source=cname
                         )
+                        touched_entity_ids.add(ent.id)
                         added_entities += 1
                         session.add(EvidenceItem(
                             entity_id=ent.id,
@@ -180,7 +374,9 @@ def ingest_configured(city_key: str = "boston_ma"):
                 if ctype == "usaspending":
                     try:
                         from connectors.usaspending import USAspendingConnector
-                        rows = USAspendingConnector().fetch(city_key, cfg)
+                        # Runs on a heavy-executor thread (no event loop), so drive the
+                        # concurrent per-keyword fetch with asyncio.run
+                        rows = asyncio.run(USAspendingConnector().fetch_async(city_key, cfg))
                         for r in rows:
                             cand_name = r.get("name")
                             if not cand_name:
@@ -190,6 +386,7 @@ def ingest_configured(city_key: str = "boston_ma"):
                                 ent = upsert_entity(session, city_key, "other", cand_name, None, None, None, None)
                                 add_alias(session, ent.id, cand_name, source="usaspending")
                                 ent_id = ent.id
+                                touched_entity_ids.add(ent_id)
                                 added_entities += 1
 
                             session.add(Payment(
@@ -206,6 +403,7 @@ def ingest_configured(city_key: str = "boston_ma"):
                                 raw_json=json.dumps(r.get("raw", {}))[:200000]
                             ))
                             added_payments += 1
+                            paid_entity_ids.add(ent_id)
                             session.add(EvidenceItem(
                                 entity_id=ent_id,
                                 evidence_type="payment",
@@ -241,6 +439,15 @@ def ingest_configured(city_key: str = "boston_ma"):
                 print(traceback.format_exc())
                 continue
 
+        session.flush()
+        if paid_entity_ids:
+            refresh_payment_year_totals(session, city_key, paid_entity_ids)
+            refresh_source_stats(session, city_key, payment_sources=["usaspending"], tags=[None], data_sources=["usa-spending"])
+        if added_evidence:
+            refresh_source_stats(session, city_key, evidence_sources=list(connectors) + ["usaspending"])
+        index_entities(session, touched_entity_ids)
+        update_entity_graph(session, city_key, touched_entity_ids)
+        bump_data_version(session, city_key)
         session.commit()
         return {"city_key": city_key, "added_entities_estimate": added_entities, "added_payments": added_payments, "added_evidence": added_evidence, "review_queue_added": review_queue}
     except Exception as e:
@@ -249,63 +456,165 @@ def ingest_configured(city_key: str = "boston_ma"):
         raise HTTPException(status_code=500, detail=error_msg)
 
 @app.post("/score/recompute")
-def score_recompute(city_key: str = "boston_ma"):
-    session = make_session(ENGINE)
-    updated = compute_scores(session, city_key)
-    return {"city_key": city_key, "updated": updated}
+async def score_recompute(city_key: str = "boston_ma", session: Session = Depends(get_db)):
+    return await run_write(_score_recompute, session, city_key)
+
+def _score_recompute(session, city_key: str):
+    bump_data_version(session, city_key)
+    updated = compute_scores(session, city_key, retain_runs=SCORE_HISTORY_RETENTION)
+    run_ids = latest_run_ids(session, city_key, 1)
+    return {"city_key": city_key, "updated": updated, "run_id": run_ids[0] if run_ids else None}
+
+@app.get("/score/runs")
+async def score_runs(city_key: str = "boston_ma", limit: int = 20):
+    """Recent score runs (newest first)"""
+    return await run_read(lambda conn: {"city_key": city_key, "runs": list_score_runs(conn, city_key, limit)})
+
+@app.get("/score/movers")
+async def score_movers(city_key: str = "boston_ma", run_a: Optional[int] = None, run_b: Optional[int] = None, direction: str = "abs", limit: int = 50):
+    """Entities whose score moved the most between two runs (defaults to the last two)"""
+    if direction not in ("abs", "up", "down"):
+        raise HTTPException(400, "direction must be abs, up or down")
+    def read(conn):
+        a, b = run_a, run_b
+        if a is None or b is None:
+            recent = latest_run_ids(conn, city_key, 2)
+            if len(recent) < 2:
+                raise HTTPException(400, "Need at least two score runs to compare")
+            b = b if b is not None else recent[0]
+            a = a if a is not None else recent[1]
+        for rid in (a, b):
+            if run_city(conn, rid) != city_key:
+                raise HTTPException(404, f"Score run {rid} not found for {city_key}")
+        return {"city_key": city_key, "run_a": a, "run_b": b, "movers": top_movers(conn, a, b, limit, direction)}
+    return await run_read(read)
 
 @app.get("/entities")
-def list_entities(city_key: str = "boston_ma", entity_type: Optional[str] = None, payment_tag: Optional[str] = None, data_source: Optional[str] = None, limit: int = 200):
-    session = make_session(ENGINE)
-    q = select(Entity).where(Entity.city_key == city_key)
+async def list_entities(
+    request: Request,
+    city_key: str = "boston_ma",
+    entity_type: Optional[str] = None,
+    payment_tag: Optional[str] = None,
+    data_source: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=5000),
+    cursor: Optional[str] = None,
+    include_total: bool = False
+):
+    """Entities ordered by score (desc), paged by a (score, id) keyset cursor.
+
+    The cursor for the next page is returned in the X-Next-Cursor header; pass it
+    back as `cursor`. With include_total=true, X-Total-Count carries the number of
+    matching entities (X-Total-Count-Estimated says whether it is a planner estimate).
+    """
+    try:
+        after = decode_cursor(cursor, 2, (float, int))
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    return await run_read(lambda conn: cached_json(request, conn, city_key, lambda: _entity_page(
+        conn, city_key, entity_type, payment_tag, data_source, limit, after, include_total
+    )))
+
+def _entity_page(session, city_key: str, entity_type: Optional[str], payment_tag: Optional[str], data_source: Optional[str], limit: int, after, include_total: bool):
+    headers: Dict[str, str] = {}
+    pay_filters = []
+    if payment_tag:
+        pay_filters.append(Payment.tag == payment_tag)
+    if data_source:
+        pay_filters.append(Payment.data_source == data_source)
+
+    # Per-row aggregate: only evaluated for the entities on this page
+    total_amount = (
+        select(func.coalesce(func.sum(Payment.amount), 0.0))
+        .where(Payment.entity_id == Entity.id, *pay_filters)
+        .correlate(Entity)
+        .scalar_subquery()
+    )
+    q = select(
+        Entity.id, Entity.name, Entity.entity_type, Entity.address,
+        Entity.score, Entity.score_notes, total_amount.label("total_public_amount"),
+        EntityValidation.validation_score
+    ).outerjoin(EntityValidation, EntityValidation.entity_id == Entity.id).where(Entity.city_key == city_key)
     if entity_type:
         q = q.where(Entity.entity_type == entity_type)
-    
     # If filtering by payment tag or data_source, only include entities that have matching payments
-    if payment_tag or data_source:
-        payment_filter = select(Payment.entity_id).distinct()
-        if payment_tag:
-            payment_filter = payment_filter.where(Payment.tag == payment_tag)
-        if data_source:
-            payment_filter = payment_filter.where(Payment.data_source == data_source)
-        # Join with entities to filter by city_key
-        payment_filter = payment_filter.join(Entity).where(Entity.city_key == city_key)
-        entity_ids = session.execute(payment_filter).scalars().all()
-        if entity_ids:
-            q = q.where(Entity.id.in_(entity_ids))
-        else:
-            # No matching payments, return empty list
-            return []
-    
-    q = q.order_by(Entity.score.desc()).limit(limit)
-    ents = session.execute(q).scalars().all()
-    out = []
-    for e in ents:
-        payments = e.payments
-        if payment_tag:
-            payments = [p for p in payments if p.tag == payment_tag]
-        if data_source:
-            payments = [p for p in payments if p.data_source == data_source]
-        total = sum(p.amount for p in payments)
-        out.append({
-            "id": e.id,
-            "name": e.name,
-            "type": e.entity_type,
-            "address": e.address,
-            "score": float(e.score or 0.0),
-            "notes": e.score_notes or "",
-            "total_public_amount": float(total)
-        })
-    return out
+    if pay_filters:
+        q = q.where(exists().where(Payment.entity_id == Entity.id, *pay_filters))
+
+    if include_total:
+        total, estimated = estimate_count(session, q)
+        headers["X-Total-Count"] = str(total)
+        headers["X-Total-Count-Estimated"] = "true" if estimated else "false"
+
+    if after:
+        q = q.where(tuple_(Entity.score, Entity.id) < tuple_(float(after[0]), int(after[1])))
+
+    rows = session.execute(q.order_by(Entity.score.desc(), Entity.id.desc()).limit(limit + 1)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = encode_cursor([rows[-1].score, rows[-1].id])
+    return [
+        {
+            "id": r.id,
+            "name": r.name,
+            "type": r.entity_type,
+            "address": r.address,
+            "score": float(r.score or 0.0),
+            "notes": r.score_notes or "",
+            "total_public_amount": float(r.total_public_amount or 0.0),
+            "validation_score": float(r.validation_score) if r.validation_score is not None else None
+        }
+        for r in rows
+    ], headers
+
+@app.get("/search")
+async def search(q: str = Query(..., min_length=1), city_key: str = "boston_ma", limit: int = Query(20, ge=1, le=200)):
+    """Search entities by name/alias (prefix and typo-tolerant), identifier or address"""
+    return await run_read(lambda conn: {"query": q, "results": search_entities(conn, city_key, q, limit)})
+
+@app.post("/search/reindex")
+async def search_reindex(city_key: str = "boston_ma", session: Session = Depends(get_db)):
+    """Rebuild the search index for every entity in a city"""
+    def work():
+        indexed = reindex_city(session, city_key)
+        session.commit()
+        return {"city_key": city_key, "indexed": indexed}
+    return await run_write(work)
+
+@app.post("/normalize/renormalize")
+async def renormalize(city_key: str = "boston_ma", dry_run: bool = False, address_points: bool = False,
+                      session: Session = Depends(get_db)):
+    """Recompute stored normalized names/addresses/aliases with the active profile (run after changing it).
+
+    Changes that would collide with another entity's key are skipped and
+    reported; duplicate aliases are dropped. `address_points` also
+    renormalizes the gazetteer.
+    """
+    def work():
+        result = renormalize_city(session, city_key, dry_run=dry_run)
+        if address_points:
+            result["address_points_changed"] = renormalize_address_points(session, dry_run=dry_run)
+        if dry_run:
+            session.rollback()
+            return result
+        if result["entity_ids"]:
+            session.flush()
+            index_entities(session, result["entity_ids"])
+            update_entity_graph(session, city_key, result["entity_ids"])
+            bump_data_version(session, city_key)
+        session.commit()
+        if address_points:
+            GAZETTEER.invalidate()
+        return result
+    return await run_write(work)
 
 @app.get("/entities/{entity_id}")
-def entity_detail(entity_id: int):
-    session = make_session(ENGINE)
+def entity_detail(entity_id: int, session: Session = Depends(get_db)):
     e = session.execute(select(Entity).where(Entity.id == entity_id)).scalar_one_or_none()
     if not e:
         raise HTTPException(404, "Not found")
     pays = session.execute(select(Payment).where(Payment.entity_id == entity_id).order_by(Payment.amount.desc())).scalars().all()
     evs = session.execute(select(EvidenceItem).where(EvidenceItem.entity_id == entity_id).order_by(EvidenceItem.created_at.desc())).scalars().all()
+    val = session.get(EntityValidation, entity_id)
     total = sum(p.amount for p in pays)
     
     return {
@@ -323,51 +632,450 @@ def entity_detail(entity_id: int):
         "score": float(e.score or 0.0),
         "score_notes": e.score_notes or "",
         "total_public_amount": float(total),
+        "validation": {
+            "validation_score": float(val.validation_score),
+            "red_flags": json.loads(val.red_flags or "[]"),
+            "validated_at": val.validated_at.isoformat() if val.validated_at else None,
+        } if val else None,
         "payments": [{"source": p.source, "fiscal_year": p.fiscal_year, "amount": float(p.amount or 0.0), "payer": p.payer, "program": p.program} for p in pays],
         "evidence": [{"evidence_type": ev.evidence_type, "source": ev.source, "confidence": float(ev.confidence or 0.0), "title": ev.title, "url": ev.url} for ev in evs]
     }
 
+@app.get("/entities/{entity_id}/timeseries")
+async def entity_timeseries(entity_id: int):
+    """Yearly payment totals for one entity (from the fiscal-year aggregate table)"""
+    def read(conn):
+        e = conn.execute(select(Entity.id, Entity.name).where(Entity.id == entity_id)).one_or_none()
+        if not e:
+            raise HTTPException(404, "Not found")
+        return {"entity_id": e.id, "name": e.name, "series": entity_year_series(conn, entity_id)}
+    return await run_read(read)
+
+@app.get("/entities/{entity_id}/score-history")
+async def entity_score_history_view(entity_id: int, limit: int = 50):
+    """Score and rule hits for one entity across recent runs"""
+    return await run_read(lambda conn: {"entity_id": entity_id, "history": entity_score_history(conn, entity_id, limit)})
+
+@app.get("/timeseries/spikes")
+async def timeseries_spikes(city_key: str = "boston_ma", limit: int = 50):
+    """Entities with the largest year-over-year payment jumps"""
+    return await run_read(lambda conn: {"city_key": city_key, "spikes": top_spikes(conn, city_key, limit=limit)})
+
+@app.post("/timeseries/rebuild")
+async def timeseries_rebuild(city_key: str = "boston_ma", session: Session = Depends(get_db)):
+    """Rebuild the fiscal-year aggregate table for a city from its payments"""
+    def work():
+        rows = refresh_payment_year_totals(session, city_key)
+        bump_data_version(session, city_key)
+        session.commit()
+        return {"city_key": city_key, "rows": rows}
+    return await run_write(work)
+
+@app.post("/stats/rebuild")
+async def stats_rebuild(city_key: str = "boston_ma", session: Session = Depends(get_db)):
+    """Recompute the per-city source/tag statistics from payments and evidence"""
+    def work():
+        refresh_source_stats(session, city_key, full=True)
+        bump_data_version(session, city_key)
+        session.commit()
+        return {"city_key": city_key, "status": "rebuilt"}
+    return await run_write(work)
+
 @app.get("/records-request/{entity_id}")
-def records_request(entity_id: int, city_key: str = "boston_ma", years_back: int = 2):
-    session = make_session(ENGINE)
+def records_request(entity_id: int, city_key: str = "boston_ma", years_back: int = 2, session: Session = Depends(get_db)):
     city_cfg = get_city_cfg(city_key)
     e = session.execute(select(Entity).where(Entity.id == entity_id)).scalar_one_or_none()
     if not e:
         raise HTTPException(404, "Not found")
-    als = session.execute(select(Alias).where(Alias.entity_id == entity_id)).scalars().all()
-    alias_str = ", ".join(a.alias for a in als) if als else ""
-    end = date.today().isoformat()
-    start = date(date.today().year - years_back, 1, 1).isoformat()
+    alias_str = ", ".join(aliases_by_entity(session, [entity_id]).get(entity_id, ()))
+    start, end = request_period(years_back)
     return {"text": build_request(city_cfg.get("display_name", city_key), e.name, alias_str, start, end)}
 
+@app.post("/records-request/batch")
+async def records_request_batch(
+    city_key: str = "boston_ma",
+    format: str = "zip",
+    entity_type: Optional[str] = None,
+    min_score: Optional[float] = None,
+    component_id: Optional[int] = None,
+    min_network_size: Optional[int] = Query(None, ge=2),
+    limit: int = Query(500, ge=1, le=5000),
+    years_back: int = 2,
+    session: Session = Depends(get_db),
+):
+    """Draft records requests for the top-scored entities matching the filters.
+
+    Every letter is saved as a FOIARequest draft, then the batch is streamed as
+    a ZIP (one .txt per letter plus manifest.csv) or, with format=txt, as one
+    document with a page break between letters.
+    """
+    if format not in LETTER_FORMATS:
+        raise HTTPException(400, f"format must be one of {', '.join(LETTER_FORMATS)}")
+    city_display = get_city_cfg(city_key).get("display_name", city_key)
+    stmt = request_batch_query(city_key, entity_type, min_score, component_id, min_network_size, limit)
+    def work():
+        ids = create_request_drafts(session, city_key, city_display, stmt, years_back)
+        session.commit()
+        return ids
+    draft_ids = await run_write(work)
+    if not draft_ids:
+        raise HTTPException(404, "No entities match")
+    return StreamingResponse(
+        stream_request_letters(ENGINE, draft_ids, format),
+        media_type=LETTER_MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{city_key}_records_requests.{format}"',
+            "X-Draft-Count": str(len(draft_ids)),
+        }
+    )
+
+@app.post("/validation/batch")
+async def validation_batch(
+    city_key: str = "boston_ma",
+    limit: int = Query(100, ge=1, le=5000),
+    entity_type: Optional[str] = None,
+    search_web: bool = True,
+    concurrency: int = Query(VALIDATION_CONCURRENCY, ge=1, le=64),
+    session: Session = Depends(get_db),
+):
+    """Validate the city's highest-scored entities concurrently and store the results as evidence.
+
+    Lookups run on the event loop under per-host rate limits, so a large
+    batch takes a while but does not tie up worker threads or the writer.
+    """
+    entities = await run_read(risky_entities, city_key, limit, entity_type)
+    batch = await validate_entities(entities, search_web=search_web, concurrency=concurrency)
+    outcomes = batch["outcomes"]
+    def work():
+        stored = store_validation_results(session, city_key, outcomes)
+        if stored:
+            refresh_source_stats(session, city_key, evidence_sources=[VALIDATION_SOURCE])
+            bump_data_version(session, city_key)
+        session.commit()
+        return stored
+    stored = await run_write(work)
+    scores = [o["score"] for o in outcomes if "error" not in o]
+    return {
+        "city_key": city_key,
+        "validated": stored,
+        "errors": [{"entity_id": o["entity_id"], "error": o["error"]} for o in outcomes if "error" in o],
+        "avg_score": round(sum(scores) / len(scores), 2) if scores else None,
+        "flagged": sum(1 for s in scores if s < 50),
+        "http": batch["http"],
+    }
+
+# Background validation jobs run as tasks on this worker's event loop; WORKER_ID marks the ones it owns
+WORKER_ID = uuid.uuid4().hex
+VALIDATION_TASKS: Dict[int, asyncio.Task] = {}
+VALIDATION_WATCHDOG: Optional[asyncio.Task] = None
+
+def _job_write(fn, *args):
+    with make_session(ENGINE) as session:
+        result = fn(session, *args)
+        session.commit()
+        return result
+
+def _touch_validation_job(session, job_id: int):
+    return claim_validation_job(session, job_id, WORKER_ID)
+
+def _record_validation_batch(session, job_id: int, outcomes, skipped: int, cursor):
+    job = record_validation_batch(session, job_id, WORKER_ID, outcomes, skipped, cursor)
+    if job is not None and (outcomes or skipped):
+        if job["validated"]:
+            refresh_source_stats(session, job["city_key"], evidence_sources=[VALIDATION_SOURCE])
+        bump_data_version(session, job["city_key"])
+    return job
+
+async def _run_validation_job(job_id: int):
+    """Claim, validate and checkpoint batches until the job is done, paused or taken over."""
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(HEARTBEAT_STALE.total_seconds() / 3)
+            await run_write(_job_write, _touch_validation_job, job_id)
+    try:
+        while True:
+            batch = await run_write(_job_write, next_validation_batch, job_id, WORKER_ID)
+            if batch is None:
+                return
+            job = batch["job"]
+            ticker = asyncio.create_task(heartbeat())
+            try:
+                result = await validate_entities(batch["entities"], search_web=job["search_web"], concurrency=job["concurrency"])
+            finally:
+                ticker.cancel()
+            if await run_write(_job_write, _record_validation_batch, job_id, result["outcomes"], batch["skipped"], batch["cursor"]) is None:
+                return
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        import traceback
+        print(f"Validation job {job_id} failed: {e}")
+        await run_write(_job_write, fail_validation_job, job_id, WORKER_ID, f"{e}\n{traceback.format_exc()}")
+
+def _start_validation_job(job_id: int):
+    if job_id in VALIDATION_TASKS:
+        return
+    task = asyncio.get_running_loop().create_task(_run_validation_job(job_id))
+    VALIDATION_TASKS[job_id] = task
+    task.add_done_callback(lambda _t: VALIDATION_TASKS.pop(job_id, None))
+
+async def _adopt_orphaned_validation_jobs():
+    """Resume running jobs whose worker died (crash, restart), checking again periodically."""
+    while True:
+        for job_id in await run_read(orphaned_validation_jobs):
+            if job_id not in VALIDATION_TASKS and await run_write(_job_write, claim_validation_job, job_id, WORKER_ID):
+                _start_validation_job(job_id)
+        await asyncio.sleep(HEARTBEAT_STALE.total_seconds() / 2)
+
+@app.on_event("startup")
+async def start_validation_watchdog():
+    global VALIDATION_WATCHDOG
+    VALIDATION_WATCHDOG = asyncio.get_running_loop().create_task(_adopt_orphaned_validation_jobs())
+
+@app.on_event("shutdown")
+def release_validation_jobs():
+    # Hand running jobs back right away so the next start resumes them without waiting for a stale heartbeat
+    if VALIDATION_WATCHDOG is not None:
+        VALIDATION_WATCHDOG.cancel()
+    for task in list(VALIDATION_TASKS.values()):
+        task.cancel()
+    with make_session(ENGINE) as session:
+        session.execute(
+            update(ValidationJob).where(ValidationJob.owner == WORKER_ID, ValidationJob.status.in_((RUNNING, PAUSED)))
+            .values(owner=None, heartbeat_at=None).execution_options(synchronize_session=False)
+        )
+        session.commit()
+
+@app.post("/validation/jobs")
+async def validation_job_create(
+    city_key: str = "boston_ma",
+    entity_type: Optional[str] = None,
+    max_entities: Optional[int] = Query(None, ge=1),
+    batch_size: int = Query(VALIDATION_BATCH_SIZE, ge=1, le=1000),
+    concurrency: int = Query(VALIDATION_CONCURRENCY, ge=1, le=64),
+    freshness_days: int = Query(VALIDATION_FRESHNESS_DAYS, ge=0),
+    search_web: bool = True,
+):
+    """Start a background job validating the city's entities, highest score first.
+
+    Progress is checkpointed after every batch; entities validated within
+    `freshness_days` are skipped. Poll GET /validation/jobs/{id}.
+    """
+    def create(session):
+        return job_dict(create_validation_job(session, city_key, entity_type, max_entities, batch_size, concurrency,
+                                              freshness_days, search_web, owner=WORKER_ID))
+    job = await run_write(_job_write, create)
+    _start_validation_job(job["id"])
+    return job
+
+@app.get("/validation/jobs")
+def validation_jobs(city_key: str = "boston_ma", limit: int = Query(20, ge=1, le=200), session: Session = Depends(get_db)):
+    """Recent validation jobs (newest first)"""
+    return {"city_key": city_key, "jobs": list_validation_jobs(session, city_key, limit)}
+
+@app.get("/validation/jobs/{job_id}")
+def validation_job(job_id: int, session: Session = Depends(get_db)):
+    job = session.get(ValidationJob, job_id)
+    if job is None:
+        raise HTTPException(404, "Not found")
+    return {**job_dict(job), "active_here": job_id in VALIDATION_TASKS}
+
+@app.post("/validation/jobs/{job_id}/pause")
+async def validation_job_pause(job_id: int):
+    """Stop a running job once its current batch is recorded; resume continues from the checkpoint"""
+    job = await run_write(_job_write, set_validation_job_status, job_id, PAUSED)
+    if job is None:
+        raise HTTPException(404, "Not found")
+    return job
+
+@app.post("/validation/jobs/{job_id}/resume")
+async def validation_job_resume(job_id: int):
+    """Restart a paused or failed job from its last checkpoint"""
+    def resume(session, job_id):
+        job = set_validation_job_status(session, job_id, RUNNING)
+        if job is not None and job["status"] == RUNNING:
+            claim_validation_job(session, job_id, WORKER_ID)
+        return job
+    job = await run_write(_job_write, resume, job_id)
+    if job is None:
+        raise HTTPException(404, "Not found")
+    if job["status"] == RUNNING:
+        _start_validation_job(job_id)
+    return job
+
+@app.get("/validation/scores")
+async def validation_score_list(
+    city_key: str = "boston_ma",
+    max_score: Optional[float] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+):
+    """Stored validation scores, lowest first; pass `next_cursor` back as `cursor` for the following page"""
+    try:
+        after = decode_cursor(cursor, 2, (float, int))
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    def read(conn):
+        rows = validation_scores(conn, city_key, max_score, limit, after)
+        last = rows[-1] if len(rows) == limit else None
+        return {"city_key": city_key, "results": rows,
+                "next_cursor": encode_cursor([last["validation_score"], last["entity_id"]]) if last else None}
+    return await run_read(read)
+
+@app.post("/gazetteer/upload")
+async def gazetteer_upload(
+    file: UploadFile = File(...),
+    source: str = Form(default=""),
+    number_column: str = Form(default=""),
+    street_column: str = Form(default=""),
+    address_column: str = Form(default=""),
+    unit_column: str = Form(default=""),
+    city_column: str = Form(default=""),
+    state_column: str = Form(default=""),
+    zip_column: str = Form(default=""),
+    lat_column: str = Form(default=""),
+    lon_column: str = Form(default=""),
+    cmra_column: str = Form(default=""),
+    replace: bool = Form(default=True),
+    session: Session = Depends(get_db)
+):
+    """Load an address points CSV into the offline gazetteer used by address validation.
+
+    Columns are detected from common header names (including OSM addr:* tags)
+    unless mapped explicitly. Loading a source again replaces its points.
+    """
+    contents = await file.read()
+    text = contents.decode('utf-8-sig')
+    reader = csv.DictReader(io.StringIO(text))
+    overrides = {"number": number_column, "street": street_column, "address": address_column, "unit": unit_column,
+                 "city": city_column, "state": state_column, "zip": zip_column, "lat": lat_column,
+                 "lon": lon_column, "cmra": cmra_column}
+    try:
+        columns = resolve_columns(reader.fieldnames, overrides)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    name = source or file.filename
+    def work():
+        counts = load_address_points(session, reader, columns, name, replace)
+        session.commit()
+        zips, cities = gazetteer_coverage(session)
+        return {"source": name, "columns": columns, **counts, "zips": len(zips), "cities": len(cities)}
+    result = await run_write(work)
+    GAZETTEER.invalidate()
+    return result
+
+@app.get("/gazetteer/check")
+async def gazetteer_check(city_key: str = "boston_ma", entity_type: Optional[str] = None, limit: int = Query(200, ge=1, le=5000)):
+    """Check every entity address against the offline gazetteer: non-existent numbers/streets and mail drops"""
+    return await run_read(check_entity_addresses, city_key, entity_type, limit)
+
 @app.get("/entity-networks")
-def entity_networks(city_key: str = "boston_ma", entity_type: Optional[str] = None):
-    """Find clusters of connected entities (same names, addresses, etc.)"""
-    session = make_session(ENGINE)
-    clusters = find_name_based_clusters(session, city_key, entity_type)
-    return {"clusters": clusters, "cluster_count": len(clusters)}
+async def entity_networks(
+    request: Request,
+    city_key: str = "boston_ma",
+    entity_type: Optional[str] = None,
+    signal: Optional[str] = None,
+    min_size: int = Query(2, ge=2),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+):
+    """Clusters of connected entities (shared names, addresses, identifiers...), largest first.
+
+    Read from the persisted entity graph. `signal` keeps clusters with at
+    least one edge of that kind; pass `next_cursor` back as `cursor` for the
+    following page.
+    """
+    if signal and signal not in SIGNALS:
+        raise HTTPException(400, f"signal must be one of: {', '.join(SIGNALS)}")
+    try:
+        after = decode_cursor(cursor, 2, (int, int))
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    def read(conn):
+        def build():
+            clusters, last, total = list_networks(conn, city_key, entity_type, signal, min_size, limit, after)
+            return {"clusters": clusters, "cluster_count": total, "next_cursor": encode_cursor(last) if last else None}, {}
+        return cached_json(request, conn, city_key, build)
+    return await run_read(read)
+
+@app.post("/entity-networks/rebuild")
+async def entity_networks_rebuild(city_key: str = "boston_ma", session: Session = Depends(get_db)):
+    """Recompute the entity graph (keys, edges, components) for a city"""
+    def work():
+        counts = rebuild_entity_graph(session, city_key)
+        bump_data_version(session, city_key)
+        session.commit()
+        return {"city_key": city_key, **counts}
+    return await run_write(work)
+
+@app.get("/entity-networks/export")
+def entity_networks_export(
+    city_key: str = "boston_ma",
+    format: str = "graphml",
+    entity_type: Optional[str] = None,
+    component_id: Optional[int] = None,
+    signal: Optional[str] = None,
+    gzip: bool = False,
+):
+    """Stream the entity graph as a CSV edge list, GraphML or GEXF (optionally gzipped).
+
+    `entity_type` keeps nodes of that type and the edges between them;
+    `component_id` keeps one network; `signal` filters edges only.
+    """
+    if format not in GRAPH_FORMATS:
+        raise HTTPException(400, f"format must be one of {', '.join(GRAPH_FORMATS)}")
+    if signal and signal not in SIGNALS:
+        raise HTTPException(400, f"signal must be one of: {', '.join(SIGNALS)}")
+    filename = f"{city_key}_network" + (f"_{component_id}" if component_id is not None else "") + f".{GRAPH_EXTENSIONS[format]}"
+    media_type = GRAPH_MEDIA_TYPES[format]
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        stream_network(ENGINE, city_key, format, entity_type, component_id, signal, gzip_output=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/entity-networks/metrics")
+async def entity_networks_metrics(
+    request: Request,
+    city_key: str = "boston_ma",
+    sort: str = "total_dollars",
+    min_size: int = Query(2, ge=1),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    session: Session = Depends(get_db),
+):
+    """Per-network size, total dollars, average score and centrality hotspots, ranked by `sort`.
+
+    Metrics are stored per data version: the first request after a write
+    recomputes them, later ones read the stored rows.
+    """
+    if sort not in METRIC_SORTS:
+        raise HTTPException(400, f"sort must be one of: {', '.join(METRIC_SORTS)}")
+    if await run_read(metrics_stale, city_key):
+        def work():
+            # Another request may have refreshed while this one was queued
+            if metrics_stale(session, city_key):
+                refresh_network_metrics(session, city_key)
+                session.commit()
+        await run_write(work)
+    def read(conn):
+        def build():
+            return list_network_metrics(conn, city_key, sort, min_size, limit, offset), {}
+        return cached_json(request, conn, city_key, build)
+    return await run_read(read)
 
 @app.get("/payments/categories")
-def list_payment_categories(city_key: str = "boston_ma"):
+async def list_payment_categories(request: Request, city_key: str = "boston_ma"):
     """List all data sources and tags used in payments"""
-    session = make_session(ENGINE)
-    from sqlalchemy import distinct, func
-    data_sources = session.execute(
-        select(distinct(Payment.data_source))
-        .join(Entity).where(Entity.city_key == city_key)
-        .where(Payment.data_source.isnot(None), Payment.data_source != "")
-    ).scalars().all()
-    tags = session.execute(
-        select(distinct(Payment.tag))
-        .join(Entity).where(Entity.city_key == city_key)
-        .where(Payment.tag.isnot(None), Payment.tag != "")
-    ).scalars().all()
-    return {"data_sources": [d for d in data_sources if d], "tags": [t for t in tags if t]}
+    return await run_read(lambda conn: cached_json(request, conn, city_key, lambda: (category_summary(conn, city_key), {})))
 
 @app.get("/payments/tags")
-def list_payment_tags(city_key: str = "boston_ma"):
+async def list_payment_tags(request: Request, city_key: str = "boston_ma"):
     """List all tags used in payments (deprecated, use /payments/categories)"""
-    return list_payment_categories(city_key)
+    return await list_payment_categories(request, city_key)
 
 class TagPaymentsRequest(BaseModel):
     payment_ids: str
@@ -375,30 +1083,56 @@ class TagPaymentsRequest(BaseModel):
     city_key: str = "boston_ma"
 
 @app.post("/payments/tag")
-def tag_payments(req: TagPaymentsRequest):
+async def tag_payments(req: TagPaymentsRequest, session: Session = Depends(get_db)):
     """Tag multiple payments (comma-separated IDs)"""
-    session = make_session(ENGINE)
     ids = [int(i.strip()) for i in req.payment_ids.split(",") if i.strip()]
     if not ids:
         raise HTTPException(400, "No payment IDs provided")
-    
-    payments = session.execute(
-        select(Payment).where(Payment.id.in_(ids))
-        .join(Entity).where(Entity.city_key == req.city_key)
-    ).scalars().all()
-    
-    updated = 0
-    for p in payments:
-        p.tag = req.tag.strip() if req.tag.strip() else None
-        updated += 1
-    
+    return await run_write(_tag_payments, session, req, ids)
+
+def _tag_payments(session, req: TagPaymentsRequest, ids: List[int]):
+    updated = update_payments(session, req.city_key, {"tag": req.tag.strip() or None}, payment_ids=ids)
+    if updated:
+        bump_data_version(session, req.city_key)
     session.commit()
     return {"updated": updated, "tag": req.tag}
 
+class TagByFilterRequest(BaseModel):
+    city_key: str = "boston_ma"
+    tag: Optional[str] = None
+    category: Optional[str] = None
+    source: Optional[str] = None
+    data_source: Optional[str] = None
+    fiscal_year: Optional[str] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    entity_type: Optional[str] = None
+
+@app.post("/payments/tag-by-filter")
+async def tag_payments_by_filter(req: TagByFilterRequest, session: Session = Depends(get_db)):
+    """Set tag and/or category on every payment in the city matching the filters"""
+    values = {}
+    if req.tag is not None:
+        values["tag"] = req.tag.strip() or None
+    if req.category is not None:
+        values["category"] = req.category
+    if not values:
+        raise HTTPException(400, "Provide tag and/or category")
+    filters = {k: getattr(req, k) for k in ("source", "data_source", "fiscal_year", "min_amount", "max_amount", "entity_type")}
+    if all(v is None for v in filters.values()):
+        raise HTTPException(400, "Provide at least one filter (source, data_source, fiscal_year, min_amount, max_amount, entity_type)")
+
+    def work():
+        updated = update_payments(session, req.city_key, values, **filters)
+        if updated:
+            bump_data_version(session, req.city_key)
+        session.commit()
+        return {"updated": updated, **values}
+    return await run_write(work)
+
 @app.get("/payments/recent")
-def recent_payments(city_key: str = "boston_ma", limit: int = 20, category: Optional[str] = None):
+def recent_payments(city_key: str = "boston_ma", limit: int = 20, category: Optional[str] = None, session: Session = Depends(get_db)):
     """Get recent payments for tagging"""
-    session = make_session(ENGINE)
     q = select(Payment).join(Entity).where(Entity.city_key == city_key)
     if category:
         q = q.where(Payment.category == category)
@@ -422,155 +1156,120 @@ def recent_payments(city_key: str = "boston_ma", limit: int = 20, category: Opti
     }
 
 @app.get("/payments/by-source")
-def payments_by_source(city_key: str = "boston_ma"):
+async def payments_by_source(request: Request, city_key: str = "boston_ma"):
     """Get all sources (payments and evidence items) grouped by source"""
-    session = make_session(ENGINE)
-    from sqlalchemy import func
-    
-    # Get payment sources
-    payment_results = session.execute(
-        select(Payment.source, func.count(Payment.id).label("count"), func.min(Payment.created_at).label("first_created"))
-        .join(Entity).where(Entity.city_key == city_key)
-        .group_by(Payment.source)
-    ).all()
-    
-    # Get evidence item sources (entity uploads)
-    evidence_results = session.execute(
-        select(EvidenceItem.source, func.count(EvidenceItem.id).label("count"), func.min(EvidenceItem.created_at).label("first_created"))
-        .join(Entity).where(Entity.city_key == city_key)
-        .where(EvidenceItem.source.like("uploaded_%"))
-        .group_by(EvidenceItem.source)
-    ).all()
-    
-    # Combine both types
-    all_sources = {}
-    
-    for r in payment_results:
-        source = r.source
-        if source not in all_sources:
-            all_sources[source] = {
-                "source": source,
-                "count": 0,
-                "first_created": r.first_created
-            }
-        all_sources[source]["count"] += r.count
-        if r.first_created and (not all_sources[source]["first_created"] or r.first_created < all_sources[source]["first_created"]):
-            all_sources[source]["first_created"] = r.first_created
-    
-    for r in evidence_results:
-        source = r.source
-        if source not in all_sources:
-            all_sources[source] = {
-                "source": source,
-                "count": 0,
-                "first_created": r.first_created
-            }
-        all_sources[source]["count"] += r.count
-        if r.first_created and (not all_sources[source]["first_created"] or r.first_created < all_sources[source]["first_created"]):
-            all_sources[source]["first_created"] = r.first_created
-    
-    # Sort by first created date
-    sources_list = sorted(all_sources.values(), key=lambda x: x["first_created"] if x["first_created"] else "")
-    
-    return {
-        "sources": [
-            {
-                "source": s["source"],
-                "count": s["count"],
-                "first_created": s["first_created"].isoformat() if s["first_created"] else None
-            }
-            for s in sources_list
-        ]
-    }
+    return await run_read(lambda conn: cached_json(request, conn, city_key, lambda: (sources_summary(conn, city_key), {})))
 
 @app.post("/payments/set-tag")
-def set_payment_tag(source: str = Form(...), tag: str = Form(...), city_key: str = Form("boston_ma")):
+async def set_payment_tag(source: str = Form(...), tag: str = Form(...), city_key: str = Form("boston_ma"), session: Session = Depends(get_db)):
     """Set tag for all payments from a source"""
-    session = make_session(ENGINE)
-    
-    # Update payments
-    payments = session.execute(
-        select(Payment)
-        .join(Entity).where(Entity.city_key == city_key)
-        .where(Payment.source == source)
-    ).scalars().all()
-    
-    updated = 0
-    tag_value = tag.strip() if tag.strip() else None
-    for p in payments:
-        p.tag = tag_value
-        updated += 1
-    
+    return await run_write(_set_payment_tag, session, source, tag, city_key)
+
+def _set_payment_tag(session, source: str, tag: str, city_key: str):
+    updated = update_payments(session, city_key, {"tag": tag.strip() or None}, source=source)
+    if updated:
+        bump_data_version(session, city_key)
     session.commit()
     return {"updated": updated, "source": source, "tag": tag}
 
 @app.post("/payments/set-category")
-def set_payment_category(source: str = Form(...), category: str = Form(...), city_key: str = Form("boston_ma")):
+async def set_payment_category(source: str = Form(...), category: str = Form(...), city_key: str = Form("boston_ma"), session: Session = Depends(get_db)):
     """Set category for all payments from a source"""
-    session = make_session(ENGINE)
-    payments = session.execute(
-        select(Payment)
-        .join(Entity).where(Entity.city_key == city_key)
-        .where(Payment.source == source)
-    ).scalars().all()
-    
-    updated = 0
-    for p in payments:
-        p.category = category
-        updated += 1
-    
+    return await run_write(_set_payment_category, session, source, category, city_key)
+
+def _set_payment_category(session, source: str, category: str, city_key: str):
+    updated = update_payments(session, city_key, {"category": category}, source=source)
+    if updated:
+        bump_data_version(session, city_key)
     session.commit()
     return {"updated": updated, "source": source, "category": category}
 
 @app.post("/cleanup/duplicate-payments")
-def cleanup_duplicate_payments(source_pattern: str = "EEC", city_key: str = "boston_ma"):
-    """Remove duplicate payments from a source (keeps earliest copy of each unique payment)"""
-    session = make_session(ENGINE)
-    
-    # Find all payments matching source pattern, ordered by ID (earliest first)
-    payments = session.execute(
-        select(Payment).where(Payment.source.like(f"%{source_pattern}%"))
-        .order_by(Payment.id.asc())
-    ).scalars().all()
-    
-    # Group by entity_id, amount, fiscal_year to find duplicates
-    # Keep first occurrence, delete rest
-    seen = set()
-    to_delete = []
-    
-    for p in payments:
-        # Create key from entity, amount, and fiscal year
-        key = (p.entity_id, round(float(p.amount or 0), 2), p.fiscal_year or "")
-        if key in seen:
-            to_delete.append(p.id)
-        else:
-            seen.add(key)
-    
-    # Delete duplicate payments
-    deleted_payments = 0
-    if to_delete:
-        # Delete the duplicate payments
-        result = session.execute(
-            delete(Payment).where(Payment.id.in_(to_delete))
-        )
-        deleted_payments = result.rowcount if result.rowcount else len(to_delete)
-        session.commit()
-    
-    return {"deleted": deleted_payments, "remaining": len(payments) - deleted_payments, "total_found": len(payments)}
+async def cleanup_duplicate_payments(source_pattern: str = "EEC", city_key: str = "boston_ma", dry_run: bool = False, session: Session = Depends(get_db)):
+    """Remove duplicate payments from a source (keeps earliest copy of each unique payment).
+
+    With dry_run=true nothing is deleted; the response lists per-source counts
+    of the payment and evidence rows that would be removed.
+    """
+    def preview():
+        by_source = duplicate_counts_by_source(session, city_key, source_pattern)
+        return {
+            "dry_run": True,
+            "total_found": count_matching_payments(session, city_key, source_pattern),
+            "would_delete": sum(r["duplicate_payments"] for r in by_source),
+            "would_delete_evidence": sum(r["duplicate_evidence"] for r in by_source),
+            "by_source": by_source,
+        }
+
+    def work():
+        total = count_matching_payments(session, city_key, source_pattern)
+        result = delete_duplicate_payments(session, city_key, source_pattern)
+        return {**result, "remaining": total - result["deleted"], "total_found": total}
+
+    if dry_run:
+        return await run_heavy(preview)
+    return await run_write(work)
+
+@app.get("/export/{kind}")
+def export_data(kind: str, city_key: str = "boston_ma", format: str = "csv", gzip: bool = False, entity_type: Optional[str] = None):
+    """Stream a full-city dump of entities, payments or evidence as CSV or NDJSON (optionally gzipped)"""
+    if kind not in EXPORT_KINDS:
+        raise HTTPException(404, f"Unknown export: {kind}; expected one of {', '.join(EXPORT_KINDS)}")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(400, f"format must be one of {', '.join(EXPORT_FORMATS)}")
+    stmt = EXPORT_QUERIES[kind](city_key, entity_type)
+    filename = f"{city_key}_{kind}.{format}"
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    if gzip:
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        stream_export(ENGINE, stmt, format, gzip_output=gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 @app.get("/review-queue")
-def review_queue_list(city_key: str = "boston_ma", limit: int = 100):
-    session = make_session(ENGINE)
-    matches = session.execute(
-        select(ReviewMatch)
+async def review_queue_list(city_key: str = "boston_ma", limit: int = Query(100, ge=1, le=1000), cursor: Optional[str] = None, candidate_name: Optional[str] = None):
+    """Unresolved matches, lowest confidence first, paged by a keyset cursor.
+
+    Ordered by (confidence asc, created_at desc, id desc); pass `next_cursor`
+    back as `cursor` for the following page.
+    """
+    q = (
+        select(
+            ReviewMatch.id, ReviewMatch.candidate_name, ReviewMatch.candidate_address, ReviewMatch.candidate_source,
+            ReviewMatch.confidence, ReviewMatch.reason, ReviewMatch.created_at, ReviewMatch.entity_id,
+            Entity.name.label("entity_name"), Entity.address.label("entity_address"), Entity.entity_type
+        )
+        .outerjoin(Entity, Entity.id == ReviewMatch.entity_id)
         .where(ReviewMatch.city_key == city_key, ReviewMatch.resolved == False)
-        .order_by(ReviewMatch.confidence.asc(), ReviewMatch.created_at.desc())
-        .limit(limit)
-    ).scalars().all()
-    
+    )
+    if candidate_name:
+        q = q.where(ReviewMatch.candidate_name == candidate_name)
+
+    try:
+        after = decode_cursor(cursor, 3, (float, datetime, int))
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    if after:
+        conf, created, last_id = after
+        q = q.where(or_(
+            ReviewMatch.confidence > conf,
+            and_(ReviewMatch.confidence == conf, ReviewMatch.created_at < created),
+            and_(ReviewMatch.confidence == conf, ReviewMatch.created_at == created, ReviewMatch.id < last_id),
+        ))
+
+    q = q.order_by(ReviewMatch.confidence.asc(), ReviewMatch.created_at.desc(), ReviewMatch.id.desc()).limit(limit + 1)
+    rows = await run_read(lambda conn: conn.execute(q).all())
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last.confidence, last.created_at.isoformat(), last.id])
+
     out = []
-    for m in matches:
-        entity = session.execute(select(Entity).where(Entity.id == m.entity_id)).scalar_one_or_none() if m.entity_id else None
+    for m in rows:
         out.append({
             "id": m.id,
             "candidate_name": m.candidate_name,
@@ -580,15 +1279,76 @@ def review_queue_list(city_key: str = "boston_ma", limit: int = 100):
             "reason": m.reason or "",
             "created_at": m.created_at.isoformat() if m.created_at else None,
             "entity_id": m.entity_id,
-            "entity_name": entity.name if entity else None,
-            "entity_address": entity.address if entity else None,
-            "entity_type": entity.entity_type if entity else None
+            "entity_name": m.entity_name,
+            "entity_address": m.entity_address,
+            "entity_type": m.entity_type
         })
-    return {"matches": out}
+    return {"matches": out, "next_cursor": next_cursor}
+
+@app.get("/review-queue/groups")
+async def review_queue_groups(city_key: str = "boston_ma", limit: int = Query(100, ge=1, le=1000), offset: int = Query(0, ge=0)):
+    """Unresolved matches grouped by identical candidate_name, largest groups first"""
+    n = func.count(ReviewMatch.id).label("match_count")
+    q = (
+        select(
+            ReviewMatch.candidate_name, n,
+            func.count(func.distinct(ReviewMatch.entity_id)).label("entity_count"),
+            func.min(ReviewMatch.confidence).label("min_confidence"),
+            func.max(ReviewMatch.confidence).label("max_confidence"),
+        )
+        .where(ReviewMatch.city_key == city_key, ReviewMatch.resolved == False)
+        .group_by(ReviewMatch.candidate_name)
+        .order_by(n.desc(), ReviewMatch.candidate_name)
+        .limit(limit).offset(offset)
+    )
+    rows = await run_read(lambda conn: conn.execute(q).all())
+    return {"groups": [
+        {
+            "candidate_name": r.candidate_name,
+            "match_count": int(r.match_count),
+            "entity_count": int(r.entity_count),
+            "min_confidence": float(r.min_confidence or 0.0),
+            "max_confidence": float(r.max_confidence or 0.0)
+        }
+        for r in rows
+    ]}
+
+class BulkReviewRequest(BaseModel):
+    city_key: str = "boston_ma"
+    match_ids: List[int] = []
+    candidate_name: Optional[str] = None
+
+def resolve_review_matches(session, req: BulkReviewRequest, resolution: str) -> int:
+    """Resolve many open matches with a single UPDATE; returns the number resolved."""
+    if not req.match_ids and not req.candidate_name:
+        raise HTTPException(400, "Provide match_ids or candidate_name")
+    selectors = []
+    if req.match_ids:
+        selectors.append(ReviewMatch.id.in_(req.match_ids))
+    if req.candidate_name:
+        selectors.append(ReviewMatch.candidate_name == req.candidate_name)
+    result = session.execute(
+        update(ReviewMatch)
+        .where(ReviewMatch.city_key == req.city_key, ReviewMatch.resolved == False, or_(*selectors))
+        .values(resolved=True, resolution=resolution)
+        .execution_options(synchronize_session=False)
+    )
+    bump_data_version(session, req.city_key)
+    session.commit()
+    return result.rowcount or 0
+
+@app.post("/review-queue/bulk/approve")
+def review_queue_bulk_approve(req: BulkReviewRequest, session: Session = Depends(get_db)):
+    """Approve all listed matches (and/or every open match for a candidate_name)"""
+    return {"status": "approved", "updated": resolve_review_matches(session, req, "approved")}
+
+@app.post("/review-queue/bulk/reject")
+def review_queue_bulk_reject(req: BulkReviewRequest, session: Session = Depends(get_db)):
+    """Reject all listed matches (and/or every open match for a candidate_name)"""
+    return {"status": "rejected", "updated": resolve_review_matches(session, req, "rejected")}
 
 @app.post("/review-queue/{match_id}/approve")
-def review_queue_approve(match_id: int):
-    session = make_session(ENGINE)
+def review_queue_approve(match_id: int, session: Session = Depends(get_db)):
     match = session.execute(select(ReviewMatch).where(ReviewMatch.id == match_id)).scalar_one_or_none()
     if not match:
         raise HTTPException(404, "Review match not found")
@@ -598,12 +1358,12 @@ def review_queue_approve(match_id: int):
     # Approve means keeping the match as-is (entity_id is correct)
     match.resolved = True
     match.resolution = "approved"
+    bump_data_version(session, match.city_key)
     session.commit()
     return {"status": "approved", "match_id": match_id, "entity_id": match.entity_id}
 
 @app.post("/review-queue/{match_id}/reject")
-def review_queue_reject(match_id: int, create_new_entity: bool = False):
-    session = make_session(ENGINE)
+def review_queue_reject(match_id: int, create_new_entity: bool = False, session: Session = Depends(get_db)):
     match = session.execute(select(ReviewMatch).where(ReviewMatch.id == match_id)).scalar_one_or_none()
     if not match:
         raise HTTPException(404, "Review match not found")
@@ -617,6 +1377,7 @@ def review_queue_reject(match_id: int, create_new_entity: bool = False):
     
     match.resolved = True
     match.resolution = "rejected"
+    bump_data_version(session, match.city_key)
     session.commit()
     return {"status": "rejected", "match_id": match_id}
 
@@ -652,88 +1413,99 @@ async def upload_csv_ingest(
     license_status_column: str = Form(default=""),
     license_capacity_column: str = Form(default=""),
     license_id_column: str = Form(default=""),
-    npi_column: str = Form(default="")
+    npi_column: str = Form(default=""),
+    session: Session = Depends(get_db)
 ):
     """Upload and ingest a CSV file with column mappings"""
     try:
         contents = await file.read()
         text = contents.decode('utf-8-sig')
-        
-        # Build mapping dict from form data
-        mapping = {}
-        if name_column:
-            mapping["name"] = name_column
-        if address_column:
-            mapping["address"] = address_column
-        if city_column:
-            mapping["city"] = city_column
-        if state_column:
-            mapping["state"] = state_column
-        if zip_column:
-            mapping["zip"] = zip_column
-        if license_status_column:
-            mapping["license_status"] = license_status_column
-        if license_capacity_column:
-            mapping["license_capacity"] = license_capacity_column
-        if license_id_column:
-            mapping["license_id"] = license_id_column
-        if npi_column:
-            mapping["npi"] = npi_column
-        
-        # Create a config dict that CSVSeedConnector can use
-        cfg = {
-            "filepath": None,  # We'll read from memory instead
-            "mapping": mapping,
-            "entity_type": entity_type,
-            "source_name": f"uploaded_{file.filename}"
-        }
-        
-        # Read CSV into memory structure
-        reader = csv.DictReader(io.StringIO(text))
-        rows = []
-        for row in reader:
-            rec = {"source": cfg["source_name"], "raw": row}
-            for norm_field, col in mapping.items():
-                rec[norm_field] = row.get(col)
-            rows.append(rec)
-        
-        # Process rows like CSVSeedConnector does
-        session = make_session(ENGINE)
-        added_entities = added_evidence = 0
-        
-        for r in rows:
-            if not r.get("name"):
-                continue
-            ent = upsert_entity(
-                session, city_key, entity_type,
-                r.get("name"),
-                r.get("address"), r.get("city"), r.get("state"), r.get("zip"),
-                license_status=r.get("license_status"),
-                license_capacity=safe_int(r.get("license_capacity")),
-                license_id=r.get("license_id"),
-                npi=r.get("npi"),
-                id_source=cfg["source_name"]
-            )
-            added_entities += 1
-            session.add(EvidenceItem(
-                entity_id=ent.id,
-                evidence_type="license" if entity_type=="childcare" else "directory",
-                source=cfg["source_name"],
-                category="Payees",
-                confidence=0.85,
-                title=f"Uploaded from {file.filename}",
-                extracted_json=json.dumps({k: r.get(k) for k in ["license_status","license_capacity","license_id","npi"] if r.get(k) is not None})[:200000],
-                raw_json=json.dumps(r.get("raw", {}))[:200000]
-            ))
-            added_evidence += 1
-        
-        session.commit()
-        return {
-            "status": "success",
-            "added_entities": added_entities,
-            "added_evidence": added_evidence,
-            "filename": file.filename
-        }
+
+        def work():
+            # Build mapping dict from form data
+            mapping = {}
+            if name_column:
+                mapping["name"] = name_column
+            if address_column:
+                mapping["address"] = address_column
+            if city_column:
+                mapping["city"] = city_column
+            if state_column:
+                mapping["state"] = state_column
+            if zip_column:
+                mapping["zip"] = zip_column
+            if license_status_column:
+                mapping["license_status"] = license_status_column
+            if license_capacity_column:
+                mapping["license_capacity"] = license_capacity_column
+            if license_id_column:
+                mapping["license_id"] = license_id_column
+            if npi_column:
+                mapping["npi"] = npi_column
+
+            # Create a config dict that CSVSeedConnector can use
+            cfg = {
+                "filepath": None,  # We'll read from memory instead
+                "mapping": mapping,
+                "entity_type": entity_type,
+                "source_name": f"uploaded_{file.filename}"
+            }
+
+            # Read CSV into memory structure
+            reader = csv.DictReader(io.StringIO(text))
+            rows = []
+            for row in reader:
+                rec = {"source": cfg["source_name"], "raw": row}
+                for norm_field, col in mapping.items():
+                    rec[norm_field] = row.get(col)
+                rows.append(rec)
+
+            # Process rows like CSVSeedConnector does
+            added_entities = added_evidence = 0
+            touched_entity_ids = set()
+
+            for r in rows:
+                if not r.get("name"):
+                    continue
+                ent = upsert_entity(
+                    session, city_key, entity_type,
+                    r.get("name"),
+                    r.get("address"), r.get("city"), r.get("state"), r.get("zip"),
+                    license_status=r.get("license_status"),
+                    license_capacity=safe_int(r.get("license_capacity")),
+                    license_id=r.get("license_id"),
+                    npi=r.get("npi"),
+                    id_source=cfg["source_name"]
+                )
+                touched_entity_ids.add(ent.id)
+                added_entities += 1
+                session.add(EvidenceItem(
+                    entity_id=ent.id,
+                    evidence_type="license" if entity_type=="childcare" else "directory",
+                    source=cfg["source_name"],
+                    category="Payees",
+                    confidence=0.85,
+                    title=f"Uploaded from {file.filename}",
+                    extracted_json=json.dumps({k: r.get(k) for k in ["license_status","license_capacity","license_id","npi"] if r.get(k) is not None})[:200000],
+                    raw_json=json.dumps(r.get("raw", {}))[:200000]
+                ))
+                added_evidence += 1
+
+            session.flush()
+            refresh_source_stats(session, city_key, evidence_sources=[cfg["source_name"]])
+            index_entities(session, touched_entity_ids)
+            update_entity_graph(session, city_key, touched_entity_ids)
+            bump_data_version(session, city_key)
+            session.commit()
+            return {
+                "status": "success",
+                "added_entities": added_entities,
+                "added_evidence": added_evidence,
+                "filename": file.filename
+            }
+
+        # Parsing, matching and the inserts all block; keep them off the event loop
+        return await run_write(work)
     except Exception as e:
         import traceback
         raise HTTPException(500, f"Error processing CSV: {str(e)}\n{traceback.format_exc()}")
@@ -749,103 +1521,122 @@ async def upload_payments_csv_ingest(
     program_column: str = Form(default=""),
     payer_column: str = Form(default=""),
     tag: str = Form(default=""),
-    data_source: str = Form(default="")
+    data_source: str = Form(default=""),
+    session: Session = Depends(get_db)
 ):
     """Upload a CSV with vendor payments - matches vendors to entities and creates Payment records"""
     try:
         contents = await file.read()
         text = contents.decode('utf-8-sig')
-        
-        reader = csv.DictReader(io.StringIO(text))
-        rows = list(reader)
-        
-        session = make_session(ENGINE)
-        added_payments = added_evidence = 0
-        
-        for row in rows:
-            vendor_name = row.get(vendor_column, "").strip()
-            if not vendor_name:
-                continue
-            
-            amount = safe_float(row.get(amount_column, 0))
-            if amount <= 0:
-                continue
-            
-            # Try to match vendor to existing entity
-            ent_id, conf, reason = propose_match(session, city_key, entity_type="", candidate_name=vendor_name, candidate_address=None)
-            
-            if not ent_id:
-                # Determine entity type from tag
-                entity_type = "other"  # default
-                if tag:
-                    tag_lower = tag.strip().lower()
-                    if tag_lower in ["childcare"]:
-                        entity_type = "childcare"
-                    elif tag_lower in ["healthcare", "autism/mental", "autism", "mental"]:
-                        entity_type = "health"
-                    elif tag_lower == "education":
-                        entity_type = "other"  # Keep as other unless we add education type
-                
-                # Create new entity for unmatched vendor
-                ent = upsert_entity(session, city_key, entity_type, vendor_name, None, None, None, None)
-                add_alias(session, ent.id, vendor_name, source=f"uploaded_payments_{file.filename}")
-                ent_id = ent.id
-                conf = 0.5  # Low confidence for new entity
-                reason = f"New entity created from payment data (type: {entity_type})"
-            
-            # Extract fiscal year or date
-            fiscal_year = None
-            if fiscal_year_column and row.get(fiscal_year_column):
-                fiscal_year = str(row.get(fiscal_year_column)).strip()
-            elif date_column and row.get(date_column):
-                date_val = str(row.get(date_column)).strip()
-                # Try to extract year
-                year_match = re.search(r'20\d{2}', date_val)
-                if year_match:
-                    fiscal_year = year_match.group(0)
-            
-            if not fiscal_year:
-                fiscal_year = str(date.today().year)
-            
-            payer = row.get(payer_column, "").strip() if payer_column else "State of Massachusetts"
-            program = row.get(program_column, "").strip() if program_column else "EEC"
-            
-            # Create payment record
-            session.add(Payment(
-                entity_id=ent_id,
-                source=f"uploaded_{file.filename}",
-                data_source=data_source.strip() if data_source else None,
-                category="Payer",
-                tag=tag.strip() if tag else None,
-                fiscal_year=fiscal_year,
-                amount=amount,
-                payer=payer or "State of Massachusetts",
-                program=program or "EEC",
-                match_confidence=float(conf),
-                match_reason=reason,
-                raw_json=json.dumps(row)[:200000]
-            ))
-            added_payments += 1
-            
-            # Add evidence item
-            session.add(EvidenceItem(
-                entity_id=ent_id,
-                evidence_type="payment",
-                source=f"uploaded_{file.filename}",
-                confidence=float(conf),
-                title=f"Payment: ${amount:,.2f}",
-                extracted_json=json.dumps({"amount": amount, "fiscal_year": fiscal_year, "payer": payer, "program": program})[:200000],
-                raw_json=json.dumps(row)[:200000]
-            ))
-            added_evidence += 1
-        
-        session.commit()
-        return {
-            "status": "success",
-            "added_payments": added_payments,
-            "added_evidence": added_evidence,
-            "filename": file.filename
-        }
+
+        def work():
+            reader = csv.DictReader(io.StringIO(text))
+            rows = list(reader)
+
+            added_payments = added_evidence = 0
+            paid_entity_ids = set()
+            new_entity_ids = set()
+
+            for row in rows:
+                vendor_name = row.get(vendor_column, "").strip()
+                if not vendor_name:
+                    continue
+
+                amount = safe_float(row.get(amount_column, 0))
+                if amount <= 0:
+                    continue
+
+                # Try to match vendor to existing entity
+                ent_id, conf, reason = propose_match(session, city_key, entity_type="", candidate_name=vendor_name, candidate_address=None)
+
+                if not ent_id:
+                    # Determine entity type from tag
+                    entity_type = "other"  # default
+                    if tag:
+                        tag_lower = tag.strip().lower()
+                        if tag_lower in ["childcare"]:
+                            entity_type = "childcare"
+                        elif tag_lower in ["healthcare", "autism/mental", "autism", "mental"]:
+                            entity_type = "health"
+                        elif tag_lower == "education":
+                            entity_type = "other"  # Keep as other unless we add education type
+
+                    # Create new entity for unmatched vendor
+                    ent = upsert_entity(session, city_key, entity_type, vendor_name, None, None, None, None)
+                    add_alias(session, ent.id, vendor_name, source=f"uploaded_payments_{file.filename}")
+                    ent_id = ent.id
+                    new_entity_ids.add(ent_id)
+                    conf = 0.5  # Low confidence for new entity
+                    reason = f"New entity created from payment data (type: {entity_type})"
+
+                # Extract fiscal year or date
+                fiscal_year = None
+                if fiscal_year_column and row.get(fiscal_year_column):
+                    fiscal_year = str(row.get(fiscal_year_column)).strip()
+                elif date_column and row.get(date_column):
+                    date_val = str(row.get(date_column)).strip()
+                    # Try to extract year
+                    year_match = re.search(r'20\d{2}', date_val)
+                    if year_match:
+                        fiscal_year = year_match.group(0)
+
+                if not fiscal_year:
+                    fiscal_year = str(date.today().year)
+
+                payer = row.get(payer_column, "").strip() if payer_column else "State of Massachusetts"
+                program = row.get(program_column, "").strip() if program_column else "EEC"
+
+                # Create payment record
+                session.add(Payment(
+                    entity_id=ent_id,
+                    source=f"uploaded_{file.filename}",
+                    data_source=data_source.strip() if data_source else None,
+                    category="Payer",
+                    tag=tag.strip() if tag else None,
+                    fiscal_year=fiscal_year,
+                    amount=amount,
+                    payer=payer or "State of Massachusetts",
+                    program=program or "EEC",
+                    match_confidence=float(conf),
+                    match_reason=reason,
+                    raw_json=json.dumps(row)[:200000]
+                ))
+                added_payments += 1
+                paid_entity_ids.add(ent_id)
+
+                # Add evidence item
+                session.add(EvidenceItem(
+                    entity_id=ent_id,
+                    evidence_type="payment",
+                    source=f"uploaded_{file.filename}",
+                    confidence=float(conf),
+                    title=f"Payment: ${amount:,.2f}",
+                    extracted_json=json.dumps({"amount": amount, "fiscal_year": fiscal_year, "payer": payer, "program": program})[:200000],
+                    raw_json=json.dumps(row)[:200000]
+                ))
+                added_evidence += 1
+
+            session.flush()
+            if paid_entity_ids:
+                refresh_payment_year_totals(session, city_key, paid_entity_ids)
+                refresh_source_stats(
+                    session, city_key,
+                    payment_sources=[f"uploaded_{file.filename}"], evidence_sources=[f"uploaded_{file.filename}"],
+                    tags=[tag.strip() if tag else None], data_sources=[data_source.strip() if data_source else None],
+                )
+            index_entities(session, new_entity_ids)
+            update_entity_graph(session, city_key, new_entity_ids)
+            bump_data_version(session, city_key)
+            session.commit()
+            return {
+                "status": "success",
+                "added_payments": added_payments,
+                "added_evidence": added_evidence,
+                "filename": file.filename
+            }
+
+        # Parsing, matching and the inserts all block; keep them off the event loop
+        return await run_write(work)
     except Exception as e:
         import traceback
         raise HTTPException(500, f"Error processing payments CSV: {str(e)}\n{traceback.format_exc()}")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark MinHash/LSH blocking for similar-name clustering
+
+Generates synthetic business names (with typo / suffix variants), then:
+  - on a sample, compares LSH-verified pairs against the brute-force
+    all-pairs similarity() result (recall, candidate count, speedup)
+  - on the full size (100k+ by default), times LSH candidate generation
+    plus exact verification
+
+Usage:
+    python benchmarks/name_lsh_bench.py --sample 2000 --size 100000 --bands 40 --rows 5
+Prints a JSON summary.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from itertools import combinations
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.minhash import DEFAULT_BANDS, DEFAULT_ROWS, candidate_pairs
+from core.utils import normalize_name, similar_above, similarity
+from services.entity_networks import SIMILAR_NAME_THRESHOLD
+
+WORDS = [
+    "sunshine", "little", "stars", "bright", "future", "harbor", "family", "care", "learning", "kids",
+    "garden", "rainbow", "cedar", "maple", "oak", "river", "valley", "summit", "eagle", "liberty",
+    "community", "health", "medical", "dental", "clinic", "wellness", "home", "senior", "services",
+    "academy", "montessori", "center", "pediatric", "associates", "partners", "group", "north", "south",
+    "east", "west", "beacon", "commonwealth", "pioneer", "heritage", "unity", "hope", "grace", "bayside",
+]
+SUFFIXES = ["", " inc", " llc", " corp", " co", " ltd"]
+SYLLABLES = ["ba", "ker", "son", "mo", "ri", "lan", "do", "vel", "ta", "gri", "fen", "ham", "ton", "wick", "lo", "mar", "shi", "ro", "quin", "bel"]
+
+def _vocabulary(rng, size=5000):
+    """Common business words plus surname-like words built from syllables."""
+    words = set(WORDS)
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+def _typo(rng, s):
+    if len(s) < 4:
+        return s
+    i = rng.randrange(1, len(s) - 1)
+    op = rng.randrange(3)
+    if op == 0:
+        return s[:i] + s[i + 1:]
+    if op == 1:
+        return s[:i] + s[i + 1] + s[i] + s[i + 2:]
+    return s[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + s[i:]
+
+def synthetic_names(n, seed=7, variant_rate=0.3):
+    rng = random.Random(seed)
+    vocab = _vocabulary(rng)
+    names = []
+    while len(names) < n:
+        base = " ".join([rng.choice(vocab)] + rng.sample(WORDS, rng.randint(1, 3)))
+        names.append(base + rng.choice(SUFFIXES))
+        if rng.random() < variant_rate and len(names) < n:
+            names.append(_typo(rng, base) + rng.choice(SUFFIXES))
+    return {i: normalize_name(name) for i, name in enumerate(names)}
+
+def brute_force(names):
+    return {(a, b) for a, b in combinations(sorted(names), 2)
+            if names[a] and names[b] and similarity(names[a], names[b]) > SIMILAR_NAME_THRESHOLD}
+
+def lsh(names, bands, rows):
+    found, n_cands = set(), 0
+    for a, b in candidate_pairs(names, bands, rows):
+        n_cands += 1
+        if similar_above(names[a], names[b], SIMILAR_NAME_THRESHOLD):
+            found.add((a, b))
+    return found, n_cands
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--sample", type=int, default=2000, help="entities for the recall check against brute force")
+    ap.add_argument("--size", type=int, default=100_000, help="entities for the full-size runtime check")
+    ap.add_argument("--bands", type=int, default=DEFAULT_BANDS)
+    ap.add_argument("--rows", type=int, default=DEFAULT_ROWS)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    sample = synthetic_names(args.sample, args.seed)
+    t0 = time.perf_counter()
+    truth = brute_force(sample)
+    brute_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    found, n_cands = lsh(sample, args.bands, args.rows)
+    lsh_s = time.perf_counter() - t0
+
+    full = synthetic_names(args.size, args.seed + 1)
+    t0 = time.perf_counter()
+    full_found, full_cands = lsh(full, args.bands, args.rows)
+    full_s = time.perf_counter() - t0
+
+    print(json.dumps({
+        "bands": args.bands,
+        "rows": args.rows,
+        "threshold": SIMILAR_NAME_THRESHOLD,
+        "sample": {
+            "entities": len(sample),
+            "brute_force_pairs": len(truth),
+            "lsh_candidates": n_cands,
+            "lsh_pairs": len(found),
+            "recall": round(len(found & truth) / len(truth), 4) if truth else 1.0,
+            "brute_force_seconds": round(brute_s, 3),
+            "lsh_seconds": round(lsh_s, 3),
+            "speedup": round(brute_s / lsh_s, 1) if lsh_s else None,
+        },
+        "full": {
+            "entities": len(full),
+            "lsh_candidates": full_cands,
+            "lsh_pairs": len(full_found),
+            "lsh_seconds": round(full_s, 3),
+        },
+    }, indent=2))
+
+if __name__ == "__main__":
+    main()
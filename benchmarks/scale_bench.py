@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Benchmark the app end to end on a synthetic city
+
+Generates a city with benchmarks/synth_city.py (or reuses one with --data),
+then on a fresh SQLite database times, through the app:
+  csv_ingest       POST /ingest/configured (both provider directories)
+  payments_ingest  POST /upload/payments-csv/ingest (vendor matching)
+  compute_scores   POST /score/recompute
+  name_clusters    services.entity_networks.find_name_based_clusters
+  entities         GET /entities: first page cold and cached, a keyset walk
+                   of --pages pages, and one page with include_total
+  review_queue     GET /review-queue keyset walk and /review-queue/groups
+
+The payments upload queues no reviews itself, so before the review_queue
+stage every (vendor, entity) pair paid below REVIEW_CONFIDENCE is queued as
+a ReviewMatch - the rule the USAspending connector applies.
+
+Results (per-stage seconds and rows/s, request latency percentiles, data
+counts, and how many planted ring members score in the top 5%) are printed
+as JSON and, with --output, written to a file. --compare takes an earlier
+results file, adds each stage's time ratio to the output and exits 1 when a
+stage got slower than --tolerance times its previous time (and by at least
+MIN_REGRESSION_SECONDS).
+
+Usage:
+    python benchmarks/scale_bench.py --entities 10000 --output bench_10k.json
+    python benchmarks/scale_bench.py --entities 10000 --compare bench_10k.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synth_city import generate_city
+
+STAGES = ("csv_ingest", "payments_ingest", "compute_scores", "name_clusters", "entities", "review_queue")
+REVIEW_CONFIDENCE = 0.85
+TOP_SHARE = 0.05
+# A stage only counts as regressed if it also lost at least this much time (short stages are noisy)
+MIN_REGRESSION_SECONDS = 0.05
+RESULTS_VERSION = 1
+
+def _latency(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {"requests": 0}
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+    return {
+        "requests": len(ordered),
+        "seconds": round(sum(ordered), 4),
+        "p50_ms": pick(0.5),
+        "p95_ms": pick(0.95),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+def _request(client, method, url, samples=None, **kwargs):
+    t0 = time.perf_counter()
+    r = client.request(method, url, **kwargs)
+    elapsed = time.perf_counter() - t0
+    if r.status_code != 200:
+        raise RuntimeError(f"{method} {url} -> {r.status_code}: {r.text[:500]}")
+    if samples is not None:
+        samples.append(elapsed)
+    return r, elapsed
+
+def _rate(rows, seconds):
+    return round(rows / seconds, 1) if seconds else None
+
+def _count(session, model, *where):
+    from sqlalchemy import select, func
+    return session.execute(select(func.count()).select_from(model).where(*where)).scalar_one()
+
+def _walk(client, url, params, pages, next_cursor):
+    """Follow a keyset cursor for up to `pages` pages; returns the latencies and rows seen."""
+    samples, rows, cursor = [], 0, None
+    for _ in range(pages):
+        r, _ = _request(client, "GET", url, samples, params={**params, **({"cursor": cursor} if cursor else {})})
+        page_rows, cursor = next_cursor(r)
+        rows += page_rows
+        if not cursor:
+            break
+    return samples, rows
+
+def _queue_reviews(app_module, city_key):
+    """Queue each low-confidence (vendor, entity) pair from the payments upload for review."""
+    from sqlalchemy import select, insert
+    from db.models import Entity, Payment, ReviewMatch, make_session
+    with make_session(app_module.ENGINE) as session:
+        pairs = {}
+        for entity_id, conf, reason, raw in session.execute(
+            select(Payment.entity_id, Payment.match_confidence, Payment.match_reason, Payment.raw_json)
+            .join(Entity, Entity.id == Payment.entity_id)
+            .where(Entity.city_key == city_key, Payment.data_source == "synthetic", Payment.match_confidence < REVIEW_CONFIDENCE)
+        ):
+            key = (json.loads(raw).get("Vendor Name"), entity_id)
+            if key not in pairs or conf < pairs[key]["confidence"]:
+                pairs[key] = {"city_key": city_key, "candidate_name": key[0], "candidate_source": "synthetic",
+                              "entity_id": entity_id, "confidence": conf, "reason": reason, "resolved": False,
+                              "created_at": datetime.utcnow()}
+        if pairs:
+            session.execute(insert(ReviewMatch), list(pairs.values()))
+        session.commit()
+        return len(pairs)
+
+def _ring_quality(app_module, city_key, truth):
+    """How many planted ring members score above the top TOP_SHARE cutoff."""
+    from sqlalchemy import select
+    from core.utils import normalize_name, normalize_address
+    from db.models import Entity, make_session
+    with make_session(app_module.ENGINE) as session:
+        scores = session.execute(
+            select(Entity.id, Entity.score, Entity.normalized_name, Entity.normalized_address).where(Entity.city_key == city_key)
+        ).all()
+    by_key = {(r.normalized_name, r.normalized_address): r for r in scores}
+    ranked = sorted((r.score or 0.0 for r in scores), reverse=True)
+    cutoff = ranked[min(len(ranked) - 1, int(len(ranked) * TOP_SHARE))] if ranked else 0.0
+    found = top = rings_flagged = 0
+    for ring in truth["rings"]:
+        naddr = normalize_address(ring["address"])
+        members = [by_key.get((normalize_name(m["name"]), naddr)) for m in ring["members"]]
+        flagged = sum((r.score or 0.0) > cutoff for r in members if r is not None)
+        found += sum(r is not None for r in members)
+        top += flagged
+        rings_flagged += flagged > 0
+    return {
+        "rings": len(truth["rings"]),
+        "ring_members": truth["ring_members"],
+        "ring_members_found": found,
+        "top_share": TOP_SHARE,
+        "top_score_cutoff": cutoff,
+        "ring_members_in_top": top,
+        "rings_with_member_in_top": rings_flagged,
+    }
+
+def _environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "git_commit": commit or None,
+        "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+def run(args, workdir):
+    data_dir = args.data or os.path.join(workdir, "city")
+    t0 = time.perf_counter()
+    if args.data:
+        with open(os.path.join(data_dir, "truth.json"), encoding="utf-8") as f:
+            truth = json.load(f)
+    else:
+        truth = generate_city(data_dir, args.entities, args.seed, args.payments_per_entity)
+    generate_s = time.perf_counter() - t0
+    city_key = truth["city_key"]
+
+    # The app binds its engine at import time and reads paths relative to the repo root
+    os.environ["DB_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.chdir(ROOT)
+    from fastapi.testclient import TestClient
+    import app as app_module
+    from db.models import Alias, Entity, Payment, ReviewMatch, make_session
+    from services.entity_networks import find_name_based_clusters
+
+    with open(os.path.join(data_dir, "city_config.json"), encoding="utf-8") as f:
+        app_module.CITY_CONFIG.update(json.load(f))
+
+    def count_entities():
+        with make_session(app_module.ENGINE) as session:
+            return _count(session, Entity, Entity.city_key == city_key)
+
+    stages, data = {}, {}
+    run_stage = lambda name: name not in args.skip
+    with TestClient(app_module.app) as client:
+        r, s = _request(client, "POST", "/ingest/configured", params={"city_key": city_key})
+        stages["csv_ingest"] = {"seconds": round(s, 3), "rows": truth["entities"], "rows_per_second": _rate(truth["entities"], s)}
+        data["directory_entities"] = count_entities()
+
+        if run_stage("payments_ingest"):
+            with open(os.path.join(data_dir, truth["payments_file"]), "rb") as f:
+                ledger = f.read()
+            cols = truth["payment_columns"]
+            r, s = _request(client, "POST", "/upload/payments-csv/ingest", files={"file": ("payments.csv", ledger, "text/csv")}, data={
+                "city_key": city_key, "vendor_column": cols["vendor"], "amount_column": cols["amount"],
+                "date_column": cols["date"], "fiscal_year_column": cols["fiscal_year"], "program_column": cols["program"],
+                "payer_column": cols["payer"], "data_source": "synthetic",
+            })
+            stages["payments_ingest"] = {"seconds": round(s, 3), "rows": truth["ledger_rows"],
+                                         "rows_per_second": _rate(truth["ledger_rows"], s)}
+
+        if run_stage("compute_scores"):
+            r, s = _request(client, "POST", "/score/recompute", params={"city_key": city_key})
+            updated = r.json()["updated"]
+            stages["compute_scores"] = {"seconds": round(s, 3), "rows": updated, "rows_per_second": _rate(updated, s)}
+
+        with make_session(app_module.ENGINE) as session:
+            data["entities"] = _count(session, Entity, Entity.city_key == city_key)
+            data["aliases"] = _count(session, Alias, Alias.entity_id.in_(
+                session.query(Entity.id).filter(Entity.city_key == city_key).scalar_subquery()))
+            data["payments"] = _count(session, Payment, Payment.data_source == "synthetic")
+            data["payment_entities_created"] = data["entities"] - data["directory_entities"]
+
+            if run_stage("name_clusters"):
+                t0 = time.perf_counter()
+                clusters = find_name_based_clusters(session, city_key)
+                s = time.perf_counter() - t0
+                stages["name_clusters"] = {
+                    "seconds": round(s, 3), "rows": data["entities"], "rows_per_second": _rate(data["entities"], s),
+                    "clusters": sum(1 for c in clusters if c["entity_count"] > 1),
+                    "largest_cluster": clusters[0]["entity_count"] if clusters else 0,
+                }
+
+        if run_stage("entities"):
+            params = {"city_key": city_key, "limit": args.page_size}
+            _, cold = _request(client, "GET", "/entities", params=params)
+            _, warm = _request(client, "GET", "/entities", params=params)
+            _, with_total = _request(client, "GET", "/entities", params={**params, "include_total": "true"})
+            samples, rows = _walk(client, "/entities", params, args.pages,
+                                  lambda r: (len(r.json()), r.headers.get("X-Next-Cursor")))
+            stages["entities"] = {
+                "seconds": round(sum(samples) + cold + warm + with_total, 4),
+                "first_page_cold_ms": round(cold * 1000, 2),
+                "first_page_cached_ms": round(warm * 1000, 2),
+                "include_total_ms": round(with_total * 1000, 2),
+                "walk": {**_latency(samples), "rows": rows},
+            }
+
+        if run_stage("review_queue"):
+            _queue_reviews(app_module, city_key)
+            params = {"city_key": city_key, "limit": args.page_size}
+            samples, rows = _walk(client, "/review-queue", params, args.pages,
+                                  lambda r: (len(r.json()["matches"]), r.json()["next_cursor"]))
+            _, groups = _request(client, "GET", "/review-queue/groups", params=params)
+            stages["review_queue"] = {
+                "seconds": round(sum(samples) + groups, 4),
+                "groups_ms": round(groups * 1000, 2),
+                "walk": {**_latency(samples), "rows": rows},
+            }
+
+    quality = None
+    if run_stage("compute_scores"):
+        quality = _ring_quality(app_module, city_key, truth)
+    with make_session(app_module.ENGINE) as session:
+        data["review_matches"] = _count(session, ReviewMatch, ReviewMatch.city_key == city_key)
+    app_module.ENGINE.dispose()
+
+    return {
+        "benchmark": "scale",
+        "version": RESULTS_VERSION,
+        "params": {"entities": truth["entities"], "seed": truth["seed"], "ledger_rows": truth["ledger_rows"],
+                   "page_size": args.page_size, "pages": args.pages, "skip": sorted(args.skip)},
+        "environment": _environment(),
+        "generate_seconds": round(generate_s, 3),
+        "stages": stages,
+        "data": data,
+        "quality": quality,
+    }
+
+def compare(results, previous, tolerance):
+    """Per-stage time ratios against an earlier run; stages slower than `tolerance` times are regressions."""
+    out, regressions = {}, []
+    for name in STAGES:
+        now, before = results["stages"].get(name), previous.get("stages", {}).get(name)
+        if not now or not before or not before.get("seconds"):
+            continue
+        ratio = round(now["seconds"] / before["seconds"], 3)
+        out[name] = {"previous_seconds": before["seconds"], "seconds": now["seconds"], "ratio": ratio}
+        if ratio > tolerance and now["seconds"] - before["seconds"] >= MIN_REGRESSION_SECONDS:
+            regressions.append(name)
+    same = {k: previous.get("params", {}).get(k) for k in ("entities", "seed", "page_size", "pages")} == \
+           {k: results["params"][k] for k in ("entities", "seed", "page_size", "pages")}
+    return {"tolerance": tolerance, "same_params": same, "stages": out, "regressions": regressions}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--entities", type=int, default=10_000, help="synthetic providers to generate")
+    ap.add_argument("--payments-per-entity", type=float, default=3.0)
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--data", help="reuse a directory written by synth_city.py instead of generating one")
+    ap.add_argument("--workdir", help="keep the database (and generated data) here instead of a temp dir")
+    ap.add_argument("--page-size", type=int, default=200)
+    ap.add_argument("--pages", type=int, default=20, help="pages to walk in the entities and review_queue stages")
+    ap.add_argument("--skip", action="append", default=[], choices=STAGES[1:], help="leave a stage out (repeatable)")
+    ap.add_argument("--output", help="also write the results JSON here")
+    ap.add_argument("--compare", help="an earlier results file to compare stage times against")
+    ap.add_argument("--tolerance", type=float, default=1.25, help="slowdown ratio counted as a regression")
+    args = ap.parse_args()
+    if args.data:
+        args.data = os.path.abspath(args.data)
+
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix="scale_bench_")
+    os.makedirs(workdir, exist_ok=True)
+    db = os.path.join(workdir, "bench.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db + suffix):
+            os.remove(db + suffix)
+    try:
+        # The app logs to stdout; keep stdout for the results
+        with contextlib.redirect_stdout(sys.stderr):
+            results = run(args, workdir)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    regressed = False
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            results["comparison"] = compare(results, json.load(f), args.tolerance)
+        regressed = bool(results["comparison"]["regressions"])
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    sys.exit(1 if regressed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Generate a synthetic city for scale benchmarks
+
+Writes provider directories and a payment ledger shaped like the seeds in
+data/seeds, at any scale (10k to 1M+ entities):
+  - childcare and health providers with realistic names, addresses, license
+    ids / NPIs and capacities, a few with missing fields
+  - trade names (d/b/a) that some ledger rows use instead of the legal name,
+    so those vendors come in as new entities with aliases
+  - shared addresses: buildings with two tenants, sometimes in different
+    suites
+  - a payment ledger over several fiscal years with vendor-name noise (case,
+    punctuation, dropped or changed suffixes, typos, reordered words) and
+    vendors that are in no directory
+  - planted fraud rings: providers registered at one address under one
+    owner, with small capacities, missing licenses and payments that spike
+    in the last year
+
+Everything is derived from --seed, so a given seed and size always produce
+the same files. Alongside the CSVs it writes city_config.json (csv_seed
+connectors for the two directories, to merge into the app's
+city_config.json) and truth.json (counts and the planted rings).
+
+Usage:
+    python benchmarks/synth_city.py --entities 100000 --out /tmp/synth_city --seed 7
+Prints the truth summary (without the ring members) as JSON.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import random
+
+CITY_KEY = "synth_ma"
+DISPLAY_NAME = "Synthetic City, MA"
+CITY, STATE = "Synthetic City", "MA"
+ZIPS = [f"01{n:03d}" for n in range(840, 870)]
+FISCAL_YEARS = (2022, 2023, 2024, 2025)
+
+CHILDCARE_SHARE = 0.45
+MISSING_ID_RATE = 0.03
+MISSING_ADDRESS_RATE = 0.02
+SHARED_ADDRESS_RATE = 0.06
+TRADE_NAME_RATE = 0.08
+PAID_RATE = 0.65
+UNKNOWN_VENDOR_RATE = 0.02
+RING_RATE = 1 / 2000  # rings per entity
+RING_SIZE = (3, 8)
+
+CHILDCARE_FILE = "childcare_providers.csv"
+HEALTH_FILE = "health_providers.csv"
+PAYMENTS_FILE = "payments.csv"
+CHILDCARE_COLUMNS = ["Program Name", "Address", "City", "State", "Zip", "Status", "Capacity", "License ID"]
+HEALTH_COLUMNS = ["Provider Name", "Address", "City", "State", "Zip", "NPI"]
+PAYMENT_COLUMNS = ["Vendor Name", "Amount", "Payment Date", "Fiscal Year", "Program", "Payer"]
+
+SURNAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+    "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Lee", "Nguyen", "Patel", "Kim", "Okafor", "Silva", "Murphy", "Sullivan", "Kelly", "Walsh", "Pereira",
+    "Tran", "Chen", "Wong", "Cohen", "Rossi", "Santos", "Oliveira", "Haddad", "Mensah", "Diallo", "Ramos",
+]
+FIRST_NAMES = [
+    "Maria", "James", "Linda", "Robert", "Patricia", "John", "Jennifer", "Michael", "Aisha", "David",
+    "Elizabeth", "Carlos", "Susan", "Kwame", "Nadia", "Thomas", "Grace", "Luis", "Mei", "Fatima", "Sean",
+]
+ADJECTIVES = [
+    "Little", "Bright", "Happy", "Sunny", "Golden", "Tiny", "Growing", "Caring", "Gentle", "Blue", "Green",
+    "Shining", "Wonder", "First", "New", "Kind", "Precious", "Smart", "Busy", "Rising",
+]
+NOUNS = [
+    "Stars", "Steps", "Sprouts", "Acorns", "Harbor", "Beacon", "Meadow", "Maple", "Cedar", "Oak", "River",
+    "Valley", "Summit", "Eagle", "Liberty", "Pioneer", "Heritage", "Unity", "Hope", "Grace", "Bayside",
+    "Hilltop", "Lighthouse", "Rainbow", "Garden", "Willow", "Orchard", "Compass", "Horizon", "Commonwealth",
+]
+STREET_SUFFIXES = ["St", "Street", "Ave", "Avenue", "Rd", "Road", "Blvd", "Dr", "Way", "Pl", "Ct", "Sq", "Hwy"]
+SYLLABLES = ["ba", "ker", "son", "mo", "ri", "lan", "do", "vel", "ta", "gri", "fen", "ham", "ton", "wick", "lo",
+             "mar", "shi", "ro", "quin", "bel", "ash", "by", "dell", "ford", "ing", "ley", "more", "stead"]
+
+CHILDCARE_NAMES = [
+    "{surname} Family Child Care", "{adj} {noun} Learning Center", "{adj} {noun} Daycare",
+    "{noun} Montessori School", "{adj} {noun} Preschool", "{first} {surname} Family Daycare",
+    "{noun} Early Education Center", "{noun} Kids Academy", "{surname} Child Development Center",
+]
+HEALTH_NAMES = [
+    "{noun} Health Center", "{surname} Medical Associates", "{noun} Pediatrics", "{surname} & {surname2} Dental",
+    "{noun} Home Health Care", "{first} {surname} MD", "{noun} Behavioral Health", "{noun} Physical Therapy",
+    "{surname} Family Medicine", "{noun} Community Health Services",
+]
+TRADE_NAMES = ["{adj} {noun} Kids", "{noun} Care", "{adj} Beginnings", "{noun} Wellness", "The {noun} Clinic"]
+UNKNOWN_VENDORS = ["{surname} Consulting Group", "{noun} Staffing Services", "{surname} Transportation",
+                   "{noun} Facilities Management", "{adj} {noun} Supplies"]
+LEGAL_SUFFIXES = ["", "", "", " LLC", " Inc", " Inc.", ", LLC", " Corp"]
+HEALTH_SUFFIXES = ["", "", " PC", " LLC", " Inc", ", P.C.", " LLP"]
+STATUSES = [("Licensed", 0.85), ("Provisional", 0.08), ("Expired", 0.05), ("Suspended", 0.02)]
+PROGRAMS = {
+    "childcare": [("CCFA Subsidy", "Department of Early Education and Care"), ("EEC Contract", "Department of Early Education and Care")],
+    "health": [("MassHealth", "Executive Office of Health and Human Services"), ("DPH Grant", "Department of Public Health")],
+}
+
+def _street_words(rng, size=4000):
+    """Street names: the name nouns and surnames plus place-like syllable words."""
+    words = set(NOUNS) | set(SURNAMES)
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize())
+    return sorted(words)
+
+def _surnames(rng, size=6000):
+    names = set(SURNAMES)
+    while len(names) < size:
+        names.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize())
+    return sorted(names)
+
+def _fill(rng, pattern, surnames, surname=None, first=None):
+    return pattern.format(
+        surname=surname or rng.choice(surnames), surname2=rng.choice(surnames), first=first or rng.choice(FIRST_NAMES),
+        adj=rng.choice(ADJECTIVES), noun=rng.choice(NOUNS),
+    )
+
+def _address(rng, streets):
+    return f"{rng.randint(1, 2999)} {rng.choice(streets)} {rng.choice(STREET_SUFFIXES)}"
+
+def _weighted(rng, choices):
+    x = rng.random()
+    for value, weight in choices:
+        x -= weight
+        if x < 0:
+            return value
+    return choices[-1][0]
+
+# Vendor-name noise, as seen in payment ledgers keyed by hand
+
+def _typo(rng, s):
+    if len(s) < 5:
+        return s
+    i = rng.randrange(1, len(s) - 2)
+    op = rng.randrange(3)
+    if op == 0:
+        return s[:i] + s[i + 1:]
+    if op == 1:
+        return s[:i] + s[i + 1] + s[i] + s[i + 2:]
+    return s[:i] + rng.choice("abcdefghijklmnopqrstuvwxyz") + s[i:]
+
+def _strip_suffix(name):
+    for suffix in sorted(set(LEGAL_SUFFIXES + HEALTH_SUFFIXES), key=len, reverse=True):
+        if suffix and name.endswith(suffix):
+            return name[: -len(suffix)]
+    return name
+
+def _reorder(name):
+    words = _strip_suffix(name).split()
+    if len(words) < 3:
+        return name
+    return " ".join(words[1:]) + ", " + words[0]
+
+NOISE = [
+    ("exact", 0.60),
+    ("upper", 0.12),
+    ("suffix", 0.10),
+    ("punctuation", 0.06),
+    ("typo", 0.08),
+    ("reorder", 0.04),
+]
+TRADE_NAME_USE = 0.4  # share of a provider's ledger rows under its trade name, when it has one
+
+def vendor_variant(rng, legal):
+    """How a ledger row spells a vendor; returns (kind, vendor name), kind "exact" when unchanged."""
+    kind = _weighted(rng, NOISE)
+    vendor = legal
+    if kind == "upper":
+        vendor = legal.upper()
+    elif kind == "suffix":
+        vendor = _strip_suffix(legal) + rng.choice([" LLC", " Inc", " Corp", ""])
+    elif kind == "punctuation":
+        vendor = legal.replace("&", "and") if "&" in legal else legal.replace(" LLC", ", L.L.C.").replace(" Inc", ", Inc.")
+        if vendor == legal:
+            vendor = legal.replace(" ", "  ", 1)
+    elif kind == "typo":
+        vendor = _typo(rng, legal)
+    elif kind == "reorder":
+        vendor = _reorder(legal)
+    return (kind if vendor != legal else "exact"), vendor
+
+class _Ledger:
+    """Writes payment rows and counts the vendor-name noise."""
+
+    def __init__(self, f):
+        self.out = csv.writer(f)
+        self.out.writerow(PAYMENT_COLUMNS)
+        self.rows = 0
+        self.noise = {kind: 0 for kind, _ in NOISE}
+        self.noise.update(trade_name=0, unknown_vendor=0)
+
+    def pay(self, rng, vendor, kind, etype, year, amount):
+        program, payer = rng.choice(PROGRAMS[etype])
+        paid = f"{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}"
+        self.out.writerow([vendor, f"{amount:.2f}", paid, year, program, payer])
+        self.noise[kind] += 1
+        self.rows += 1
+
+def _payment_rows(rng, mean):
+    """Ledger rows for one paid provider (geometric, so most have a few and some many)."""
+    p = 1 / max(mean, 1.0)
+    return 1 + int(math.log(1 - rng.random()) / math.log(1 - p)) if p < 1 else 1
+
+def _ledger_for(rng, ledger, legal, trade_name, etype, capacity, rows, spike=False):
+    start = rng.choice(FISCAL_YEARS[:-1]) if not spike else FISCAL_YEARS[0]
+    years = [y for y in FISCAL_YEARS if y >= start]
+    base = (capacity or 20) * rng.uniform(600, 2400) if etype == "childcare" else rng.lognormvariate(9.5, 1.0)
+    for _ in range(rows):
+        year = rng.choice(years)
+        amount = base * rng.uniform(0.5, 1.5)
+        if spike and year == FISCAL_YEARS[-1]:
+            amount *= rng.uniform(6, 12)
+        if trade_name and rng.random() < TRADE_NAME_USE:
+            kind, vendor = "trade_name", trade_name
+        else:
+            kind, vendor = vendor_variant(rng, legal)
+        ledger.pay(rng, vendor, kind, etype, year, amount)
+
+def _plan_rings(rng, n_rings, surnames, streets):
+    rings = []
+    for ring_id in range(n_rings):
+        owner = rng.choice(surnames)
+        first = rng.choice(FIRST_NAMES)
+        address = _address(rng, streets)
+        size = rng.randint(*RING_SIZE)
+        members, names = [], set()
+        while len(members) < size:
+            etype = "childcare" if rng.random() < 0.75 else "health"
+            pattern = rng.choice([p for p in (CHILDCARE_NAMES if etype == "childcare" else HEALTH_NAMES) if "{surname}" in p])
+            name = _fill(rng, pattern, surnames, surname=owner, first=first)
+            if name not in names:
+                names.add(name)
+                members.append({"name": name + rng.choice(LEGAL_SUFFIXES), "entity_type": etype})
+        rings.append({"ring_id": ring_id, "owner": f"{first} {owner}", "address": address, "members": members})
+    return rings
+
+def generate_city(out_dir, entities=10_000, seed=7, payments_per_entity=3.0, city_key=CITY_KEY, display_name=DISPLAY_NAME):
+    """Write the city's CSVs, city_config.json and truth.json into out_dir; returns the truth dict."""
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    out_dir = os.path.abspath(out_dir)
+    streets, surnames = _street_words(rng), _surnames(rng)
+
+    rings = _plan_rings(rng, max(1, round(entities * RING_RATE)), surnames, streets)
+    ring_slots = {}
+    members = [(ring, m) for ring in rings for m in ring["members"]]
+    for slot, member in zip(rng.sample(range(entities), min(len(members), entities)), members):
+        ring_slots[slot] = member
+
+    unknown = [_fill(rng, rng.choice(UNKNOWN_VENDORS), surnames) + rng.choice(LEGAL_SUFFIXES)
+               for _ in range(max(5, entities // 200))]
+    buildings = []  # [address, tenants still to place]
+    counts = {"childcare": 0, "health": 0, "trade_names": 0, "shared_address_tenants": 0, "paid_entities": 0}
+    mean_rows = payments_per_entity / PAID_RATE
+
+    with open(os.path.join(out_dir, CHILDCARE_FILE), "w", newline="", encoding="utf-8") as cf, \
+         open(os.path.join(out_dir, HEALTH_FILE), "w", newline="", encoding="utf-8") as hf, \
+         open(os.path.join(out_dir, PAYMENTS_FILE), "w", newline="", encoding="utf-8") as pf:
+        childcare, health, ledger = csv.writer(cf), csv.writer(hf), _Ledger(pf)
+        childcare.writerow(CHILDCARE_COLUMNS)
+        health.writerow(HEALTH_COLUMNS)
+
+        for i in range(entities):
+            ring, member = ring_slots.get(i, (None, None))
+            if ring:
+                etype, legal, address = member["entity_type"], member["name"], ring["address"]
+                capacity = rng.randint(6, 12)
+                has_id = rng.random() < 0.5
+                trade_name = None
+            else:
+                etype = "childcare" if rng.random() < CHILDCARE_SHARE else "health"
+                patterns, suffixes = (CHILDCARE_NAMES, LEGAL_SUFFIXES) if etype == "childcare" else (HEALTH_NAMES, HEALTH_SUFFIXES)
+                legal = _fill(rng, rng.choice(patterns), surnames) + rng.choice(suffixes)
+                capacity = rng.randint(6, 12) if "Family" in legal else rng.randint(20, 150)
+                has_id = rng.random() >= MISSING_ID_RATE
+                trade_name = _fill(rng, rng.choice(TRADE_NAMES), surnames) if rng.random() < TRADE_NAME_RATE else None
+                counts["trade_names"] += trade_name is not None
+                if rng.random() < MISSING_ADDRESS_RATE:
+                    address = ""
+                elif rng.random() < SHARED_ADDRESS_RATE:
+                    if buildings and rng.random() < 0.5:
+                        b = buildings.pop(rng.randrange(len(buildings)))
+                        address = b if rng.random() < 0.6 else f"{b} Ste {rng.randint(1, 9)}{rng.randint(0, 2)}0"
+                    else:
+                        address = _address(rng, streets)
+                        buildings.append(address)
+                    counts["shared_address_tenants"] += 1
+                else:
+                    address = _address(rng, streets)
+
+            counts[etype] += 1
+            zip_code = rng.choice(ZIPS)
+            if etype == "childcare":
+                childcare.writerow([legal, address, CITY, STATE, zip_code, _weighted(rng, STATUSES), capacity,
+                                    f"EEC-{i:07d}" if has_id else ""])
+            else:
+                health.writerow([legal, address, CITY, STATE, zip_code, f"1{rng.randrange(10 ** 9):09d}" if has_id else ""])
+
+            if ring or rng.random() < PAID_RATE:
+                counts["paid_entities"] += 1
+                _ledger_for(rng, ledger, legal, trade_name, etype, capacity, _payment_rows(rng, mean_rows), spike=bool(ring))
+            if rng.random() < UNKNOWN_VENDOR_RATE * mean_rows * PAID_RATE:
+                ledger.pay(rng, rng.choice(unknown), "unknown_vendor", rng.choice(("childcare", "health")),
+                           rng.choice(FISCAL_YEARS), rng.lognormvariate(8.5, 1.0))
+
+    config = {city_key: {"display_name": display_name, "connectors": {
+        "childcare_providers_csv": {
+            "type": "csv_seed", "entity_type": "childcare", "filepath": os.path.join(out_dir, CHILDCARE_FILE),
+            "mapping": {"name": "Program Name", "address": "Address", "city": "City", "state": "State", "zip": "Zip",
+                        "license_status": "Status", "license_capacity": "Capacity", "license_id": "License ID"},
+        },
+        "health_providers_csv": {
+            "type": "csv_seed", "entity_type": "health", "filepath": os.path.join(out_dir, HEALTH_FILE),
+            "mapping": {"name": "Provider Name", "address": "Address", "city": "City", "state": "State", "zip": "Zip",
+                        "npi": "NPI"},
+        },
+    }}}
+    with open(os.path.join(out_dir, "city_config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+
+    truth = {
+        "city_key": city_key,
+        "seed": seed,
+        "entities": entities,
+        **counts,
+        "payments_file": PAYMENTS_FILE,
+        "payment_columns": {"vendor": "Vendor Name", "amount": "Amount", "date": "Payment Date",
+                            "fiscal_year": "Fiscal Year", "program": "Program", "payer": "Payer"},
+        "ledger_rows": ledger.rows,
+        "vendor_noise": ledger.noise,
+        "ring_count": len(rings),
+        "ring_members": len(members),
+        "rings": rings,
+    }
+    with open(os.path.join(out_dir, "truth.json"), "w", encoding="utf-8") as f:
+        json.dump(truth, f, indent=2)
+    return truth
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--entities", type=int, default=10_000, help="providers across both directories (rings included)")
+    ap.add_argument("--payments-per-entity", type=float, default=3.0, help="average ledger rows per provider")
+    ap.add_argument("--out", default="synth_city", help="output directory")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--city-key", default=CITY_KEY)
+    args = ap.parse_args()
+    truth = generate_city(args.out, args.entities, args.seed, args.payments_per_entity, args.city_key)
+    print(json.dumps({k: v for k, v in truth.items() if k != "rings"}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,64 @@
 from __future__ import annotations
+import asyncio
 import requests
 from typing import Dict, Any, Iterable, List
 
+try:
+    import httpx
+except ImportError:  # fetch_async falls back to the sync fetch in a thread
+    httpx = None
+
 class USAspendingConnector:
     BASE = "https://api.usaspending.gov"
 
-    def fetch(self, city_key: str, cfg: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+    def _queries(self, cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
         recipients: List[str] = cfg.get("recipient_keywords", [])
         fiscal_years: List[int] = cfg.get("fiscal_years", [])
         limit = int(cfg.get("limit_per_query", 50))
-        if not recipients:
+        return [{"recipient_search_text": [kw], "fy": fiscal_years, "page": 1, "limit": limit} for kw in recipients]
+
+    def fetch(self, city_key: str, cfg: Dict[str, Any]) -> Iterable[Dict[str, Any]]:
+        queries = self._queries(cfg)
+        if not queries:
             return []
         out = []
-        for kw in recipients:
+        for payload in queries:
             url = f"{self.BASE}/api/v2/recipient/awards/"
-            payload = {"recipient_search_text": [kw], "fy": fiscal_years, "page": 1, "limit": limit}
             r = requests.post(url, json=payload, timeout=30)
             r.raise_for_status()
-            data = r.json()
-            for row in data.get("results", []):
-                out.append({
-                    "source": "usaspending",
-                    "evidence_type": "payment",
-                    "name": row.get("recipient_name"),
-                    "amount": float(row.get("total_obligation") or 0.0),
-                    "fiscal_year": str(row.get("fy")) if row.get("fy") else None,
-                    "payer": "US Federal",
-                    "program": "federal_awards",
-                    "raw": row,
-                    "title": "USAspending awards summary",
-                    "url": None
-                })
+            out.extend(self._rows(r.json()))
+        return out
+
+    async def fetch_async(self, city_key: str, cfg: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Same as fetch(), with one concurrent request per recipient keyword."""
+        if httpx is None:
+            return list(await asyncio.to_thread(self.fetch, city_key, cfg))
+        queries = self._queries(cfg)
+        if not queries:
+            return []
+        url = f"{self.BASE}/api/v2/recipient/awards/"
+        async with httpx.AsyncClient(timeout=30) as client:
+            async def one(payload):
+                r = await client.post(url, json=payload)
+                r.raise_for_status()
+                return self._rows(r.json())
+            pages = await asyncio.gather(*(one(p) for p in queries))
+        return [row for page in pages for row in page]
+
+    @staticmethod
+    def _rows(data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        out = []
+        for row in data.get("results", []):
+            out.append({
+                "source": "usaspending",
+                "evidence_type": "payment",
+                "name": row.get("recipient_name"),
+                "amount": float(row.get("total_obligation") or 0.0),
+                "fiscal_year": str(row.get("fy")) if row.get("fy") else None,
+                "payer": "US Federal",
+                "program": "federal_awards",
+                "raw": row,
+                "title": "USAspending awards summary",
+                "url": None
+            })
         return out
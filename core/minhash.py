@@ -0,0 +1,100 @@
+"""
+MinHash / LSH candidate generation for near-duplicate names
+
+Each name becomes a set of character shingles; its MinHash signature is the
+elementwise minimum of the per-shingle hash vectors (each distinct shingle is
+hashed once and reused). Signatures are cut into `bands` bands of `rows`
+values; names sharing any whole band land in the same bucket and become
+candidate pairs. The chance that two names with shingle Jaccard similarity s
+become candidates is 1 - (1 - s**rows) ** bands. More bands or fewer rows
+raise recall (and the number of candidates to verify).
+"""
+
+from __future__ import annotations
+import hashlib
+import random
+import zlib
+from itertools import combinations
+from typing import Dict, Hashable, Iterable, Iterator, List, Optional, Set, Tuple
+
+DEFAULT_BANDS = 40
+DEFAULT_ROWS = 5
+SHINGLE_SIZE = 3
+
+_PRIME = (1 << 61) - 1  # Mersenne prime for universal hashing
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> Set[str]:
+    """Character k-grams of text; short strings are a single shingle."""
+    if len(text) <= k:
+        return {text} if text else set()
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+class MinHasher:
+    def __init__(self, bands: int = DEFAULT_BANDS, rows: int = DEFAULT_ROWS, k: int = SHINGLE_SIZE, seed: int = 1):
+        self.bands, self.rows, self.k = bands, rows, k
+        rng = random.Random(seed)
+        self._coeffs = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(bands * rows)]
+        self._vectors: Dict[str, Tuple[int, ...]] = {}
+
+    def _vector(self, shingle: str) -> Tuple[int, ...]:
+        v = self._vectors.get(shingle)
+        if v is None:
+            x = zlib.crc32(shingle.encode("utf-8"))
+            v = tuple((a * x + b) % _PRIME for a, b in self._coeffs)
+            self._vectors[shingle] = v
+        return v
+
+    def signature(self, text: str) -> Optional[Tuple[int, ...]]:
+        vectors = [self._vector(s) for s in shingles(text, self.k)]
+        if not vectors:
+            return None
+        if len(vectors) == 1:
+            return vectors[0]
+        return tuple(map(min, zip(*vectors)))
+
+    def band_keys(self, sig: Tuple[int, ...]) -> Iterable[Tuple]:
+        r = self.rows
+        for b in range(self.bands):
+            yield (b,) + sig[b * r:(b + 1) * r]
+
+    def band_hashes(self, text: str) -> List[str]:
+        """Compact, process-independent band keys ("band:hex") for storing in a table."""
+        sig = self.signature(text)
+        if sig is None:
+            return []
+        return [f"{bk[0]}:{hashlib.blake2b(repr(bk[1:]).encode('ascii'), digest_size=8).hexdigest()}"
+                for bk in self.band_keys(sig)]
+
+def candidate_pairs(names: Dict[Hashable, str], bands: int = DEFAULT_BANDS, rows: int = DEFAULT_ROWS) -> Iterator[Tuple[Hashable, Hashable]]:
+    """Yield each pair of ids whose names share at least one LSH band, once.
+
+    A pair is emitted only from the first band its signatures agree on, so no
+    set of seen pairs has to be held in memory. Pairs are (smaller id, larger
+    id) when ids are comparable.
+    """
+    hasher = MinHasher(bands, rows)
+    sigs: Dict[Hashable, Tuple[int, ...]] = {}
+    buckets: Dict[Tuple, List[Hashable]] = {}
+    for key, text in names.items():
+        sig = hasher.signature(text)
+        if sig is None:
+            continue
+        sigs[key] = sig
+        for bk in hasher.band_keys(sig):
+            buckets.setdefault(bk, []).append(key)
+
+    for bk, members in buckets.items():
+        if len(members) < 2:
+            continue
+        prefix = bk[0] * rows  # signature values of the bands before this one
+        for a, b in combinations(members, 2):
+            if prefix and _agree_before(sigs[a], sigs[b], prefix, rows):
+                continue
+            yield (a, b) if a <= b else (b, a)
+
+def _agree_before(sa: Tuple[int, ...], sb: Tuple[int, ...], prefix: int, rows: int) -> bool:
+    """True if the signatures share a whole band within the first `prefix` values."""
+    for i in range(0, prefix, rows):
+        if sa[i:i + rows] == sb[i:i + rows]:
+            return True
+    return False
@@ -0,0 +1,134 @@
+"""
+Precomputed name keys for exact-key candidate lookups
+
+From a normalized name (core.normalize) three keys are derived and stored,
+indexed, next to it on entities and aliases:
+
+  sorted_key    the tokens in sorted order ("smith child care" and "child
+                care smith" -> "care child smith")
+  phonetic_key  each token's Metaphone code, sorted ("smith", "smyth" ->
+                "SM0"); digit tokens are kept as they are
+  first_token   the first token, a cheap blocking key
+
+The phonetic code follows Lawrence Philips' Metaphone with the Double
+Metaphone convention of coding every initial vowel as "A"; only the primary
+code is kept, so one indexed column is enough.
+"""
+
+from __future__ import annotations
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+PHONETIC_MAX = 6  # code length per token
+NAME_KEY_COLUMNS = ("sorted_key", "phonetic_key", "first_token")
+
+_VOWELS = frozenset("AEIOU")
+_FRONT = frozenset("EIY")  # vowels that soften C and G
+
+def metaphone(word: str, max_len: int = PHONETIC_MAX) -> str:
+    """Primary Metaphone code of one word (letters other than A-Z are ignored)."""
+    w = "".join(ch for ch in word.upper() if "A" <= ch <= "Z")
+    if not w:
+        return ""
+    if w[:2] in ("AE", "GN", "KN", "PN", "WR"):
+        w = w[1:]
+    if w[0] == "X":
+        w = "S" + w[1:]
+    elif w[:2] == "WH":
+        w = "W" + w[2:]
+    n = len(w)
+    at = lambda j: w[j] if 0 <= j < n else ""
+    out = []
+    i = 0
+    while i < n and len(out) < max_len:
+        c, prev, nxt = w[i], at(i - 1), at(i + 1)
+        if c == prev and c != "C":
+            i += 1
+            continue
+        if c in _VOWELS:
+            if i == 0:
+                out.append("A")
+        elif c == "B":
+            if not (prev == "M" and i == n - 1):
+                out.append("B")
+        elif c == "C":
+            if nxt == "I" and at(i + 2) == "A":
+                out.append("X")
+            elif nxt == "H":
+                out.append("K" if prev == "S" else "X")
+                i += 1
+            elif nxt in _FRONT:
+                if prev != "S":
+                    out.append("S")
+            else:
+                out.append("K")
+        elif c == "D":
+            if nxt == "G" and at(i + 2) in _FRONT:
+                out.append("J")
+                i += 1
+            else:
+                out.append("T")
+        elif c == "G":
+            if nxt == "H" and at(i + 2) and at(i + 2) not in _VOWELS:
+                pass  # "night", "wright"
+            elif nxt == "N" and (i + 2 == n or (w[i + 2:] == "ED" and i + 4 == n)):
+                pass  # "sign", "signed"
+            elif nxt in _FRONT and prev != "G":
+                out.append("J")
+            else:
+                out.append("K")
+        elif c == "H":
+            if nxt in _VOWELS and prev not in ("C", "S", "P", "T", "G"):
+                out.append("H")
+        elif c == "K":
+            if prev != "C":
+                out.append("K")
+        elif c == "P":
+            if nxt == "H":
+                out.append("F")
+                i += 1
+            else:
+                out.append("P")
+        elif c == "Q":
+            out.append("K")
+        elif c == "S":
+            if nxt == "H":
+                out.append("X")
+                i += 1
+            elif nxt == "I" and at(i + 2) in ("O", "A"):
+                out.append("X")
+            else:
+                out.append("S")
+        elif c == "T":
+            if nxt == "I" and at(i + 2) in ("O", "A"):
+                out.append("X")
+            elif nxt == "H":
+                out.append("0")
+                i += 1
+            elif not (nxt == "C" and at(i + 2) == "H"):
+                out.append("T")
+        elif c == "V":
+            out.append("F")
+        elif c in ("W", "Y"):
+            if nxt in _VOWELS:
+                out.append(c)
+        elif c == "X":
+            out.append("KS")
+        elif c == "Z":
+            out.append("S")
+        else:  # F J L M N R
+            out.append(c)
+        i += 1
+    return "".join(out)[:max_len]
+
+@lru_cache(maxsize=65536)
+def name_keys(normalized: Optional[str]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """(sorted_key, phonetic_key, first_token) of a normalized name; all None for an empty one."""
+    tokens = (normalized or "").split()
+    if not tokens:
+        return None, None, None
+    codes = sorted(t if t.isdigit() else (metaphone(t) or t.upper()) for t in tokens)
+    return " ".join(sorted(tokens)), " ".join(codes), tokens[0]
+
+def name_key_columns(normalized: Optional[str]) -> Dict[str, Optional[str]]:
+    return dict(zip(NAME_KEY_COLUMNS, name_keys(normalized)))
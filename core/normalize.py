@@ -0,0 +1,170 @@
+"""
+Name and address normalization engine
+
+Both normalizers are a single tokenizing pass over the lowercased string:
+names keep the [a-z0-9] runs and drop trailing COMMON_SUFFIXES tokens;
+addresses map every word through the profile's abbreviation table, then
+keep its [a-z0-9] runs. Everything else (punctuation, whitespace,
+non-ASCII letters) separates tokens, and the result is the tokens joined by
+single spaces - exactly what the original chain of re.sub passes produced.
+
+Address profiles:
+  legacy  the six expansions ingest has always applied (st, rd, ave, blvd,
+          dr, apt); the default, so stored normalized_address values match
+  usps    every USPS Publication 28 street suffix (C1) and secondary unit
+          designator (C2) abbreviation, expanded to its full name
+
+ADDRESS_NORMALIZATION picks the profile used by core.utils; after changing
+it, renormalize stored rows (services.renormalize) so lookups still match.
+Results are memoized in a bounded LRU per normalizer; the batch methods
+normalize a whole column, each distinct value once.
+"""
+
+from __future__ import annotations
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+COMMON_SUFFIXES = [
+    " llc", " inc", " corp", " co", " ltd", " company", " incorporated", " foundation",
+    " pc", " pllc", " llp", " lp", " nonprofit", " non profit"
+]
+
+LEGACY_ADDRESS_TABLE: Dict[str, str] = {
+    "st": "street", "rd": "road", "ave": "avenue", "blvd": "boulevard", "dr": "drive", "apt": "apartment",
+}
+
+# USPS Publication 28, appendix C1: primary street suffix name -> its common abbreviations
+_USPS_SUFFIXES = {
+    "alley": "allee ally aly", "anex": "annex annx anx", "arcade": "arc", "avenue": "av ave aven avenu avn avnue",
+    "bayou": "bayoo byu", "beach": "bch", "bend": "bnd", "bluff": "blf bluf", "bluffs": "blfs",
+    "bottom": "bot btm bottm", "boulevard": "blvd boul boulv", "branch": "br brnch", "bridge": "brdge brg",
+    "brook": "brk", "brooks": "brks", "burg": "bg", "burgs": "bgs", "bypass": "byp bypa bypas byps",
+    "camp": "cp cmp", "canyon": "canyn cnyn cyn", "cape": "cpe", "causeway": "causwa cswy",
+    "center": "cen cent centr centre cnter cntr ctr", "centers": "ctrs",
+    "circle": "cir circ circl crcl crcle", "circles": "cirs", "cliff": "clf", "cliffs": "clfs", "club": "clb",
+    "common": "cmn", "commons": "cmns", "corner": "cor", "corners": "cors", "course": "crse", "court": "ct",
+    "courts": "cts", "cove": "cv", "coves": "cvs", "creek": "crk", "crescent": "cres crsent crsnt",
+    "crest": "crst", "crossing": "crssng xing", "crossroad": "xrd", "crossroads": "xrds", "curve": "curv",
+    "dale": "dl", "dam": "dm", "divide": "div dv dvd", "drive": "dr driv drv", "drives": "drs",
+    "estate": "est", "estates": "ests", "expressway": "exp expr express expw expy",
+    "extension": "ext extn extnsn", "extensions": "exts", "falls": "fls", "ferry": "frry fry",
+    "field": "fld", "fields": "flds", "flat": "flt", "flats": "flts", "ford": "frd", "fords": "frds",
+    "forest": "forests frst", "forge": "forg frg", "forges": "frgs", "fork": "frk", "forks": "frks",
+    "fort": "frt ft", "freeway": "freewy frway frwy fwy", "garden": "gardn grden grdn gdn",
+    "gardens": "gdns grdns", "gateway": "gatewy gatway gtway gtwy", "glen": "gln", "glens": "glns",
+    "green": "grn", "greens": "grns", "grove": "grov grv", "groves": "grvs",
+    "harbor": "harb harbr hbr hrbor", "harbors": "hbrs", "haven": "hvn", "heights": "ht hts",
+    "highway": "highwy hiway hiwy hway hwy", "hill": "hl", "hills": "hls", "hollow": "hllw hollows holw holws",
+    "inlet": "inlt", "island": "is islnd", "islands": "islnds iss", "isle": "isles",
+    "junction": "jct jction jctn junctn juncton", "junctions": "jctns jcts", "key": "ky", "keys": "kys",
+    "knoll": "knl knol", "knolls": "knls", "lake": "lk", "lakes": "lks", "landing": "lndg lndng",
+    "lane": "ln", "light": "lgt", "lights": "lgts", "loaf": "lf", "lock": "lck", "locks": "lcks",
+    "lodge": "ldg ldge lodg", "loop": "loops", "manor": "mnr", "manors": "mnrs", "meadow": "mdw",
+    "meadows": "mdws medows", "mill": "ml", "mills": "mls", "mission": "missn mssn msn", "motorway": "mtwy",
+    "mount": "mnt mt", "mountain": "mntain mntn mountin mtin mtn", "mountains": "mntns mtns", "neck": "nck",
+    "orchard": "orch orchrd", "oval": "ovl", "overpass": "opas", "park": "prk", "parkway": "parkwy pkway pkwy pky",
+    "parkways": "pkwys", "passage": "psge", "path": "paths", "pike": "pikes", "pine": "pne", "pines": "pnes",
+    "place": "pl", "plain": "pln", "plains": "plns", "plaza": "plz plza", "point": "pt", "points": "pts",
+    "port": "prt", "ports": "prts", "prairie": "pr prr", "radial": "rad radiel radl", "ranch": "ranches rnch rnchs",
+    "rapid": "rpd", "rapids": "rpds", "rest": "rst", "ridge": "rdg rdge", "ridges": "rdgs", "river": "riv rvr rivr",
+    "road": "rd", "roads": "rds", "route": "rte", "shoal": "shl", "shoals": "shls", "shore": "shoar shr",
+    "shores": "shoars shrs", "skyway": "skwy", "spring": "spg spng sprng", "springs": "spgs spngs sprngs",
+    "spur": "spurs", "square": "sq sqr sqre squ", "squares": "sqrs sqs", "station": "sta statn stn",
+    "stravenue": "stra strav straven stravn strvn strvnue", "stream": "streme strm", "street": "st str strt",
+    "streets": "sts", "summit": "smt sumit sumitt", "terrace": "ter terr", "throughway": "trwy",
+    "trace": "traces trce", "track": "tracks trak trk trks", "trafficway": "trfy", "trail": "trails trl trls",
+    "trailer": "trlr trlrs", "tunnel": "tunel tunl tunls tunnels tunnl", "turnpike": "trnpk turnpk tpke",
+    "underpass": "upas", "union": "un", "unions": "uns", "valley": "vally vlly vly", "valleys": "vlys",
+    "viaduct": "vdct via viadct", "view": "vw", "views": "vws", "village": "vill villag villg villiage vlg",
+    "villages": "vlgs", "ville": "vl", "vista": "vis vist vst vsta", "way": "wy", "well": "wl", "wells": "wls",
+}
+
+# Appendix C2: secondary unit designators
+_USPS_UNITS = {
+    "apartment": "apt", "basement": "bsmt", "building": "bldg", "department": "dept", "floor": "fl",
+    "front": "frnt", "hanger": "hngr", "lobby": "lbby", "lower": "lowr", "office": "ofc", "penthouse": "ph",
+    "room": "rm", "space": "spc", "suite": "ste", "upper": "uppr",
+}
+
+USPS_ADDRESS_TABLE: Dict[str, str] = {
+    abbr: full for table in (_USPS_SUFFIXES, _USPS_UNITS) for full, abbrs in table.items() for abbr in abbrs.split()
+}
+
+ADDRESS_PROFILES = {"legacy": LEGACY_ADDRESS_TABLE, "usps": USPS_ADDRESS_TABLE}
+ADDRESS_PROFILE = os.getenv("ADDRESS_NORMALIZATION", "legacy")
+NORMALIZE_CACHE_SIZE = int(os.getenv("NORMALIZE_CACHE_SIZE", "65536"))
+
+_ALNUM = re.compile(r"[a-z0-9]+")
+_WORD = re.compile(r"\w+")  # what re's \b considered a word in the old per-abbreviation substitutions
+
+def _batch(fn, values: Iterable[Optional[str]]) -> List[str]:
+    done: Dict[Optional[str], str] = {}
+    out = []
+    for v in values:
+        n = done.get(v)
+        if n is None:
+            n = done[v] = fn(v)
+        out.append(n)
+    return out
+
+class Normalizer:
+    """Name and address normalization with one address profile and a bounded LRU memo per kind."""
+
+    def __init__(self, profile: str = "legacy", suffixes: Iterable[str] = COMMON_SUFFIXES,
+                 cache_size: int = NORMALIZE_CACHE_SIZE):
+        if profile not in ADDRESS_PROFILES:
+            raise ValueError(f"unknown address profile {profile!r}; expected one of {', '.join(ADDRESS_PROFILES)}")
+        self.profile = profile
+        self.table = ADDRESS_PROFILES[profile]
+        # Checked in order, each at most once, like the original endswith() loop
+        self.suffixes: Tuple[Tuple[str, ...], ...] = tuple(tuple(s.split()) for s in suffixes)
+        self._suffix_ends = frozenset(s[-1] for s in self.suffixes)
+        self.name = lru_cache(maxsize=cache_size)(self._name)
+        self.address = lru_cache(maxsize=cache_size)(self._address)
+
+    def _name(self, name: Optional[str]) -> str:
+        if not name:
+            return ""
+        tokens = _ALNUM.findall(name.lower())
+        if not tokens or tokens[-1] not in self._suffix_ends:
+            return " ".join(tokens)
+        for suffix in self.suffixes:
+            n = len(suffix)
+            if len(tokens) > n and tuple(tokens[-n:]) == suffix:
+                del tokens[-n:]
+        return " ".join(tokens)
+
+    def _address(self, addr: Optional[str]) -> str:
+        if not addr:
+            return ""
+        s = addr.lower()
+        table = self.table
+        if s.isascii() and "_" not in s:
+            # Here \w runs and [a-z0-9] runs are the same tokens
+            return " ".join([table.get(t, t) for t in _ALNUM.findall(s)])
+        tokens = []
+        for word in _WORD.findall(s):
+            word = table.get(word, word)
+            if word.isascii() and word.isalnum():
+                tokens.append(word)
+            else:
+                tokens.extend(_ALNUM.findall(word))
+        return " ".join(tokens)
+
+    def names(self, values: Iterable[Optional[str]]) -> List[str]:
+        """Normalize a column of names; repeated values are normalized once (bypassing the memo)."""
+        return _batch(self._name, values)
+
+    def addresses(self, values: Iterable[Optional[str]]) -> List[str]:
+        return _batch(self._address, values)
+
+    def cache_info(self) -> Dict[str, Dict[str, int]]:
+        return {kind: fn.cache_info()._asdict() for kind, fn in (("name", self.name), ("address", self.address))}
+
+    def cache_clear(self) -> None:
+        self.name.cache_clear()
+        self.address.cache_clear()
+
+NORMALIZER = Normalizer(ADDRESS_PROFILE)
@@ -1,43 +1,34 @@
 from __future__ import annotations
 import re
 from difflib import SequenceMatcher
-from typing import Optional
-
-COMMON_SUFFIXES = [
-    " llc", " inc", " corp", " co", " ltd", " company", " incorporated", " foundation",
-    " pc", " pllc", " llp", " lp", " nonprofit", " non profit"
-]
+from typing import Iterable, List, Optional
+from core.normalize import COMMON_SUFFIXES, NORMALIZER  # noqa: F401 (COMMON_SUFFIXES re-exported)
 
 def normalize_name(name: Optional[str]) -> str:
-    if not name:
-        return ""
-    s = name.strip().lower()
-    s = re.sub(r"[^a-z0-9\s]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    for suf in COMMON_SUFFIXES:
-        if s.endswith(suf):
-            s = s[: -len(suf)].strip()
-    return s
+    return NORMALIZER.name(name)
 
 def normalize_address(addr: Optional[str]) -> str:
-    if not addr:
-        return ""
-    s = addr.strip().lower()
-    s = re.sub(r"\bst\b", "street", s)
-    s = re.sub(r"\brd\b", "road", s)
-    s = re.sub(r"\bave\b", "avenue", s)
-    s = re.sub(r"\bblvd\b", "boulevard", s)
-    s = re.sub(r"\bdr\b", "drive", s)
-    s = re.sub(r"\bapt\b", "apartment", s)
-    s = re.sub(r"[^a-z0-9\s]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+    return NORMALIZER.address(addr)
+
+def normalize_names(values: Iterable[Optional[str]]) -> List[str]:
+    """normalize_name over a whole column, each distinct value once."""
+    return NORMALIZER.names(values)
+
+def normalize_addresses(values: Iterable[Optional[str]]) -> List[str]:
+    return NORMALIZER.addresses(values)
 
 def similarity(a: str, b: str) -> float:
     if not a or not b:
         return 0.0
     return SequenceMatcher(None, a, b).ratio()
 
+def similar_above(a: str, b: str, threshold: float) -> bool:
+    """similarity(a, b) > threshold, trying difflib's cheap upper bounds first."""
+    if not a or not b:
+        return False
+    sm = SequenceMatcher(None, a, b)
+    return sm.real_quick_ratio() > threshold and sm.quick_ratio() > threshold and sm.ratio() > threshold
+
 def safe_int(v) -> Optional[int]:
     if v is None:
         return None
@@ -57,6 +48,31 @@ def safe_float(v) -> float:
     except Exception:
         return 0.0
 
+def normalize_fiscal_year(v) -> Optional[int]:
+    """Map free-form fiscal years ("FY2024", "FY24", "2023-24", "2024.0") to an int year.
+
+    Ranges resolve to the year the fiscal period ends in ("2023-24" -> 2024).
+    """
+    if v is None:
+        return None
+    s = str(v).strip().upper()
+    if not s:
+        return None
+    m = re.match(r"^(?:FY\s*)?((?:19|20)\d{2})\s*[-/]\s*(\d{2}|\d{4})$", s)
+    if m:
+        start, end = int(m.group(1)), m.group(2)
+        if len(end) == 4:
+            return int(end)
+        year = start - start % 100 + int(end)
+        return year + 100 if year < start else year
+    m = re.search(r"(?<!\d)((?:19|20)\d{2})(?!\d)", s)
+    if m:
+        return int(m.group(1))
+    m = re.match(r"^(?:FY\s*)?(\d{2})$", s)
+    if m:
+        return 2000 + int(m.group(1))
+    return None
+
 def best_effort_zip(z) -> Optional[str]:
     if not z:
         return None
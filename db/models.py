@@ -1,7 +1,10 @@
 from __future__ import annotations
+import importlib
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, UniqueConstraint, Boolean, create_engine, Index
+from typing import Any, Dict, List, Optional
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, UniqueConstraint, Boolean, create_engine, Index, event, inspect, text
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from core.name_keys import name_keys
 
 Base = declarative_base()
 
@@ -13,6 +16,10 @@ class Entity(Base):
     entity_type = Column(String, index=True)
     name = Column(String, index=True)
     normalized_name = Column(String, index=True)
+    # Derived from normalized_name (core.name_keys); kept current by the write-time events below
+    sorted_key = Column(String, nullable=True)
+    phonetic_key = Column(String, nullable=True)
+    first_token = Column(String, nullable=True)
 
     address = Column(String, index=True, nullable=True)
     normalized_address = Column(String, index=True, nullable=True)
@@ -39,6 +46,10 @@ class Entity(Base):
     __table_args__ = (
         UniqueConstraint("city_key", "entity_type", "normalized_name", "normalized_address", name="uq_entity"),
         Index("ix_entity_city_type_score", "city_key", "entity_type", "score"),
+        Index("ix_entity_city_score_id", "city_key", "score", "id"),
+        Index("ix_entity_city_sorted_key", "city_key", "sorted_key"),
+        Index("ix_entity_city_phonetic_key", "city_key", "phonetic_key"),
+        Index("ix_entity_city_first_token", "city_key", "first_token"),
     )
 
 class Alias(Base):
@@ -47,6 +58,9 @@ class Alias(Base):
     entity_id = Column(Integer, ForeignKey("entities.id"), index=True)
     alias = Column(String, index=True)
     normalized_alias = Column(String, index=True)
+    sorted_key = Column(String, index=True, nullable=True)
+    phonetic_key = Column(String, index=True, nullable=True)
+    first_token = Column(String, index=True, nullable=True)
     source = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     entity = relationship("Entity", back_populates="aliases")
@@ -102,6 +116,199 @@ class Payment(Base):
 
     entity = relationship("Entity", back_populates="payments")
 
+class PaymentYearTotal(Base):
+    """Per-entity payment totals by normalized (integer) fiscal year."""
+    __tablename__ = "payment_year_totals"
+    id = Column(Integer, primary_key=True)
+    city_key = Column(String, index=True)
+    entity_id = Column(Integer, ForeignKey("entities.id"), index=True)
+    fiscal_year = Column(Integer, index=True)
+    total_amount = Column(Float, default=0.0)
+    payment_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        UniqueConstraint("entity_id", "fiscal_year", name="uq_payment_year_total"),
+        Index("ix_payment_year_city_year", "city_key", "fiscal_year"),
+    )
+
+class ScoreRun(Base):
+    """One compute_scores pass; snapshots hang off it."""
+    __tablename__ = "score_runs"
+    id = Column(Integer, primary_key=True)
+    city_key = Column(String, index=True)
+    entity_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ScoreSnapshot(Base):
+    """Append-only per-entity score for a run. rule_mask holds scoring.modules RULE_* bits."""
+    __tablename__ = "score_snapshots"
+    run_id = Column(Integer, ForeignKey("score_runs.id"), primary_key=True)
+    entity_id = Column(Integer, ForeignKey("entities.id"), primary_key=True)
+    score = Column(Float, default=0.0)
+    rule_mask = Column(Integer, default=0)
+    __table_args__ = (Index("ix_score_snapshot_entity_run", "entity_id", "run_id"),)
+
+class DataVersion(Base):
+    """Per-city counter bumped by every write path; keys the response cache."""
+    __tablename__ = "data_versions"
+    city_key = Column(String, primary_key=True)
+    version = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class SearchDoc(Base):
+    """Denormalized search text per entity; indexed by FTS5 (SQLite) or pg_trgm/tsvector (PostgreSQL)."""
+    __tablename__ = "entity_search_docs"
+    entity_id = Column(Integer, ForeignKey("entities.id"), primary_key=True, autoincrement=False)
+    city_key = Column(String, index=True)
+    names = Column(Text, default="")  # name and aliases, one per line
+    identifiers = Column(Text, default="")  # license id, NPI and Identifier values
+    address = Column(Text, default="")
+
+class SourceStat(Base):
+    """Per-city payment/evidence rollups by source, tag and data_source; kept current by write paths."""
+    __tablename__ = "source_stats"
+    id = Column(Integer, primary_key=True)
+    city_key = Column(String, index=True)
+    stat_type = Column(String)  # payment_source, evidence_source, tag, data_source
+    key = Column(String, nullable=True)
+    row_count = Column(Integer, default=0)
+    total_amount = Column(Float, default=0.0)
+    first_created = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        UniqueConstraint("city_key", "stat_type", "key", name="uq_source_stat"),
+        Index("ix_source_stat_city_type", "city_key", "stat_type"),
+    )
+
+class EntityKey(Base):
+    """Values an entity can share with others (address, identifiers, names, LSH bands); see services.entity_graph."""
+    __tablename__ = "entity_keys"
+    id = Column(Integer, primary_key=True)
+    city_key = Column(String)
+    entity_id = Column(Integer, ForeignKey("entities.id"), index=True)
+    signal = Column(String)
+    key = Column(String)
+    __table_args__ = (Index("ix_entity_key_lookup", "city_key", "signal", "key", "entity_id"),)
+
+class EntityEdge(Base):
+    """One shared signal between two entities of a city (entity_a < entity_b)."""
+    __tablename__ = "entity_edges"
+    id = Column(Integer, primary_key=True)
+    city_key = Column(String)
+    entity_a = Column(Integer, ForeignKey("entities.id"))
+    entity_b = Column(Integer, ForeignKey("entities.id"))
+    signal = Column(String)  # address, license_id, npi, identifier, name, person_name, similar_name
+    weight = Column(Float, default=1.0)
+    key = Column(String, nullable=True)  # the shared value (None for similar_name)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        UniqueConstraint("entity_a", "entity_b", "signal", name="uq_entity_edge"),
+        Index("ix_entity_edge_b", "entity_b"),
+        Index("ix_entity_edge_city_signal", "city_key", "signal"),
+    )
+
+class EntityComponent(Base):
+    """Connected component of the entity graph; component_id is the lowest member id. Entities without edges have no row."""
+    __tablename__ = "entity_components"
+    entity_id = Column(Integer, ForeignKey("entities.id"), primary_key=True, autoincrement=False)
+    city_key = Column(String)
+    component_id = Column(Integer, index=True)
+    size = Column(Integer, default=0)
+    __table_args__ = (Index("ix_entity_component_city_size", "city_key", "size", "component_id"),)
+
+class LookupCacheEntry(Base):
+    """Cached outcome of an external validation lookup (search, DNS, HTTP, geocode); ok=False rows are negative entries."""
+    __tablename__ = "lookup_cache"
+    id = Column(Integer, primary_key=True)
+    kind = Column(String)
+    key = Column(String)  # normalized query, host, URL or address
+    ok = Column(Boolean, default=True)
+    value = Column(Text, default="null")  # JSON
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, index=True)
+    __table_args__ = (UniqueConstraint("kind", "key", name="uq_lookup_cache"),)
+
+class AddressPoint(Base):
+    """One point from a loaded address gazetteer (services.gazetteer); street/city are normalize_address()d."""
+    __tablename__ = "address_points"
+    id = Column(Integer, primary_key=True)
+    source = Column(String, index=True)
+    number = Column(String)
+    street = Column(String)
+    unit = Column(String, nullable=True)
+    city = Column(String, nullable=True)
+    state = Column(String, nullable=True)
+    zip = Column(String, nullable=True)
+    lat = Column(Float, nullable=True)
+    lon = Column(Float, nullable=True)
+    is_cmra = Column(Boolean, default=False)  # commercial mail receiving agency (mailbox store)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index("ix_address_point_street_number_zip", "street", "number", "zip"),
+        Index("ix_address_point_zip_street", "zip", "street"),
+        Index("ix_address_point_city_street", "city", "state", "street"),
+    )
+
+class EntityValidation(Base):
+    """Latest calculate_validation_score result per entity (services.validation_jobs)."""
+    __tablename__ = "entity_validations"
+    entity_id = Column(Integer, ForeignKey("entities.id"), primary_key=True, autoincrement=False)
+    city_key = Column(String)
+    validation_score = Column(Float, default=50.0)
+    red_flag_count = Column(Integer, default=0)
+    red_flags = Column(Text, default="[]")  # JSON list
+    job_id = Column(Integer, nullable=True)
+    validated_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index("ix_entity_validation_city_score", "city_key", "validation_score", "entity_id"),
+        Index("ix_entity_validation_city_at", "city_key", "validated_at"),
+    )
+
+class ValidationJob(Base):
+    """Background validation walk over a city's entities by descending score, checkpointed per batch."""
+    __tablename__ = "validation_jobs"
+    id = Column(Integer, primary_key=True)
+    city_key = Column(String, index=True)
+    entity_type = Column(String, nullable=True)
+    status = Column(String, default="running")  # running, paused, done, failed
+    max_entities = Column(Integer, nullable=True)  # stop after examining this many (None: all)
+    batch_size = Column(Integer, default=50)
+    concurrency = Column(Integer, default=8)
+    freshness_days = Column(Integer, default=30)  # skip entities validated more recently than this
+    search_web = Column(Boolean, default=True)
+    cursor_score = Column(Float, nullable=True)  # (score, id) of the last entity examined
+    cursor_id = Column(Integer, nullable=True)
+    processed = Column(Integer, default=0)
+    validated = Column(Integer, default=0)
+    skipped = Column(Integer, default=0)
+    errors = Column(Integer, default=0)
+    last_error = Column(Text, nullable=True)
+    owner = Column(String, nullable=True)  # worker currently running it
+    heartbeat_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class NetworkMetric(Base):
+    """Per-component rollups of the entity graph, tagged with the city data version they were computed at."""
+    __tablename__ = "network_metrics"
+    id = Column(Integer, primary_key=True)
+    city_key = Column(String)
+    component_id = Column(Integer)
+    data_version = Column(Integer, default=0)
+    size = Column(Integer, default=0)
+    edge_count = Column(Integer, default=0)
+    total_dollars = Column(Float, default=0.0)
+    avg_score = Column(Float, default=0.0)
+    max_degree = Column(Integer, default=0)
+    betweenness_sampled = Column(Boolean, default=False)
+    hotspots = Column(Text, default="[]")  # JSON: top members by betweenness, then degree
+    computed_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        UniqueConstraint("city_key", "component_id", name="uq_network_metric"),
+        Index("ix_network_metric_city_dollars", "city_key", "total_dollars"),
+    )
+
 class ReviewMatch(Base):
     __tablename__ = "review_matches"
     id = Column(Integer, primary_key=True)
@@ -115,6 +322,9 @@ class ReviewMatch(Base):
     resolved = Column(Boolean, default=False)
     resolution = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index("ix_review_open_queue", "city_key", "resolved", "confidence", "created_at", "id"),
+    )
 
 class FOIARequest(Base):
     __tablename__ = "foia_requests"
@@ -137,8 +347,139 @@ class FOIARequest(Base):
     
     entity = relationship("Entity", back_populates="foia_requests")
 
-def make_engine(db_url: str):
-    return create_engine(db_url, future=True)
+# Production SQLite profile: WAL lets readers run alongside the single writer,
+# synchronous=NORMAL only fsyncs at checkpoints (safe under WAL), and
+# busy_timeout makes a blocked writer wait instead of failing immediately.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 268435456,  # 256 MB
+    "cache_size": -65536,  # negative = KiB, i.e. 64 MB
+    "busy_timeout": 5000,  # ms
+    "temp_store": "MEMORY",
+}
+
+def apply_sqlite_pragmas(engine, pragmas: Optional[Dict[str, Any]] = None) -> None:
+    """Set PRAGMAs on every new DBAPI connection of a SQLite engine (sync or async)."""
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+    if not pragmas:
+        return
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_conn, _record):
+        cursor = dbapi_conn.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+def make_engine(db_url: str, pool_size: int = 5, max_overflow: int = 10, pool_timeout: int = 30,
+                pool_recycle: int = 1800, pool_pre_ping: bool = True, sqlite_pragmas: Optional[Dict[str, Any]] = None):
+    kwargs = {"future": True, "pool_pre_ping": pool_pre_ping, "pool_recycle": pool_recycle}
+    # In-memory SQLite uses a per-thread singleton pool without size/overflow settings
+    if ":memory:" not in db_url and db_url != "sqlite://":
+        kwargs.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout)
+    engine = create_engine(db_url, **kwargs)
+    if engine.dialect.name == "sqlite":
+        apply_sqlite_pragmas(engine, sqlite_pragmas)
+    return engine
+
+# Async driver per backend: (SQLAlchemy scheme, module that must be importable)
+ASYNC_DRIVERS = {
+    "sqlite": ("sqlite+aiosqlite", "aiosqlite"),
+    "postgresql": ("postgresql+asyncpg", "asyncpg"),
+}
+
+def make_async_engine(db_url: str, pool_size: int = 5, max_overflow: int = 10, pool_timeout: int = 30,
+                      pool_recycle: int = 1800, pool_pre_ping: bool = True, sqlite_pragmas: Optional[Dict[str, Any]] = None):
+    """AsyncEngine for the same database as db_url, or None if no async driver is installed."""
+    scheme, sep, rest = db_url.partition("://")
+    driver = ASYNC_DRIVERS.get(scheme.split("+")[0])
+    if not sep or not driver:
+        return None
+    try:
+        importlib.import_module(driver[1])
+        from sqlalchemy.ext.asyncio import create_async_engine
+    except ImportError:
+        return None
+    kwargs = {"pool_pre_ping": pool_pre_ping, "pool_recycle": pool_recycle}
+    # aiosqlite engines default to NullPool, which takes no sizing arguments
+    if driver[1] == "asyncpg":
+        kwargs.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout)
+    engine = create_async_engine(f"{driver[0]}://{rest}", **kwargs)
+    if driver[1] == "aiosqlite":
+        apply_sqlite_pragmas(engine, sqlite_pragmas)
+    return engine
+
+def pool_stats(engine) -> dict:
+    """Snapshot of connection pool usage (fields the pool type doesn't track are omitted)."""
+    pool = engine.pool
+    stats = {"pool_class": type(pool).__name__, "status": pool.status()}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        fn = getattr(pool, name, None)
+        if callable(fn):
+            stats[name] = fn()
+    return stats
+
+def dialect_name(bind) -> str:
+    """Dialect name for a Session, Connection or Engine."""
+    if hasattr(bind, "get_bind"):
+        bind = bind.get_bind()
+    return bind.dialect.name
+
+def ensure_indexes(engine):
+    """Create indexes declared on the models that an older database is missing.
+
+    create_all() only creates missing tables, so indexes added to existing
+    tables would otherwise never reach deployed databases.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+def ensure_columns(engine) -> List[str]:
+    """Add columns declared on the models that an older database's tables are missing.
+
+    Like indexes, create_all() never adds columns to existing tables. New
+    columns are added as plain nullable columns (backfilled by their owners,
+    e.g. services.renormalize.ensure_name_keys). Returns "table.column" names.
+    """
+    insp = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if not insp.has_table(table.name):
+                continue
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name not in existing:
+                    conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(col.name)} {col.type.compile(dialect=engine.dialect)}"))
+                    added.append(f"{table.name}.{col.name}")
+    return added
+
+def _name_changed(target, attr: str) -> bool:
+    return inspect(target).attrs[attr].history.has_changes()
+
+@event.listens_for(Entity, "before_insert")
+def _entity_name_keys_insert(mapper, connection, target):
+    target.sorted_key, target.phonetic_key, target.first_token = name_keys(target.normalized_name)
+
+@event.listens_for(Entity, "before_update")
+def _entity_name_keys_update(mapper, connection, target):
+    if _name_changed(target, "normalized_name"):
+        target.sorted_key, target.phonetic_key, target.first_token = name_keys(target.normalized_name)
+
+@event.listens_for(Alias, "before_insert")
+def _alias_name_keys_insert(mapper, connection, target):
+    target.sorted_key, target.phonetic_key, target.first_token = name_keys(target.normalized_alias)
+
+@event.listens_for(Alias, "before_update")
+def _alias_name_keys_update(mapper, connection, target):
+    if _name_changed(target, "normalized_alias"):
+        target.sorted_key, target.phonetic_key, target.first_token = name_keys(target.normalized_alias)
 
 def make_session(engine):
     return sessionmaker(bind=engine, autoflush=False, autocommit=False)()
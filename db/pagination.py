@@ -0,0 +1,63 @@
+from __future__ import annotations
+import base64
+import json
+import math
+from datetime import datetime
+from typing import Any, List, Optional, Sequence
+from sqlalchemy import select, func, text
+from db.models import dialect_name
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """Opaque, URL-safe token for the sort key of the last row on a page."""
+    raw = json.dumps(list(values), separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def _typed(value: Any, kind: type) -> Any:
+    # bool is an int subclass, and json.loads accepts NaN/Infinity
+    if isinstance(value, bool):
+        raise ValueError("Invalid cursor")
+    if kind is float and isinstance(value, (int, float)) and math.isfinite(value):
+        return float(value)
+    if kind is int and isinstance(value, int):
+        return value
+    if kind is str and isinstance(value, str):
+        return value
+    if kind is datetime and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    raise ValueError("Invalid cursor")
+
+def decode_cursor(token: Optional[str], size: int, types: Optional[Sequence[type]] = None) -> Optional[List[Any]]:
+    """Inverse of encode_cursor. Raises ValueError on a malformed token.
+
+    With `types` (one of float, int, str, datetime per value) the values are
+    checked and converted too: float accepts ints, datetime parses the ISO
+    string encode_cursor wrote.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw.decode("utf-8"))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    if types:
+        return [_typed(v, t) for v, t in zip(values, types)]
+    return values
+
+def estimate_count(session, stmt) -> tuple[int, bool]:
+    """Row count for a SELECT. Returns (count, estimated).
+
+    On PostgreSQL this reads the planner's row estimate (EXPLAIN) so it stays
+    cheap on large tables; other backends get an exact COUNT(*).
+    """
+    if dialect_name(session) == "postgresql":
+        bind = session.get_bind() if hasattr(session, "get_bind") else session
+        compiled = stmt.compile(dialect=bind.dialect, compile_kwargs={"literal_binds": True})
+        plan = session.execute(text(f"EXPLAIN (FORMAT JSON) {compiled}")).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"]), True
+    count = session.execute(select(func.count()).select_from(stmt.order_by(None).limit(None).subquery())).scalar()
+    return int(count or 0), False
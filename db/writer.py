@@ -0,0 +1,59 @@
+"""
+Single-writer queue
+
+SQLite allows one writer at a time; concurrent write transactions wait on the
+busy timeout and eventually fail with "database is locked". Routing bulk
+writes (ingest, tagging, scoring) through one dedicated thread makes them run
+back to back instead of contending, while WAL keeps readers unblocked.
+"""
+
+from __future__ import annotations
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+class WriteQueue:
+    """FIFO of write jobs executed one at a time on a single thread."""
+
+    def __init__(self, name: str = "db-writer"):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _wrap(self, fn: Callable, args, kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.pending -= 1
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self._lock:
+            self.pending += 1
+        try:
+            return self._executor.submit(self._wrap, fn, args, kwargs)
+        except RuntimeError:
+            with self._lock:
+                self.pending -= 1
+            raise
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Queue fn(*args, **kwargs) and await its result (exceptions propagate)."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"pending": self.pending, "completed": self.completed, "failed": self.failed}
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
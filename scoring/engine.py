@@ -1,10 +1,12 @@
 from __future__ import annotations
 from typing import Dict, List
 from sqlalchemy import select, func
-from db.models import Entity, Payment
-from scoring.modules import payment_volume_score, payments_per_capacity_score, multi_entity_address_score, missing_basics_score
+from db.models import Entity, Payment, EntityValidation
+from scoring.modules import payment_volume_score, payments_per_capacity_score, multi_entity_address_score, missing_basics_score, payment_spike_score, validation_score_rule
+from scoring.history import record_score_run, prune_score_runs, DEFAULT_RETAIN_RUNS
+from services.timeseries import detect_spikes
 
-def compute_scores(session, city_key: str) -> int:
+def compute_scores(session, city_key: str, retain_runs: int = DEFAULT_RETAIN_RUNS) -> int:
     ents = session.execute(select(Entity).where(Entity.city_key == city_key)).scalars().all()
 
     addr_counts: Dict[str, int] = {}
@@ -17,28 +19,44 @@ def compute_scores(session, city_key: str) -> int:
         if a:
             addr_counts[a] = int(c)
 
+    spikes = detect_spikes(session, city_key)
+    validation = dict(session.execute(
+        select(EntityValidation.entity_id, EntityValidation.validation_score).where(EntityValidation.city_key == city_key)
+    ).all())
+
     updated = 0
+    snapshot = []
     for e in ents:
         pays = session.execute(select(Payment).where(Payment.entity_id == e.id)).scalars().all()
         total = sum(p.amount for p in pays)
 
         pts = 0.0
         notes: List[str] = []
+        rules = 0
 
-        r1 = payment_volume_score(total); pts += r1.points; notes += r1.notes
+        r1 = payment_volume_score(total); pts += r1.points; notes += r1.notes; rules |= r1.rules
         if e.entity_type == "childcare":
-            r2 = payments_per_capacity_score(total, e.license_capacity); pts += r2.points; notes += r2.notes
+            r2 = payments_per_capacity_score(total, e.license_capacity); pts += r2.points; notes += r2.notes; rules |= r2.rules
 
         if e.normalized_address:
-            r3 = multi_entity_address_score(addr_counts.get(e.normalized_address, 1)); pts += r3.points; notes += r3.notes
+            r3 = multi_entity_address_score(addr_counts.get(e.normalized_address, 1)); pts += r3.points; notes += r3.notes; rules |= r3.rules
+
+        spike = spikes.get(e.id)
+        if spike:
+            r5 = payment_spike_score(spike["growth"], spike["increase"]); pts += r5.points; notes += r5.notes; rules |= r5.rules
+
+        r6 = validation_score_rule(validation.get(e.id)); pts += r6.points; notes += r6.notes; rules |= r6.rules
 
         missing_id = (e.entity_type == "health" and not e.npi) or (e.entity_type == "childcare" and not e.license_id)
         r4 = missing_basics_score(missing_address=not bool(e.address), missing_id=missing_id)
-        pts += r4.points; notes += r4.notes
+        pts += r4.points; notes += r4.notes; rules |= r4.rules
 
         e.score = float(pts)
         e.score_notes = "; ".join(notes)
+        snapshot.append((e.id, e.score, rules))
         updated += 1
 
+    record_score_run(session, city_key, snapshot)
+    prune_score_runs(session, city_key, retain_runs)
     session.commit()
     return updated
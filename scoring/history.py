@@ -0,0 +1,137 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import select, delete, insert, func, union
+from db.models import Entity, ScoreRun, ScoreSnapshot
+from scoring.modules import decode_rules
+
+# Number of runs kept per city when no retention is configured
+DEFAULT_RETAIN_RUNS = 30
+
+def record_score_run(session, city_key: str, rows: Sequence[Tuple[int, float, int]]) -> int:
+    """Append a run plus one snapshot per (entity_id, score, rule_mask). Returns the run id."""
+    run = ScoreRun(city_key=city_key, entity_count=len(rows))
+    session.add(run)
+    session.flush()
+    if rows:
+        session.execute(insert(ScoreSnapshot), [
+            {"run_id": run.id, "entity_id": eid, "score": float(score), "rule_mask": int(mask)}
+            for eid, score, mask in rows
+        ])
+    return run.id
+
+def prune_score_runs(session, city_key: str, keep: int = DEFAULT_RETAIN_RUNS) -> int:
+    """Delete all but the newest `keep` runs for a city. Returns the number of runs removed."""
+    if keep is None or keep <= 0:
+        return 0
+    old_ids = session.execute(
+        select(ScoreRun.id).where(ScoreRun.city_key == city_key)
+        .order_by(ScoreRun.id.desc()).offset(keep)
+    ).scalars().all()
+    if not old_ids:
+        return 0
+    session.execute(delete(ScoreSnapshot).where(ScoreSnapshot.run_id.in_(old_ids)))
+    session.execute(delete(ScoreRun).where(ScoreRun.id.in_(old_ids)))
+    return len(old_ids)
+
+def list_score_runs(session, city_key: str, limit: int = 20) -> List[Dict]:
+    runs = session.execute(
+        select(ScoreRun.id, ScoreRun.entity_count, ScoreRun.created_at)
+        .where(ScoreRun.city_key == city_key)
+        .order_by(ScoreRun.id.desc()).limit(limit)
+    ).all()
+    return [
+        {"run_id": r.id, "entity_count": r.entity_count, "created_at": r.created_at.isoformat() if r.created_at else None}
+        for r in runs
+    ]
+
+def _ranked_run(run_id: int):
+    return (
+        select(
+            ScoreSnapshot.entity_id,
+            ScoreSnapshot.score,
+            ScoreSnapshot.rule_mask,
+            func.rank().over(order_by=ScoreSnapshot.score.desc()).label("rank"),
+        )
+        .where(ScoreSnapshot.run_id == run_id)
+        .subquery()
+    )
+
+def top_movers(session, run_a: int, run_b: int, limit: int = 50, direction: str = "abs") -> List[Dict]:
+    """Entities whose score changed the most from run_a to run_b.
+
+    Both sides are read through the (run_id, entity_id) primary key, so the cost
+    is proportional to the size of the two runs rather than the whole history.
+    Entities in only one run count as scoring 0 in the other (score and rank
+    None there), so new ones and ones dropped or merged away both show up.
+    direction: "up", "down" or "abs".
+    """
+    a = _ranked_run(run_a)
+    b = _ranked_run(run_b)
+    ids = union(
+        select(ScoreSnapshot.entity_id).where(ScoreSnapshot.run_id == run_a),
+        select(ScoreSnapshot.entity_id).where(ScoreSnapshot.run_id == run_b),
+    ).subquery()
+    delta = (func.coalesce(b.c.score, 0.0) - func.coalesce(a.c.score, 0.0)).label("delta")
+    q = (
+        select(
+            ids.c.entity_id, Entity.name, Entity.entity_type,
+            a.c.score.label("score_a"), b.c.score.label("score_b"), delta,
+            a.c.rank.label("rank_a"), b.c.rank.label("rank_b"),
+            a.c.rule_mask.label("rules_a"), b.c.rule_mask.label("rules_b"),
+        )
+        .select_from(ids)
+        .outerjoin(a, a.c.entity_id == ids.c.entity_id)
+        .outerjoin(b, b.c.entity_id == ids.c.entity_id)
+        .outerjoin(Entity, Entity.id == ids.c.entity_id)
+    )
+    if direction == "up":
+        q = q.where(delta > 0).order_by(delta.desc())
+    elif direction == "down":
+        q = q.where(delta < 0).order_by(delta.asc())
+    else:
+        q = q.where(delta != 0).order_by(func.abs(delta).desc())
+    rows = session.execute(q.order_by(ids.c.entity_id).limit(limit)).all()
+    out = []
+    for r in rows:
+        rules_a, rules_b = int(r.rules_a or 0), int(r.rules_b or 0)
+        out.append({
+            "entity_id": r.entity_id,
+            "name": r.name,
+            "type": r.entity_type,
+            "score_a": float(r.score_a) if r.score_a is not None else None,
+            "score_b": float(r.score_b) if r.score_b is not None else None,
+            "delta": float(r.delta or 0.0),
+            "rank_a": int(r.rank_a) if r.rank_a is not None else None,
+            "rank_b": int(r.rank_b) if r.rank_b is not None else None,
+            "rules_added": decode_rules(rules_b & ~rules_a),
+            "rules_removed": decode_rules(rules_a & ~rules_b),
+        })
+    return out
+
+def entity_score_history(session, entity_id: int, limit: int = 50) -> List[Dict]:
+    """Newest-first score history for one entity, read via the (entity_id, run_id) index."""
+    rows = session.execute(
+        select(ScoreSnapshot.run_id, ScoreSnapshot.score, ScoreSnapshot.rule_mask, ScoreRun.created_at)
+        .join(ScoreRun, ScoreRun.id == ScoreSnapshot.run_id)
+        .where(ScoreSnapshot.entity_id == entity_id)
+        .order_by(ScoreSnapshot.run_id.desc())
+        .limit(limit)
+    ).all()
+    return [
+        {
+            "run_id": r.run_id,
+            "score": float(r.score or 0.0),
+            "rules": decode_rules(int(r.rule_mask or 0)),
+            "created_at": r.created_at.isoformat() if r.created_at else None,
+        }
+        for r in rows
+    ]
+
+def latest_run_ids(session, city_key: str, n: int = 2) -> List[int]:
+    return session.execute(
+        select(ScoreRun.id).where(ScoreRun.city_key == city_key)
+        .order_by(ScoreRun.id.desc()).limit(n)
+    ).scalars().all()
+
+def run_city(session, run_id: int) -> Optional[str]:
+    return session.execute(select(ScoreRun.city_key).where(ScoreRun.id == run_id)).scalar_one_or_none()
@@ -2,44 +2,93 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import List
 
+# Rule bits recorded in score snapshots (ScoreSnapshot.rule_mask).
+# Append new rules at the end; never renumber existing bits.
+RULE_HIGH_VOLUME = 1 << 0
+RULE_VERY_HIGH_VOLUME = 1 << 1
+RULE_EXTREME_VOLUME = 1 << 2
+RULE_HIGH_PER_CAPACITY = 1 << 3
+RULE_VERY_HIGH_PER_CAPACITY = 1 << 4
+RULE_SHARED_ADDRESS = 1 << 5
+RULE_ADDRESS_CLUSTER = 1 << 6
+RULE_MISSING_ADDRESS = 1 << 7
+RULE_MISSING_ID = 1 << 8
+RULE_PAYMENT_SPIKE = 1 << 9
+RULE_EXTREME_SPIKE = 1 << 10
+RULE_LOW_VALIDATION = 1 << 11
+
+RULE_NAMES = {
+    RULE_HIGH_VOLUME: "high_volume",
+    RULE_VERY_HIGH_VOLUME: "very_high_volume",
+    RULE_EXTREME_VOLUME: "extreme_volume",
+    RULE_HIGH_PER_CAPACITY: "high_per_capacity",
+    RULE_VERY_HIGH_PER_CAPACITY: "very_high_per_capacity",
+    RULE_SHARED_ADDRESS: "shared_address",
+    RULE_ADDRESS_CLUSTER: "address_cluster",
+    RULE_MISSING_ADDRESS: "missing_address",
+    RULE_MISSING_ID: "missing_id",
+    RULE_PAYMENT_SPIKE: "payment_spike",
+    RULE_EXTREME_SPIKE: "extreme_spike",
+    RULE_LOW_VALIDATION: "low_validation",
+}
+
+def decode_rules(mask: int) -> List[str]:
+    return [name for bit, name in RULE_NAMES.items() if mask & bit]
+
 @dataclass
 class ScoreResult:
     points: float
     notes: List[str]
+    rules: int = 0
 
 def payment_volume_score(total: float) -> ScoreResult:
-    pts, notes = 0.0, []
+    pts, notes, rules = 0.0, [], 0
     if total >= 250_000:
-        pts += 1.5; notes.append(f"High public $ volume: ${total:,.0f}")
+        pts += 1.5; notes.append(f"High public $ volume: ${total:,.0f}"); rules |= RULE_HIGH_VOLUME
     if total >= 1_000_000:
-        pts += 2.0; notes.append("Very high public $ volume")
+        pts += 2.0; notes.append("Very high public $ volume"); rules |= RULE_VERY_HIGH_VOLUME
     if total >= 5_000_000:
-        pts += 1.0; notes.append("Extreme public $ volume")
-    return ScoreResult(pts, notes)
+        pts += 1.0; notes.append("Extreme public $ volume"); rules |= RULE_EXTREME_VOLUME
+    return ScoreResult(pts, notes, rules)
 
 def payments_per_capacity_score(total: float, capacity):
     if not capacity or capacity <= 0:
         return ScoreResult(0.0, [])
     per = total / capacity
-    pts, notes = 0.0, []
+    pts, notes, rules = 0.0, [], 0
     if per >= 20_000:
-        pts += 1.5; notes.append(f"High $ per licensed capacity: ${per:,.0f}/slot")
+        pts += 1.5; notes.append(f"High $ per licensed capacity: ${per:,.0f}/slot"); rules |= RULE_HIGH_PER_CAPACITY
     if per >= 40_000:
-        pts += 1.0; notes.append("Very high $ per capacity")
-    return ScoreResult(pts, notes)
+        pts += 1.0; notes.append("Very high $ per capacity"); rules |= RULE_VERY_HIGH_PER_CAPACITY
+    return ScoreResult(pts, notes, rules)
 
 def multi_entity_address_score(n: int) -> ScoreResult:
-    pts, notes = 0.0, []
+    pts, notes, rules = 0.0, [], 0
     if n >= 3:
-        pts += 1.0; notes.append(f"{n} entities share the same address")
+        pts += 1.0; notes.append(f"{n} entities share the same address"); rules |= RULE_SHARED_ADDRESS
     if n >= 6:
-        pts += 1.0; notes.append("Large cluster at same address")
-    return ScoreResult(pts, notes)
+        pts += 1.0; notes.append("Large cluster at same address"); rules |= RULE_ADDRESS_CLUSTER
+    return ScoreResult(pts, notes, rules)
 
 def missing_basics_score(missing_address: bool, missing_id: bool) -> ScoreResult:
-    pts, notes = 0.0, []
+    pts, notes, rules = 0.0, [], 0
     if missing_address:
-        pts += 0.5; notes.append("Missing address")
+        pts += 0.5; notes.append("Missing address"); rules |= RULE_MISSING_ADDRESS
     if missing_id:
-        pts += 0.5; notes.append("Missing key identifier")
-    return ScoreResult(pts, notes)
+        pts += 0.5; notes.append("Missing key identifier"); rules |= RULE_MISSING_ID
+    return ScoreResult(pts, notes, rules)
+
+def payment_spike_score(growth: float, increase: float) -> ScoreResult:
+    pts, notes, rules = 0.0, [], 0
+    if growth >= 2.0:
+        pts += 1.0; notes.append(f"Payments jumped {growth:.1f}x year over year (+${increase:,.0f})"); rules |= RULE_PAYMENT_SPIKE
+    if growth >= 5.0:
+        pts += 1.0; notes.append("Extreme year-over-year payment spike"); rules |= RULE_EXTREME_SPIKE
+    return ScoreResult(pts, notes, rules)
+
+def validation_score_rule(validation_score) -> ScoreResult:
+    """Stored calculate_validation_score result (0-100); below 50 means multiple red flags."""
+    pts, notes, rules = 0.0, [], 0
+    if validation_score is not None and validation_score < 50:
+        pts += 1.0; notes.append(f"Low validation score: {validation_score:.0f}/100"); rules |= RULE_LOW_VALIDATION
+    return ScoreResult(pts, notes, rules)
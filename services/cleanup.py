@@ -0,0 +1,136 @@
+"""
+Duplicate payment cleanup
+
+Duplicates are found in the database with ROW_NUMBER() over
+(entity_id, amount rounded to cents, fiscal_year): the lowest id in each group
+is kept and the rest are deleted in bounded batches. The "Payment: $..."
+evidence rows that ingest writes alongside each payment are deduplicated on the
+same key, read from their extracted_json (amount, fiscal_year) - not on their
+source, so evidence written by a second upload of the same ledger goes with
+its payment. Each payment batch also deletes the duplicate evidence of its
+entities in the same transaction, so no evidence outlives its payment. Both
+kinds of duplicate are collected once up front, so a cleanup costs two window
+scans however many batches it takes.
+"""
+
+from __future__ import annotations
+from typing import Dict, List
+from sqlalchemy import select, delete, func, cast, Numeric, String
+from sqlalchemy.dialects.postgresql import JSONB
+from db.models import Entity, Payment, EvidenceItem, dialect_name
+from services.response_cache import bump_data_version
+from services.source_stats import refresh_source_stats
+from services.timeseries import refresh_payment_year_totals
+
+DELETE_BATCH = 1000
+
+def _city_entities(city_key: str):
+    return select(Entity.id).where(Entity.city_key == city_key)
+
+def _matching_payments(city_key: str, source_pattern: str) -> list:
+    return [Payment.entity_id.in_(_city_entities(city_key)), Payment.source.like(f"%{source_pattern}%")]
+
+def duplicate_payments_query(city_key: str, source_pattern: str):
+    """(id, entity_id, source, tag, data_source) of every payment that duplicates an earlier one."""
+    rn = func.row_number().over(
+        partition_by=(Payment.entity_id, func.round(cast(Payment.amount, Numeric), 2), func.coalesce(Payment.fiscal_year, "")),
+        order_by=Payment.id,
+    ).label("rn")
+    ranked = (
+        select(Payment.id, Payment.entity_id, Payment.source, Payment.tag, Payment.data_source, rn)
+        .where(*_matching_payments(city_key, source_pattern))
+        .subquery()
+    )
+    return select(ranked.c.id, ranked.c.entity_id, ranked.c.source, ranked.c.tag, ranked.c.data_source).where(ranked.c.rn > 1)
+
+def _evidence_field(dialect: str, key: str):
+    if dialect == "postgresql":
+        return cast(EvidenceItem.extracted_json, JSONB)[key].astext
+    return func.json_extract(EvidenceItem.extracted_json, f"$.{key}")
+
+def duplicate_evidence_query(city_key: str, source_pattern: str, dialect: str):
+    """(id, entity_id, source) of payment evidence rows that repeat an earlier one on the payment key."""
+    amount = _evidence_field(dialect, "amount")
+    rn = func.row_number().over(
+        partition_by=(
+            EvidenceItem.entity_id,
+            func.round(cast(amount, Numeric), 2),
+            func.coalesce(cast(_evidence_field(dialect, "fiscal_year"), String), ""),
+        ),
+        order_by=EvidenceItem.id,
+    ).label("rn")
+    where = [
+        EvidenceItem.entity_id.in_(_city_entities(city_key)),
+        EvidenceItem.evidence_type == "payment",
+        EvidenceItem.source.like(f"%{source_pattern}%"),
+        amount.isnot(None),
+    ]
+    ranked = select(EvidenceItem.id, EvidenceItem.entity_id, EvidenceItem.source, rn).where(*where).subquery()
+    return select(ranked.c.id, ranked.c.entity_id, ranked.c.source).where(ranked.c.rn > 1)
+
+def count_matching_payments(session, city_key: str, source_pattern: str) -> int:
+    return int(session.execute(
+        select(func.count(Payment.id)).where(*_matching_payments(city_key, source_pattern))
+    ).scalar() or 0)
+
+def duplicate_counts_by_source(session, city_key: str, source_pattern: str) -> List[Dict]:
+    """Dry run: how many payment / evidence rows a cleanup would delete, per source."""
+    counts: Dict[str, Dict] = {}
+    for key, q in (("duplicate_payments", duplicate_payments_query(city_key, source_pattern)),
+                   ("duplicate_evidence", duplicate_evidence_query(city_key, source_pattern, dialect_name(session)))):
+        dups = q.subquery()
+        for source, n in session.execute(select(dups.c.source, func.count()).group_by(dups.c.source)).all():
+            row = counts.setdefault(source, {"source": source, "duplicate_payments": 0, "duplicate_evidence": 0})
+            row[key] = int(n)
+    return sorted(counts.values(), key=lambda r: (-r["duplicate_payments"], r["source"] or ""))
+
+def _duplicates(session, dup_query) -> list:
+    # One window scan finds every duplicate; deleting a duplicate never changes which rows are kept
+    return session.execute(dup_query.order_by(dup_query.selected_columns.id)).all()
+
+def _delete_in_batches(session, city_key: str, model, dups: list, batch_size: int, on_batch=None) -> int:
+    deleted = 0
+    for i in range(0, len(dups), batch_size):
+        rows = dups[i:i + batch_size]
+        session.execute(delete(model).where(model.id.in_([r.id for r in rows])).execution_options(synchronize_session=False))
+        if on_batch:
+            on_batch(rows)
+        bump_data_version(session, city_key)
+        # One transaction per batch keeps the write lock (and undo log) small
+        session.commit()
+        deleted += len(rows)
+    return deleted
+
+def delete_duplicate_payments(session, city_key: str, source_pattern: str, batch_size: int = DELETE_BATCH) -> Dict[str, int]:
+    """Delete duplicate payments and duplicate payment evidence, refreshing year totals and source stats."""
+    evidence_by_entity: Dict[int, list] = {}
+    for r in _duplicates(session, duplicate_evidence_query(city_key, source_pattern, dialect_name(session))):
+        evidence_by_entity.setdefault(r.entity_id, []).append(r)
+    deleted_evidence = 0
+
+    def evidence_deleted(rows):
+        refresh_source_stats(session, city_key, evidence_sources={r.source for r in rows})
+
+    def payments_deleted(rows):
+        nonlocal deleted_evidence
+        entity_ids = {r.entity_id for r in rows}
+        # The batch's evidence duplicates go in the same transaction as its payments
+        evidence = [r for eid in entity_ids for r in evidence_by_entity.pop(eid, [])]
+        if evidence:
+            session.execute(delete(EvidenceItem).where(EvidenceItem.id.in_([r.id for r in evidence]))
+                            .execution_options(synchronize_session=False))
+            evidence_deleted(evidence)
+            deleted_evidence += len(evidence)
+        refresh_payment_year_totals(session, city_key, entity_ids)
+        refresh_source_stats(
+            session, city_key, payment_sources={r.source for r in rows},
+            tags={r.tag for r in rows}, data_sources={r.data_source for r in rows},
+        )
+
+    deleted_payments = _delete_in_batches(
+        session, city_key, Payment, _duplicates(session, duplicate_payments_query(city_key, source_pattern)), batch_size, payments_deleted,
+    )
+    # Evidence duplicates left over from payments removed earlier (or by hand)
+    leftover = sorted((r for rows in evidence_by_entity.values() for r in rows), key=lambda r: r.id)
+    deleted_evidence += _delete_in_batches(session, city_key, EvidenceItem, leftover, batch_size, evidence_deleted)
+    return {"deleted": deleted_payments, "deleted_evidence": deleted_evidence}
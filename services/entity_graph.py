@@ -0,0 +1,481 @@
+"""
+Persisted entity graph
+
+entity_keys lists, per entity, every value it can share with another entity
+of the same city as (signal, key): normalized address, license id, NPI, other
+Identifier values, normalized names and aliases with their token-sorted and
+phonetic keys (core.name_keys), person-name tokens, and the MinHash/LSH
+bands of the normalized name. Entities that share a key are
+linked in entity_edges (entity_a < entity_b, one row per signal); band
+neighbours only get a similar_name edge when the exact name similarity
+clears SIMILAR_NAME_THRESHOLD. entity_components stores the connected
+component (lowest member id) and its size for every entity with an edge.
+
+Write paths call update_entity_graph() with the entities they touched, which
+replaces those entities' keys and edges and re-derives only the components
+involved. rebuild_entity_graph() recomputes a whole city (needed after
+changing NETWORK_LSH_BANDS / NETWORK_LSH_ROWS, which change the band keys).
+
+A key shared by more than EDGE_FANOUT_CAP entities (a registered-agent
+address, a common word in person names) is linked as a star around its
+lowest-id member instead of a clique: same components, linear edge count.
+"""
+
+from __future__ import annotations
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import select, delete, insert, update, func, or_, and_, exists
+from sqlalchemy.orm import aliased
+from db.models import Entity, Alias, Identifier, EntityKey, EntityEdge, EntityComponent
+from core.utils import normalize_name, similar_above, similarity
+from core.name_keys import name_keys
+from core.minhash import MinHasher, candidate_pairs
+from services.entity_networks import LSH_BANDS, LSH_ROWS, SIMILAR_NAME_THRESHOLD, UnionFind, extract_person_names
+
+ADDRESS = "address"
+LICENSE_ID = "license_id"
+NPI = "npi"
+IDENTIFIER = "identifier"
+NAME = "name"  # a normalized name or alias in common, or the same words in another order (sorted key)
+PHONETIC_NAME = "phonetic_name"  # names or aliases that sound alike (phonetic key), unless they already share a name
+PERSON_NAME = "person_name"
+SIMILAR_NAME = "similar_name"
+NAME_BAND = "name_band"  # key only: LSH band of the normalized name, proposes similar_name edges
+
+SIGNALS = (ADDRESS, LICENSE_ID, NPI, IDENTIFIER, NAME, PHONETIC_NAME, PERSON_NAME, SIMILAR_NAME)
+
+# similar_name edges carry the name similarity instead
+SIGNAL_WEIGHTS = {LICENSE_ID: 1.0, NPI: 1.0, IDENTIFIER: 1.0, NAME: 0.9, PHONETIC_NAME: 0.7, ADDRESS: 0.6, PERSON_NAME: 0.4}
+
+# Identifier types that duplicate an Entity column
+_ID_TYPE_SIGNALS = {"LICENSE_ID": LICENSE_ID, "NPI": NPI}
+
+EDGE_FANOUT_CAP = int(os.getenv("NETWORK_FANOUT_CAP", "25"))
+ID_CHUNK = 500
+MEMBERS_PER_CLUSTER = 100
+
+Key = Tuple[str, str]
+EdgeKey = Tuple[int, int, str]
+
+_hasher = MinHasher(LSH_BANDS, LSH_ROWS)
+
+def _chunks(values: List, size: int = ID_CHUNK) -> Iterable[List]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+def _add_name_keys(k: Set[Key], norm: str, sorted_key: Optional[str], phonetic_key: Optional[str]) -> None:
+    if not norm:
+        return
+    if sorted_key is None:
+        # Not backfilled yet (services.renormalize.ensure_name_keys)
+        sorted_key, phonetic_key, _ = name_keys(norm)
+    k.add((NAME, norm))
+    k.add((NAME, sorted_key))
+    k.add((PHONETIC_NAME, phonetic_key))
+
+def _entity_keys(session, ids: List[int]) -> Tuple[Dict[int, Set[Key]], Dict[int, str]]:
+    """Shared-value keys (without name bands) and the normalized name of each entity."""
+    keys: Dict[int, Set[Key]] = {}
+    names: Dict[int, str] = {}
+    raw_names: Dict[int, List[str]] = {}
+    for e in session.execute(
+        select(Entity.id, Entity.name, Entity.normalized_name, Entity.normalized_address, Entity.license_id, Entity.npi,
+               Entity.sorted_key, Entity.phonetic_key)
+        .where(Entity.id.in_(ids))
+    ).all():
+        k = keys[e.id] = set()
+        names[e.id] = e.normalized_name or normalize_name(e.name or "")
+        raw_names[e.id] = [e.name] if e.name else []
+        _add_name_keys(k, names[e.id], e.sorted_key, e.phonetic_key)
+        if e.normalized_address:
+            k.add((ADDRESS, e.normalized_address))
+        if e.license_id and e.license_id.strip():
+            k.add((LICENSE_ID, e.license_id.strip()))
+        if e.npi and e.npi.strip():
+            k.add((NPI, e.npi.strip()))
+    for eid, alias, norm, sorted_key, phonetic_key in session.execute(
+        select(Alias.entity_id, Alias.alias, Alias.normalized_alias, Alias.sorted_key, Alias.phonetic_key)
+        .where(Alias.entity_id.in_(ids))
+    ).all():
+        if eid not in keys or not alias:
+            continue
+        raw_names[eid].append(alias)
+        _add_name_keys(keys[eid], norm or normalize_name(alias), sorted_key, phonetic_key)
+    for eid, id_type, value in session.execute(
+        select(Identifier.entity_id, Identifier.id_type, Identifier.value).where(Identifier.entity_id.in_(ids))
+    ).all():
+        value = (value or "").strip()
+        if eid not in keys or not value:
+            continue
+        signal = _ID_TYPE_SIGNALS.get((id_type or "").upper())
+        keys[eid].add((signal, value) if signal else (IDENTIFIER, f"{id_type}:{value}"))
+    for eid, raws in raw_names.items():
+        for raw in raws:
+            for part in extract_person_names(raw):
+                token = normalize_name(part)
+                if token:
+                    keys[eid].add((PERSON_NAME, token))
+    return keys, names
+
+def _store_keys(session, city_key: str, keys: Dict[int, Set[Key]], names: Dict[int, str]) -> None:
+    """Replace the stored keys (plus name bands) of the given entities."""
+    ids = sorted(keys)
+    for chunk in _chunks(ids):
+        session.execute(delete(EntityKey).where(EntityKey.entity_id.in_(chunk)))
+        rows = []
+        for eid in chunk:
+            rows.extend({"city_key": city_key, "entity_id": eid, "signal": s, "key": k} for s, k in keys[eid])
+            if names.get(eid):
+                rows.extend({"city_key": city_key, "entity_id": eid, "signal": NAME_BAND, "key": b}
+                            for b in _hasher.band_hashes(names[eid]))
+        if rows:
+            session.execute(insert(EntityKey.__table__), rows)
+
+def _members(session, city_key: str, wanted: Iterable[Key]) -> Dict[Key, List[int]]:
+    """Entity ids holding each key, ascending."""
+    by_signal: Dict[str, Set[str]] = {}
+    for signal, key in wanted:
+        by_signal.setdefault(signal, set()).add(key)
+    out: Dict[Key, List[int]] = {}
+    for signal, ks in by_signal.items():
+        for chunk in _chunks(sorted(ks)):
+            for key, eid in session.execute(
+                select(EntityKey.key, EntityKey.entity_id)
+                .where(EntityKey.city_key == city_key, EntityKey.signal == signal, EntityKey.key.in_(chunk))
+                .order_by(EntityKey.entity_id)
+            ).all():
+                out.setdefault((signal, key), []).append(eid)
+    return out
+
+def _linked(eid: int, members: List[int]) -> Iterable[int]:
+    """Entities `eid` is linked to through one shared key (a star above EDGE_FANOUT_CAP)."""
+    if len(members) <= EDGE_FANOUT_CAP or eid == members[0]:
+        return (m for m in members if m != eid)
+    return (members[0],)
+
+def _add_edge(edges: Dict[EdgeKey, Tuple[float, Optional[str]]], a: int, b: int, signal: str,
+              weight: float, key: Optional[str]) -> None:
+    if a > b:
+        a, b = b, a
+    cur = edges.get((a, b, signal))
+    # Several keys of one signal can link the same pair: keep the strongest, then the smallest key
+    if cur is None or (-weight, key or "") < (-cur[0], cur[1] or ""):
+        edges[(a, b, signal)] = (weight, key)
+
+def _key_edges(keys: Dict[int, Set[Key]], members: Dict[Key, List[int]]) -> Dict[EdgeKey, Tuple[float, Optional[str]]]:
+    edges: Dict[EdgeKey, Tuple[float, Optional[str]]] = {}
+    for eid, ks in keys.items():
+        for signal, key in ks:
+            for other in _linked(eid, members.get((signal, key), [eid])):
+                _add_edge(edges, eid, other, signal, SIGNAL_WEIGHTS[signal], key)
+    # Equal names always sound alike; only keep phonetic edges that add something
+    for a, b, _ in [ek for ek in edges if ek[2] == PHONETIC_NAME and (ek[0], ek[1], NAME) in edges]:
+        del edges[(a, b, PHONETIC_NAME)]
+    return edges
+
+def _name_weight(a: str, b: str) -> Optional[float]:
+    """Similarity of two distinct names if it clears SIMILAR_NAME_THRESHOLD."""
+    if not a or not b or a == b or not similar_above(a, b, SIMILAR_NAME_THRESHOLD):
+        return None
+    return round(similarity(a, b), 4)
+
+def _write_edges(session, city_key: str, edges: Dict[EdgeKey, Tuple[float, Optional[str]]]) -> None:
+    now = datetime.utcnow()
+    rows = [{"city_key": city_key, "entity_a": a, "entity_b": b, "signal": s, "weight": w, "key": k, "created_at": now}
+            for (a, b, s), (w, k) in edges.items()]
+    for chunk in _chunks(rows, 5000):
+        session.execute(insert(EntityEdge.__table__), chunk)
+
+def _write_components(session, city_key: str, groups: List[List[int]], clear: Iterable[int] = ()) -> None:
+    """Drop the component rows of `clear`, then store `groups` (component id = lowest member)."""
+    for chunk in _chunks(sorted(set(clear))):
+        session.execute(delete(EntityComponent).where(EntityComponent.entity_id.in_(chunk)))
+    rows = []
+    for g in groups:
+        if len(g) > 1:
+            comp = min(g)
+            rows.extend({"entity_id": eid, "city_key": city_key, "component_id": comp, "size": len(g)} for eid in g)
+    for chunk in _chunks(rows, 5000):
+        session.execute(insert(EntityComponent.__table__), chunk)
+
+def _components_of(session, ids: Iterable[int]) -> Set[int]:
+    out: Set[int] = set()
+    for chunk in _chunks(sorted(set(ids))):
+        out.update(session.execute(
+            select(EntityComponent.component_id).where(EntityComponent.entity_id.in_(chunk))
+        ).scalars().all())
+    return out
+
+def _component_members(session, component_ids: Iterable[int]) -> List[Tuple[int, int]]:
+    rows: List[Tuple[int, int]] = []
+    for chunk in _chunks(sorted(set(component_ids))):
+        rows.extend(session.execute(
+            select(EntityComponent.entity_id, EntityComponent.component_id)
+            .where(EntityComponent.component_id.in_(chunk))
+        ).all())
+    return rows
+
+def _merge_components(session, city_key: str, pairs: Set[Tuple[int, int]]) -> None:
+    """Edges were only added: union the components their endpoints belong to."""
+    nodes = {x for p in pairs for x in p}
+    comp_of = {}
+    for chunk in _chunks(sorted(nodes)):
+        comp_of.update(session.execute(
+            select(EntityComponent.entity_id, EntityComponent.component_id).where(EntityComponent.entity_id.in_(chunk))
+        ).all())
+    sizes = dict(session.execute(
+        select(EntityComponent.component_id, EntityComponent.size)
+        .where(EntityComponent.component_id.in_(set(comp_of.values())), EntityComponent.entity_id == EntityComponent.component_id)
+    ).all()) if comp_of else {}
+    # Union-find over new nodes and existing components (a component id is its lowest member)
+    uf = UnionFind()
+    for a, b in pairs:
+        uf.union(comp_of.get(a, a), comp_of.get(b, b))
+    for group in uf.groups():
+        comps = [x for x in group if x in sizes]
+        loose = [x for x in group if x not in sizes]
+        target = min(group)
+        size = sum(sizes[c] for c in comps) + len(loose)
+        # Existing members are relabelled in place; only new nodes get rows
+        if comps:
+            session.execute(
+                update(EntityComponent).where(EntityComponent.component_id.in_(comps))
+                .values(component_id=target, size=size).execution_options(synchronize_session=False)
+            )
+        if loose:
+            session.execute(insert(EntityComponent), [
+                {"entity_id": eid, "city_key": city_key, "component_id": target, "size": size} for eid in loose
+            ])
+
+def _recompute_components(session, city_key: str, seeds: Set[int]) -> None:
+    """Edges were removed: re-derive connectivity over the old components of `seeds`.
+
+    Every new component holding a seed lies inside the union of the seeds'
+    old components (unchanged edges stay inside one, added edges end at
+    seeds), so only those nodes and their edges are reloaded.
+    """
+    nodes = set(seeds) | {eid for eid, _ in _component_members(session, _components_of(session, seeds))}
+    uf = UnionFind()
+    for eid in nodes:
+        uf.find(eid)
+    for chunk in _chunks(sorted(nodes)):
+        for a, b in session.execute(
+            select(EntityEdge.entity_a, EntityEdge.entity_b)
+            .where(or_(EntityEdge.entity_a.in_(chunk), EntityEdge.entity_b.in_(chunk)))
+        ).all():
+            uf.union(a, b)
+    _write_components(session, city_key, uf.groups(), clear=nodes)
+
+def _load_keys(session, ids: Iterable[int]) -> Tuple[Dict[int, Set[Key]], Dict[int, str]]:
+    keys: Dict[int, Set[Key]] = {}
+    names: Dict[int, str] = {}
+    for chunk in _chunks(sorted(ids)):
+        k, n = _entity_keys(session, chunk)
+        keys.update(k)
+        names.update(n)
+    return keys, names
+
+def _stored_keys(session, ids: Iterable[int]) -> Set[Key]:
+    out: Set[Key] = set()
+    for chunk in _chunks(sorted(ids)):
+        out.update(session.execute(
+            select(EntityKey.signal, EntityKey.key).where(EntityKey.entity_id.in_(chunk), EntityKey.signal != NAME_BAND)
+        ).all())
+    return out
+
+def _hub(members: List[int]) -> Optional[int]:
+    return members[0] if len(members) > EDGE_FANOUT_CAP else None
+
+def update_entity_graph(session, city_key: str, entity_ids: Iterable[int]) -> int:
+    """Refresh keys, edges and components for entities whose names/aliases/identifiers were written.
+
+    Call after flushing them (like search.index_entities). Returns the number
+    of edges added or removed.
+    """
+    ids = {int(i) for i in entity_ids if i is not None}
+    if not ids:
+        return 0
+    keys, names = _load_keys(session, ids)
+    wanted = _stored_keys(session, ids) | {k for ks in keys.values() for k in ks}
+    before = _members(session, city_key, wanted)
+    _store_keys(session, city_key, keys, names)
+    after = _members(session, city_key, wanted)
+    # A key whose group switches between clique and star (or gets a new hub)
+    # relinks every member, not just the entities that were written
+    extra: Set[int] = set()
+    for k in wanted:
+        if _hub(before.get(k, [])) != _hub(after.get(k, [])):
+            extra.update(before.get(k, []))
+            extra.update(after.get(k, []))
+    if extra - ids:
+        k, n = _load_keys(session, extra - ids)
+        keys.update(k)
+        names.update(n)
+    ids = sorted(keys)
+
+    bands = {eid: [(NAME_BAND, b) for b in _hasher.band_hashes(n)] for eid, n in names.items() if n}
+    members = _members(session, city_key, {k for ks in keys.values() for k in ks} | {k for bs in bands.values() for k in bs})
+    new_edges = _key_edges(keys, members)
+
+    # Band neighbours of the touched entities, verified on the exact name similarity
+    pairs = {(min(eid, o), max(eid, o)) for eid, bs in bands.items() for bk in bs for o in members.get(bk, ()) if o != eid}
+    missing = sorted({x for p in pairs for x in p} - set(names))
+    for chunk in _chunks(missing):
+        names.update(session.execute(select(Entity.id, Entity.normalized_name).where(Entity.id.in_(chunk))).all())
+    for a, b in pairs:
+        weight = _name_weight(names.get(a) or "", names.get(b) or "")
+        if weight is not None:
+            _add_edge(new_edges, a, b, SIMILAR_NAME, weight, None)
+
+    old = {}
+    for chunk in _chunks(ids):
+        for r in session.execute(
+            select(EntityEdge.id, EntityEdge.entity_a, EntityEdge.entity_b, EntityEdge.signal, EntityEdge.weight, EntityEdge.key)
+            .where(or_(EntityEdge.entity_a.in_(chunk), EntityEdge.entity_b.in_(chunk)))
+        ).all():
+            old[(r.entity_a, r.entity_b, r.signal)] = r
+    removed = [r.id for ek, r in old.items() if ek not in new_edges]
+    added = {ek: v for ek, v in new_edges.items() if ek not in old}
+    changed = [{"id": old[ek].id, "weight": w, "key": k} for ek, (w, k) in new_edges.items()
+               if ek in old and (old[ek].weight, old[ek].key) != (w, k)]
+    for chunk in _chunks(removed):
+        session.execute(delete(EntityEdge).where(EntityEdge.id.in_(chunk)))
+    _write_edges(session, city_key, added)
+    if changed:
+        session.execute(update(EntityEdge), changed)
+
+    old_pairs = {(a, b) for a, b, _ in old}
+    new_pairs = {(a, b) for a, b, _ in new_edges}
+    if old_pairs - new_pairs:
+        _recompute_components(session, city_key, set(ids) | {x for p in old_pairs ^ new_pairs for x in p})
+    elif new_pairs - old_pairs:
+        _merge_components(session, city_key, new_pairs - old_pairs)
+    return len(removed) + len(added)
+
+def rebuild_entity_graph(session, city_key: str) -> Dict[str, int]:
+    """Recompute keys, edges and components for every entity of a city."""
+    for model in (EntityKey, EntityEdge, EntityComponent):
+        session.execute(delete(model).where(model.city_key == city_key))
+    ids = session.execute(select(Entity.id).where(Entity.city_key == city_key).order_by(Entity.id)).scalars().all()
+    keys: Dict[int, Set[Key]] = {}
+    names: Dict[int, str] = {}
+    for chunk in _chunks(ids):
+        k, n = _entity_keys(session, chunk)
+        _store_keys(session, city_key, k, n)
+        keys.update(k)
+        names.update(n)
+
+    members: Dict[Key, List[int]] = {}
+    for eid in ids:
+        for k in keys.get(eid, ()):
+            members.setdefault(k, []).append(eid)
+    edges = _key_edges(keys, members)
+
+    # Similar names: LSH over one representative per distinct name, then every
+    # entity of one name is linked to every entity of the other
+    by_name: Dict[str, List[int]] = {}
+    for eid in ids:
+        if names.get(eid):
+            by_name.setdefault(names[eid], []).append(eid)
+    distinct = {group[0]: n for n, group in by_name.items()}
+    for a, b in candidate_pairs(distinct, LSH_BANDS, LSH_ROWS):
+        weight = _name_weight(distinct[a], distinct[b])
+        if weight is None:
+            continue
+        for x in by_name[distinct[a]]:
+            for y in by_name[distinct[b]]:
+                _add_edge(edges, x, y, SIMILAR_NAME, weight, None)
+    _write_edges(session, city_key, edges)
+
+    uf = UnionFind()
+    for a, b, _ in edges:
+        uf.union(a, b)
+    groups = uf.groups()
+    _write_components(session, city_key, groups)
+    return {"entities": len(ids), "edges": len(edges), "components": len(groups)}
+
+def ensure_entity_graph(session) -> List[str]:
+    """Build the graph for cities that have entities but no keys yet (e.g. databases predating the tables)."""
+    cities = session.execute(
+        select(Entity.city_key).distinct()
+        .where(~exists().where(EntityKey.city_key == Entity.city_key))
+    ).scalars().all()
+    for city_key in cities:
+        rebuild_entity_graph(session, city_key)
+    return list(cities)
+
+def list_networks(session, city_key: str, entity_type: Optional[str] = None, signal: Optional[str] = None,
+                  min_size: int = 2, limit: int = 50, after: Optional[List] = None,
+                  member_limit: int = MEMBERS_PER_CLUSTER) -> Tuple[List[Dict], Optional[List], int]:
+    """One page of clusters, largest first. Returns (clusters, cursor values of the last one or None, total).
+
+    `after` is a decoded (size, component_id) pair of ints, validated by the caller.
+
+    entity_type keeps clusters with at least one member of that type; signal
+    keeps clusters with at least one edge of that signal. Each cluster lists
+    at most member_limit entities (entity_count is always the full size).
+    """
+    root = EntityComponent
+    q = select(root.component_id, root.size).where(
+        root.city_key == city_key, root.entity_id == root.component_id, root.size >= min_size,
+    )
+    if entity_type:
+        member = aliased(EntityComponent)
+        q = q.where(exists().where(
+            member.component_id == root.component_id, Entity.id == member.entity_id, Entity.entity_type == entity_type,
+        ))
+    if signal:
+        member = aliased(EntityComponent)
+        q = q.where(exists().where(
+            member.component_id == root.component_id, EntityEdge.entity_a == member.entity_id, EntityEdge.signal == signal,
+        ))
+    total = int(session.execute(select(func.count()).select_from(q.subquery())).scalar() or 0)
+    if after:
+        size, comp = after
+        q = q.where(or_(root.size < size, and_(root.size == size, root.component_id > comp)))
+    page = session.execute(q.order_by(root.size.desc(), root.component_id.asc()).limit(limit + 1)).all()
+    last = None
+    if len(page) > limit:
+        page = page[:limit]
+        last = [page[-1].size, page[-1].component_id]
+    if not page:
+        return [], None, total
+
+    comp_ids = [r.component_id for r in page]
+    members: Dict[int, List] = {c: [] for c in comp_ids}
+    for r in session.execute(
+        select(EntityComponent.component_id, Entity.id, Entity.name, Entity.normalized_name, Entity.entity_type,
+               Entity.address, Entity.license_id)
+        .join(Entity, Entity.id == EntityComponent.entity_id)
+        .where(EntityComponent.component_id.in_(comp_ids))
+        .order_by(Entity.id)
+    ).all():
+        if len(members[r.component_id]) < member_limit:
+            members[r.component_id].append(r)
+    signals: Dict[int, Dict[str, int]] = {c: {} for c in comp_ids}
+    for comp, sig, n in session.execute(
+        select(EntityComponent.component_id, EntityEdge.signal, func.count())
+        .join(EntityEdge, EntityEdge.entity_a == EntityComponent.entity_id)
+        .where(EntityComponent.component_id.in_(comp_ids))
+        .group_by(EntityComponent.component_id, EntityEdge.signal)
+    ).all():
+        signals[comp][sig] = int(n)
+
+    clusters = []
+    for r in page:
+        ents = members[r.component_id]
+        words_list = [set((e.normalized_name or "").split()) for e in ents if e.normalized_name]
+        common_words = set.intersection(*words_list) if len(words_list) > 1 else set()
+        clusters.append({
+            "component_id": r.component_id,
+            "entity_ids": [e.id for e in ents],
+            "entity_count": int(r.size),
+            "shared_patterns": sorted(w for w in common_words if len(w) > 2)[:3],
+            "signals": dict(sorted(signals[r.component_id].items())),
+            "entities": [
+                {"id": e.id, "name": e.name, "type": e.entity_type, "address": e.address, "license_id": e.license_id}
+                for e in ents
+            ],
+        })
+    return clusters, last, total
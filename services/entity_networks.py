@@ -1,9 +1,11 @@
 from __future__ import annotations
+import os
 import re
-from typing import List, Dict, Set, Tuple
+from typing import Dict, Iterable, List, Tuple
 from sqlalchemy import select
 from db.models import Entity, Identifier, Alias
-from core.utils import normalize_name, similarity
+from core.utils import normalize_name, similar_above
+from core.minhash import DEFAULT_BANDS, DEFAULT_ROWS, candidate_pairs
 
 def extract_person_names(entity_name: str) -> List[str]:
     """Extract potential person names from entity name"""
@@ -27,109 +29,125 @@ def extract_person_names(entity_name: str) -> List[str]:
     
     return []
 
-def find_name_based_clusters(session, city_key: str, entity_type: str = None) -> List[Dict]:
-    """Find clusters of entities that share person names or similar names"""
-    query = select(Entity).where(Entity.city_key == city_key)
+# Names at least this similar are treated as variants of the same business
+SIMILAR_NAME_THRESHOLD = 0.85
+
+# LSH blocking for the similar-name stage (see core.minhash); more bands or
+# fewer rows = higher recall and more candidate pairs to verify
+LSH_BANDS = int(os.getenv("NETWORK_LSH_BANDS", str(DEFAULT_BANDS)))
+LSH_ROWS = int(os.getenv("NETWORK_LSH_ROWS", str(DEFAULT_ROWS)))
+
+class UnionFind:
+    """Disjoint sets over hashable ids (union by size, path halving)."""
+
+    def __init__(self):
+        self.parent: Dict[int, int] = {}
+        self.size: Dict[int, int] = {}
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        if x not in parent:
+            parent[x] = x
+            self.size[x] = 1
+            return x
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a: int, b: int) -> int:
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return ra
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+        return ra
+
+    def groups(self) -> List[List[int]]:
+        """Members of every set with more than one element, each sorted."""
+        out: Dict[int, List[int]] = {}
+        for x in self.parent:
+            out.setdefault(self.find(x), []).append(x)
+        return [sorted(m) for m in out.values() if len(m) > 1]
+
+def _similar_name_pairs(names: Dict[int, str], uf: UnionFind, bands: int = LSH_BANDS, rows: int = LSH_ROWS) -> Iterable[Tuple[int, int]]:
+    """Pairs of entities whose normalized names exceed SIMILAR_NAME_THRESHOLD.
+
+    Identical names pair up directly; distinct names only get the exact
+    similarity check when MinHash/LSH proposes them as candidates.
+    """
+    by_name: Dict[str, List[int]] = {}
+    for eid, n in names.items():
+        if n:
+            by_name.setdefault(n, []).append(eid)
+    for ids in by_name.values():
+        for other in ids[1:]:
+            yield ids[0], other
+
+    distinct = {ids[0]: n for n, ids in by_name.items()}
+    for id1, id2 in candidate_pairs(distinct, bands, rows):
+        # Already connected: the union would be a no-op, skip the costly ratio
+        if uf.find(id1) == uf.find(id2):
+            continue
+        if similar_above(distinct[id1], distinct[id2], SIMILAR_NAME_THRESHOLD):
+            yield id1, id2
+
+def find_name_based_clusters(session, city_key: str, entity_type: str = None, bands: int = LSH_BANDS, rows: int = LSH_ROWS) -> List[Dict]:
+    """Find clusters of entities that share person names or similar names.
+
+    Clusters are the connected components of "shares a person-name token" and
+    "names are near-identical" edges, so membership is transitive and does not
+    depend on iteration order.
+    """
+    query = (
+        select(Entity.id, Entity.name, Entity.normalized_name, Entity.entity_type, Entity.address, Entity.license_id)
+        .where(Entity.city_key == city_key)
+        .order_by(Entity.id)
+    )
     if entity_type:
         query = query.where(Entity.entity_type == entity_type)
-    entities = session.execute(query).scalars().all()
-    
-    # Extract person names from each entity
-    entity_person_names: Dict[int, Set[str]] = {}
-    for ent in entities:
-        person_names = set()
-        # Extract from main name
-        for name_part in extract_person_names(ent.name or ""):
-            person_names.add(normalize_name(name_part))
-        # Extract from aliases
-        for alias in ent.aliases:
-            for name_part in extract_person_names(alias.alias):
-                person_names.add(normalize_name(name_part))
-        if person_names:
-            entity_person_names[ent.id] = person_names
-    
-    # Find clusters: entities that share person names
-    clusters: List[Set[int]] = []
-    entity_to_cluster: Dict[int, int] = {}
-    
-    for ent1_id, names1 in entity_person_names.items():
-        found_cluster = None
-        for ent2_id, names2 in entity_person_names.items():
-            if ent1_id == ent2_id:
-                continue
-            # Check for overlap in person names
-            if names1 & names2:  # Set intersection
-                cluster_idx = entity_to_cluster.get(ent2_id)
-                if cluster_idx is not None:
-                    found_cluster = cluster_idx
-                    break
-        
-        if found_cluster is not None:
-            clusters[found_cluster].add(ent1_id)
-            entity_to_cluster[ent1_id] = found_cluster
-        else:
-            # Start new cluster
-            cluster_idx = len(clusters)
-            clusters.append({ent1_id})
-            entity_to_cluster[ent1_id] = cluster_idx
-    
-    # Also find similar name clusters (for business name similarity)
-    similar_clusters: List[Set[int]] = []
-    processed = set()
-    
-    for ent1 in entities:
-        if ent1.id in processed:
-            continue
-        cluster = {ent1.id}
-        nname1 = normalize_name(ent1.name or "")
-        
-        for ent2 in entities:
-            if ent2.id in processed or ent2.id == ent1.id:
-                continue
-            nname2 = normalize_name(ent2.name or "")
-            sim = similarity(nname1, nname2)
-            # High similarity might indicate same entity with slight name variations
-            if sim > 0.85 and nname1 and nname2:
-                cluster.add(ent2.id)
-                processed.add(ent2.id)
-        
-        if len(cluster) > 1:
-            similar_clusters.append(cluster)
-            processed.update(cluster)
-    
-    # Combine and format results
-    all_clusters = [c for c in clusters if len(c) > 1] + similar_clusters
-    
-    # Merge overlapping clusters
-    merged_clusters = []
-    for cluster in all_clusters:
-        merged = False
-        for merged_cluster in merged_clusters:
-            if cluster & merged_cluster:
-                merged_cluster.update(cluster)
-                merged = True
-                break
-        if not merged:
-            merged_clusters.append(cluster)
-    
-    # Format as list of cluster info
+    entities = {e.id: e for e in session.execute(query).all()}
+    if not entities:
+        return []
+
+    # Aliases for all entities in one query
+    alias_query = select(Alias.entity_id, Alias.alias).join(Entity, Entity.id == Alias.entity_id).where(Entity.city_key == city_key)
+    if entity_type:
+        alias_query = alias_query.where(Entity.entity_type == entity_type)
+    aliases: Dict[int, List[str]] = {}
+    for eid, alias in session.execute(alias_query).all():
+        aliases.setdefault(eid, []).append(alias or "")
+
+    uf = UnionFind()
+
+    # Inverted index: person-name token -> first entity seen with it; later
+    # entities with the same token are unioned into that entity's set
+    token_owner: Dict[str, int] = {}
+    for eid, ent in entities.items():
+        for raw in [ent.name or ""] + aliases.get(eid, []):
+            for name_part in extract_person_names(raw):
+                token = normalize_name(name_part)
+                owner = token_owner.setdefault(token, eid)
+                if owner != eid:
+                    uf.union(owner, eid)
+
+    # Similar business names (slight spelling variations)
+    normalized = {eid: ent.normalized_name or normalize_name(ent.name or "") for eid, ent in entities.items()}
+    for id1, id2 in _similar_name_pairs(normalized, uf, bands, rows):
+        uf.union(id1, id2)
+
     result = []
-    for cluster_ids in merged_clusters:
-        if len(cluster_ids) < 2:
-            continue
-        cluster_entities = [e for e in entities if e.id in cluster_ids]
-        # Find shared names/patterns
-        shared_patterns = []
-        if len(cluster_entities) > 0:
-            all_names = [normalize_name(e.name or "") for e in cluster_entities]
-            # Find common words
-            words_list = [set(n.split()) for n in all_names if n]
-            if words_list:
-                common_words = set.intersection(*words_list) if len(words_list) > 1 else set()
-                shared_patterns = [w for w in common_words if len(w) > 2][:3]
-        
+    for cluster_ids in uf.groups():
+        cluster_entities = [entities[i] for i in cluster_ids]
+        # Find shared names/patterns (common words across the cluster's names)
+        words_list = [set(normalized[i].split()) for i in cluster_ids if normalized[i]]
+        common_words = set.intersection(*words_list) if len(words_list) > 1 else set()
+        shared_patterns = sorted(w for w in common_words if len(w) > 2)[:3]
+
         result.append({
-            "entity_ids": list(cluster_ids),
+            "entity_ids": cluster_ids,
             "entity_count": len(cluster_ids),
             "shared_patterns": shared_patterns,
             "entities": [
@@ -143,6 +161,5 @@ def find_name_based_clusters(session, city_key: str, entity_type: str = None) ->
                 for e in cluster_entities
             ]
         })
-    
-    return sorted(result, key=lambda x: x["entity_count"], reverse=True)
 
+    return sorted(result, key=lambda x: x["entity_count"], reverse=True)
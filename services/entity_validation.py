@@ -9,15 +9,37 @@ Validates entity legitimacy through multiple signals:
 
 All results stored as EvidenceItems with confidence scores.
 Red flags contribute to anomaly scoring.
+
+Network lookups (search, DNS, website, geocode) go through
+services.lookup_cache.LOOKUP_CACHE, so repeats are served from the cache.
+Addresses are checked against the offline gazetteer (services.gazetteer)
+first; Nominatim is only asked about addresses it doesn't cover.
 """
 
 from __future__ import annotations
+import asyncio
+import os
 import re
 import requests
 import socket
 from typing import Dict, List, Optional, Tuple
 from urllib.parse import urlparse, quote_plus
 from datetime import datetime
+from services.gazetteer import GAZETTEER, FOUND, NOT_COVERED, NO_SUCH_NUMBER, NO_SUCH_STREET, CMRA_DETAILS, mail_drop
+from services.lookup_cache import LOOKUP_CACHE, MISS, SEARCH, DNS, HTTP, GEOCODE, search_key, host_key, url_key, address_key
+
+try:
+    import httpx
+except ImportError:  # async checks fall back to running the sync ones in a thread
+    httpx = None
+
+SEARCH_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+SITE_HEADERS = {'User-Agent': 'Mozilla/5.0 (compatible; CityFraudFinder/1.0)'}
+# Endpoints can be pointed elsewhere (a mirror, a self-hosted Nominatim, or local stub servers in tests)
+SEARCH_URL = os.getenv("VALIDATION_SEARCH_URL", "https://html.duckduckgo.com/html/")
+GEOCODE_URL = os.getenv("VALIDATION_GEOCODE_URL", "https://nominatim.openstreetmap.org/search")
 
 # Free/low-cost validation strategies
 # Most checks use free APIs or simple HTTP requests
@@ -27,51 +49,59 @@ def search_web(query: str, max_results: int = 5) -> List[Dict[str, str]]:
     Search the web using DuckDuckGo (free, no API key needed)
     Returns list of {title, url, snippet}
     """
+    key = search_key(query, max_results)
+    cached = LOOKUP_CACHE.get(SEARCH, key)
+    if cached is not MISS:
+        return cached
     try:
         # Use DuckDuckGo HTML search (no API key required)
-        search_url = f"https://html.duckduckgo.com/html/?q={quote_plus(query)}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(search_url, headers=headers, timeout=10)
+        response = requests.get(_search_url(query), headers=SEARCH_HEADERS, timeout=10)
         
         if response.status_code != 200:
             return []
-        
-        # Simple HTML parsing (could use BeautifulSoup, but keeping dependencies minimal)
-        html = response.text
-        results = []
-        
-        # DuckDuckGo result pattern (simplified - may need adjustment)
-        # Look for result links
-        link_pattern = r'<a[^>]*class="result__a"[^>]*href="([^"]+)"[^>]*>([^<]+)</a>'
-        matches = re.findall(link_pattern, html)
-        
-        for url, title in matches[:max_results]:
-            results.append({
-                "title": title.strip(),
-                "url": url.strip(),
-                "snippet": ""
-            })
-        
+        results = _parse_search_results(response.text, max_results)
+        LOOKUP_CACHE.put(SEARCH, key, results, ok=bool(results))
         return results
     except Exception as e:
         # Fallback: return empty results if search fails
         return []
 
+def _search_url(query: str) -> str:
+    return f"{SEARCH_URL}?q={quote_plus(query)}"
+
+def _parse_search_results(html: str, max_results: int) -> List[Dict[str, str]]:
+    # Simple HTML parsing (could use BeautifulSoup, but keeping dependencies minimal)
+    results = []
+    
+    # DuckDuckGo result pattern (simplified - may need adjustment)
+    # Look for result links
+    link_pattern = r'<a[^>]*class="result__a"[^>]*href="([^"]+)"[^>]*>([^<]+)</a>'
+    matches = re.findall(link_pattern, html)
+    
+    for url, title in matches[:max_results]:
+        results.append({
+            "title": title.strip(),
+            "url": url.strip(),
+            "snippet": ""
+        })
+    
+    return results
+
 def find_entity_website(entity_name: str, address: str = None, city: str = None, state: str = None) -> Optional[str]:
     """
     Search the web to find entity's website
     Returns website URL if found, None otherwise
     """
-    # Build search query
+    results = search_web(_website_query(entity_name, city, state), max_results=10)
+    return _pick_website(entity_name, results)
+
+def _website_query(entity_name: str, city: str = None, state: str = None) -> str:
     query_parts = [entity_name]
     if city and state:
         query_parts.append(f"{city} {state}")
-    query = " ".join(query_parts) + " website"
-    
-    results = search_web(query, max_results=10)
-    
+    return " ".join(query_parts) + " website"
+
+def _pick_website(entity_name: str, results: List[Dict[str, str]]) -> Optional[str]:
     # Look for website URLs in results
     domain_pattern = re.compile(r'https?://([^/]+)', re.IGNORECASE)
     entity_words = set(re.findall(r'\w+', entity_name.lower()))
@@ -105,16 +135,18 @@ def find_entity_phone(entity_name: str, address: str = None, city: str = None, s
     Search the web to find entity's phone number
     Returns phone number if found, None otherwise
     """
-    # Build search query
+    results = search_web(_phone_query(entity_name, address, city, state), max_results=5)
+    return _pick_phone(results)
+
+def _phone_query(entity_name: str, address: str = None, city: str = None, state: str = None) -> str:
     query_parts = [entity_name]
     if address:
         query_parts.append(address)
     if city and state:
         query_parts.append(f"{city} {state}")
-    query = " ".join(query_parts) + " phone number"
-    
-    results = search_web(query, max_results=5)
-    
+    return " ".join(query_parts) + " phone number"
+
+def _pick_phone(results: List[Dict[str, str]]) -> Optional[str]:
     # Look for phone numbers in results
     phone_pattern = re.compile(r'(\+?1[-.\s]?)?\(?([0-9]{3})\)?[-.\s]?([0-9]{3})[-.\s]?([0-9]{4})')
     
@@ -161,30 +193,19 @@ def check_website_exists(url: str, timeout: int = 5) -> Tuple[bool, Optional[str
     Returns: (exists, status_code, error_message)
     """
     try:
-        # Normalize URL
-        if not url.startswith('http'):
-            url = 'http://' + url
-        
-        parsed = urlparse(url)
-        domain = parsed.netloc or parsed.path.split('/')[0]
+        url, domain = _site_url(url)
+        key = url_key(url)
+        cached = LOOKUP_CACHE.get(HTTP, key)
+        if cached is not MISS:
+            return tuple(cached)
         
         # First check DNS resolution
-        try:
-            socket.gethostbyname(domain)
-        except socket.gaierror:
+        if not _resolves(domain):
             return (False, None, "DNS lookup failed - domain doesn't resolve")
         
         # Then check HTTP
-        response = requests.get(url, timeout=timeout, allow_redirects=True, headers={
-            'User-Agent': 'Mozilla/5.0 (compatible; CityFraudFinder/1.0)'
-        })
-        
-        if response.status_code == 200:
-            return (True, str(response.status_code), None)
-        elif response.status_code < 500:
-            return (True, str(response.status_code), f"Website exists but returned {response.status_code}")
-        else:
-            return (False, str(response.status_code), f"Server error {response.status_code}")
+        response = requests.get(url, timeout=timeout, allow_redirects=True, headers=SITE_HEADERS)
+        return _remember_site(key, _site_status(response.status_code))
             
     except requests.exceptions.Timeout:
         return (False, None, "Request timeout")
@@ -193,6 +214,38 @@ def check_website_exists(url: str, timeout: int = 5) -> Tuple[bool, Optional[str
     except Exception as e:
         return (False, None, f"Error: {str(e)}")
 
+def _resolves(domain: str) -> bool:
+    key = host_key(domain)
+    cached = LOOKUP_CACHE.get(DNS, key)
+    if cached is not MISS:
+        return bool(cached)
+    try:
+        socket.gethostbyname(domain)
+        ok = True
+    except socket.gaierror:
+        ok = False
+    LOOKUP_CACHE.put(DNS, key, ok, ok=ok)
+    return ok
+
+def _remember_site(key: str, status: Tuple[bool, Optional[str], Optional[str]]) -> Tuple[bool, Optional[str], Optional[str]]:
+    LOOKUP_CACHE.put(HTTP, key, status, ok=status[0])
+    return status
+
+def _site_url(url: str) -> Tuple[str, str]:
+    """Normalized URL and its host"""
+    if not url.startswith('http'):
+        url = 'http://' + url
+    parsed = urlparse(url)
+    return url, parsed.hostname or parsed.path.split('/')[0]
+
+def _site_status(status_code: int) -> Tuple[bool, Optional[str], Optional[str]]:
+    if status_code == 200:
+        return (True, str(status_code), None)
+    elif status_code < 500:
+        return (True, str(status_code), f"Website exists but returned {status_code}")
+    else:
+        return (False, str(status_code), f"Server error {status_code}")
+
 def check_google_business(name: str, address: str) -> Tuple[bool, Optional[str]]:
     """
     Check if Google Business Profile exists
@@ -209,47 +262,82 @@ def validate_phone_format(phone: str) -> bool:
     cleaned = re.sub(r'[^\d]', '', phone)
     return len(cleaned) == 10 and cleaned.isdigit()
 
-def check_address_geocode(address: str, city: str = None, state: str = None) -> Tuple[bool, Optional[str]]:
+GAZETTEER_ERRORS = {
+    NO_SUCH_NUMBER: "Street number not found in the address gazetteer",
+    NO_SUCH_STREET: "Street not found in the address gazetteer",
+}
+OUTSIDE_GAZETTEER = "Address outside the loaded gazetteer (network geocoding disabled)"
+
+def check_address_geocode(address: str, city: str = None, state: str = None, zip_code: str = None) -> Tuple[Optional[bool], Optional[str]]:
     """
     Check if address can be geocoded (validates it's a real location)
-    Uses free Nominatim API (OpenStreetMap)
+    Uses the offline address gazetteer, or the free Nominatim API (OpenStreetMap)
+    for addresses the gazetteer doesn't cover
     
-    Returns: (valid, error_message)
+    Returns: (valid, error_message); valid is None if the address couldn't be checked
     """
+    return check_address(address, city, state, zip_code)[0]
+
+def check_address(address: str, city: str = None, state: str = None, zip_code: str = None):
+    """Geocode check plus mail-drop detection (PMB, P.O. Box, CMRA point): ((valid, error), drop_reason)"""
+    point = GAZETTEER.lookup(address, city, state, zip_code)
+    drop = mail_drop(address) or (CMRA_DETAILS if point["cmra"] else None)
+    if point["status"] != NOT_COVERED:
+        return _gazetteer_status(point), drop
+    if not GAZETTEER.network_fallback():
+        return (None, OUTSIDE_GAZETTEER), drop
+    return _geocode_network(address, city, state), drop
+
+def _gazetteer_status(point: Dict) -> Tuple[bool, Optional[str]]:
+    if point["status"] == FOUND:
+        return (True, None)
+    return (False, GAZETTEER_ERRORS.get(point["status"], "Not a street address"))
+
+def _geocode_network(address: str, city: str = None, state: str = None) -> Tuple[bool, Optional[str]]:
+    key = address_key(address, city, state)
+    cached = LOOKUP_CACHE.get(GEOCODE, key)
+    if cached is not MISS:
+        return tuple(cached)
     try:
-        full_address = address
-        if city:
-            full_address += f", {city}"
-        if state:
-            full_address += f", {state}"
-        
         # Use free Nominatim API (rate limited, but free)
         response = requests.get(
-            "https://nominatim.openstreetmap.org/search",
-            params={
-                "q": full_address,
-                "format": "json",
-                "limit": 1
-            },
+            GEOCODE_URL,
+            params=_geocode_params(address, city, state),
             headers={"User-Agent": "CityFraudFinder/1.0"},
             timeout=5
         )
-        
-        if response.status_code == 200:
-            results = response.json()
-            if results:
-                return (True, None)
-            else:
-                return (False, "Address not found in geocoding database")
-        else:
-            return (False, f"Geocoding service error: {response.status_code}")
+        return _remember_geocode(key, response.status_code, response.json() if response.status_code == 200 else None)
             
     except Exception as e:
         return (False, f"Geocoding error: {str(e)}")
 
+def _geocode_params(address: str, city: str = None, state: str = None) -> Dict[str, object]:
+    full_address = address
+    if city:
+        full_address += f", {city}"
+    if state:
+        full_address += f", {state}"
+    return {"q": full_address, "format": "json", "limit": 1}
+
+def _remember_geocode(key: str, status_code: int, results) -> Tuple[bool, Optional[str]]:
+    status = _geocode_status(status_code, results)
+    # Service errors (rate limiting, outages) say nothing about the address; don't cache them
+    if status_code == 200:
+        LOOKUP_CACHE.put(GEOCODE, key, status, ok=status[0])
+    return status
+
+def _geocode_status(status_code: int, results) -> Tuple[bool, Optional[str]]:
+    if status_code == 200:
+        if results:
+            return (True, None)
+        else:
+            return (False, "Address not found in geocoding database")
+    else:
+        return (False, f"Geocoding service error: {status_code}")
+
 def run_validation_checks(entity_name: str, address: str = None, city: str = None, 
                          state: str = None, phone: str = None, website: str = None,
-                         license_id: str = None, search_web: bool = True) -> Dict[str, Dict]:
+                         license_id: str = None, search_web: bool = True, zip_code: str = None) -> Dict[str, Dict]:
     """
     Run all available validation checks
     If search_web=True, will search the internet to find website/phone
@@ -257,8 +345,6 @@ def run_validation_checks(entity_name: str, address: str = None, city: str = Non
     
     Returns dict of check_name -> {status: bool/None, confidence: float, details: str}
     """
-    results = {}
-    
     # WEB SEARCH: Try to find website and phone number online
     found_website = None
     found_phone = None
@@ -274,18 +360,34 @@ def run_validation_checks(entity_name: str, address: str = None, city: str = Non
         if found_phone:
             phone = found_phone  # Use found phone for checks
     
+    geocode, drop = check_address(address, city, state, zip_code) if address else (None, None)
+    site = check_website_exists(website) if website else None
+    return _validation_results(geocode, site, website, phone, found_website, found_phone, license_id, search_web, drop)
+
+def _validation_results(geocode, site, website, phone, found_website, found_phone, license_id, search_web,
+                        drop=None) -> Dict[str, Dict]:
+    """Turn raw check outcomes into the check_name -> result dict"""
+    results = {}
+    
     # 1. Address geocoding check
-    if address:
-        geocode_valid, geocode_error = check_address_geocode(address, city, state)
+    if geocode is not None:
+        geocode_valid, geocode_error = geocode
         results["address_geocode"] = {
             "status": geocode_valid,
             "confidence": 0.9 if geocode_valid else 0.3,
             "details": geocode_error or "Address geocoded successfully"
         }
+    if drop:
+        # A mailbox rather than premises - red flag for a provider receiving funds
+        results["address_mail_drop"] = {
+            "status": False,
+            "confidence": 0.8,
+            "details": drop
+        }
     
     # 2. Website search and validation
     if website:
-        site_exists, status_code, error = check_website_exists(website)
+        site_exists, status_code, error = site
         source = "found via web search" if found_website else "provided"
         results["website_exists"] = {
             "status": site_exists,
@@ -343,6 +445,130 @@ def run_validation_checks(entity_name: str, address: str = None, city: str = Non
     
     return results
 
+# Async variants: same checks over httpx, with independent lookups run concurrently.
+# Pass a shared httpx.AsyncClient to reuse connections across many entities.
+
+async def _aget(client, url: str, **kwargs):
+    if client is not None:
+        return await client.get(url, **kwargs)
+    async with httpx.AsyncClient(follow_redirects=True) as c:
+        return await c.get(url, **kwargs)
+
+async def search_web_async(query: str, max_results: int = 5, client=None) -> List[Dict[str, str]]:
+    if httpx is None:
+        return await asyncio.to_thread(search_web, query, max_results)
+    key = search_key(query, max_results)
+    cached = await LOOKUP_CACHE.aget(SEARCH, key)
+    if cached is not MISS:
+        return cached
+    try:
+        response = await _aget(client, _search_url(query), headers=SEARCH_HEADERS, timeout=10)
+        if response.status_code != 200:
+            return []
+        results = _parse_search_results(response.text, max_results)
+        await LOOKUP_CACHE.aput(SEARCH, key, results, ok=bool(results))
+        return results
+    except Exception:
+        return []
+
+async def _resolves_async(domain: str) -> bool:
+    key = host_key(domain)
+    cached = await LOOKUP_CACHE.aget(DNS, key)
+    if cached is not MISS:
+        return bool(cached)
+    try:
+        await asyncio.get_running_loop().getaddrinfo(domain, None)
+        ok = True
+    except socket.gaierror:
+        ok = False
+    await LOOKUP_CACHE.aput(DNS, key, ok, ok=ok)
+    return ok
+
+async def check_website_exists_async(url: str, timeout: int = 5, client=None) -> Tuple[bool, Optional[str], Optional[str]]:
+    if httpx is None:
+        return await asyncio.to_thread(check_website_exists, url, timeout)
+    try:
+        url, domain = _site_url(url)
+        key = url_key(url)
+        cached = await LOOKUP_CACHE.aget(HTTP, key)
+        if cached is not MISS:
+            return tuple(cached)
+        if not await _resolves_async(domain):
+            return (False, None, "DNS lookup failed - domain doesn't resolve")
+        response = await _aget(client, url, timeout=timeout, follow_redirects=True, headers=SITE_HEADERS)
+        status = _site_status(response.status_code)
+        await LOOKUP_CACHE.aput(HTTP, key, status, ok=status[0])
+        return status
+    except httpx.TimeoutException:
+        return (False, None, "Request timeout")
+    except httpx.ConnectError:
+        return (False, None, "Connection failed")
+    except Exception as e:
+        return (False, None, f"Error: {str(e)}")
+
+async def check_address_geocode_async(address: str, city: str = None, state: str = None, client=None,
+                                      zip_code: str = None) -> Tuple[Optional[bool], Optional[str]]:
+    return (await check_address_async(address, city, state, zip_code, client))[0]
+
+async def check_address_async(address: str, city: str = None, state: str = None, zip_code: str = None, client=None):
+    if GAZETTEER.engine is None:
+        point = GAZETTEER.lookup(address, city, state, zip_code)
+    else:
+        point = await asyncio.to_thread(GAZETTEER.lookup, address, city, state, zip_code)
+    drop = mail_drop(address) or (CMRA_DETAILS if point["cmra"] else None)
+    if point["status"] != NOT_COVERED:
+        return _gazetteer_status(point), drop
+    if not GAZETTEER.network_fallback():
+        return (None, OUTSIDE_GAZETTEER), drop
+    return await _geocode_network_async(address, city, state, client), drop
+
+async def _geocode_network_async(address: str, city: str = None, state: str = None, client=None) -> Tuple[bool, Optional[str]]:
+    if httpx is None:
+        return await asyncio.to_thread(_geocode_network, address, city, state)
+    key = address_key(address, city, state)
+    cached = await LOOKUP_CACHE.aget(GEOCODE, key)
+    if cached is not MISS:
+        return tuple(cached)
+    try:
+        response = await _aget(
+            client, GEOCODE_URL,
+            params=_geocode_params(address, city, state),
+            headers={"User-Agent": "CityFraudFinder/1.0"},
+            timeout=5
+        )
+        status = _geocode_status(response.status_code, response.json() if response.status_code == 200 else None)
+        if response.status_code == 200:
+            await LOOKUP_CACHE.aput(GEOCODE, key, status, ok=status[0])
+        return status
+    except Exception as e:
+        return (False, f"Geocoding error: {str(e)}")
+
+async def _skip():
+    return None
+
+async def run_validation_checks_async(entity_name: str, address: str = None, city: str = None,
+                                      state: str = None, phone: str = None, website: str = None,
+                                      license_id: str = None, search_web: bool = True, client=None,
+                                      zip_code: str = None) -> Dict[str, Dict]:
+    """Async run_validation_checks: the two web searches, then geocode + site check, run concurrently"""
+    found_website = found_phone = None
+    if search_web:
+        site_results, phone_results = await asyncio.gather(
+            search_web_async(_website_query(entity_name, city, state), 10, client),
+            search_web_async(_phone_query(entity_name, address, city, state), 5, client),
+        )
+        found_website = _pick_website(entity_name, site_results)
+        found_phone = _pick_phone(phone_results)
+        website = found_website or website
+        phone = found_phone or phone
+
+    address_check, site = await asyncio.gather(
+        check_address_async(address, city, state, zip_code, client) if address else _skip(),
+        check_website_exists_async(website, client=client) if website else _skip(),
+    )
+    geocode, drop = address_check or (None, None)
+    return _validation_results(geocode, site, website, phone, found_website, found_phone, license_id, search_web, drop)
+
 def calculate_validation_score(results: Dict[str, Dict]) -> Tuple[float, List[str]]:
     """
     Calculate overall validation score and list red flags
@@ -378,7 +604,8 @@ def calculate_validation_score(results: Dict[str, Dict]) -> Tuple[float, List[st
     if total_weight == 0:
         return (50.0, ["No validation checks completed"])
     
-    final_score = weighted_score / total_weight
+    # Both accumulators are in points (weight * 0-1 quality), so scale the ratio to 0-100
+    final_score = 100.0 * weighted_score / total_weight
     
     return (final_score, red_flags)
 
@@ -0,0 +1,134 @@
+"""
+Streaming exports
+
+Full-city dumps of entities, payments and evidence as CSV or NDJSON. Rows are
+read through a server-side cursor (stream_results + yield_per) and encoded a
+batch at a time, so memory stays flat no matter how many rows are exported and
+the first bytes go out as soon as the first batch is read.
+"""
+
+from __future__ import annotations
+import csv
+import io
+import json
+import zlib
+from typing import Iterator, List, Optional
+from sqlalchemy import select, func
+from db.models import Entity, Payment, EvidenceItem
+
+EXPORT_BATCH = 1000
+EXPORT_KINDS = ("entities", "payments", "evidence")
+EXPORT_FORMATS = ("csv", "ndjson")
+
+def entities_export_query(city_key: str, entity_type: Optional[str] = None):
+    totals = (
+        select(
+            Payment.entity_id,
+            func.sum(Payment.amount).label("total_public_amount"),
+            func.count(Payment.id).label("payment_count"),
+        )
+        .join(Entity, Entity.id == Payment.entity_id)
+        .where(Entity.city_key == city_key)
+        .group_by(Payment.entity_id)
+        .subquery()
+    )
+    q = (
+        select(
+            Entity.id, Entity.name, Entity.entity_type, Entity.address, Entity.city, Entity.state, Entity.zip,
+            Entity.license_status, Entity.license_capacity, Entity.license_id, Entity.npi,
+            Entity.score, Entity.score_notes,
+            func.coalesce(totals.c.total_public_amount, 0.0).label("total_public_amount"),
+            func.coalesce(totals.c.payment_count, 0).label("payment_count"),
+        )
+        .outerjoin(totals, totals.c.entity_id == Entity.id)
+        .where(Entity.city_key == city_key)
+    )
+    if entity_type:
+        q = q.where(Entity.entity_type == entity_type)
+    return q.order_by(Entity.id)
+
+def payments_export_query(city_key: str, entity_type: Optional[str] = None):
+    q = (
+        select(
+            Payment.id, Payment.entity_id, Entity.name.label("entity_name"),
+            Payment.source, Payment.data_source, Payment.category, Payment.tag,
+            Payment.fiscal_year, Payment.amount, Payment.payer, Payment.program,
+            Payment.match_confidence, Payment.match_reason, Payment.created_at,
+        )
+        .join(Entity, Entity.id == Payment.entity_id)
+        .where(Entity.city_key == city_key)
+    )
+    if entity_type:
+        q = q.where(Entity.entity_type == entity_type)
+    return q.order_by(Payment.id)
+
+def evidence_export_query(city_key: str, entity_type: Optional[str] = None):
+    q = (
+        select(
+            EvidenceItem.id, EvidenceItem.entity_id, Entity.name.label("entity_name"),
+            EvidenceItem.evidence_type, EvidenceItem.source, EvidenceItem.category,
+            EvidenceItem.confidence, EvidenceItem.title, EvidenceItem.url,
+            EvidenceItem.extracted_json, EvidenceItem.created_at,
+        )
+        .join(Entity, Entity.id == EvidenceItem.entity_id)
+        .where(Entity.city_key == city_key)
+    )
+    if entity_type:
+        q = q.where(Entity.entity_type == entity_type)
+    return q.order_by(EvidenceItem.id)
+
+EXPORT_QUERIES = {
+    "entities": entities_export_query,
+    "payments": payments_export_query,
+    "evidence": evidence_export_query,
+}
+
+def _cell(v):
+    return v.isoformat() if hasattr(v, "isoformat") else v
+
+def _encode_csv(columns: List[str], rows, header: bool) -> bytes:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    if header:
+        w.writerow(columns)
+    for r in rows:
+        w.writerow(["" if v is None else _cell(v) for v in r])
+    return buf.getvalue().encode("utf-8")
+
+def _encode_ndjson(columns: List[str], rows) -> bytes:
+    return "".join(
+        json.dumps({k: _cell(v) for k, v in zip(columns, r)}, ensure_ascii=False) + "\n" for r in rows
+    ).encode("utf-8")
+
+def gzip_stream(chunks: Iterator[bytes], gzip_output: bool = True) -> Iterator[bytes]:
+    """Pass chunks through, gzip-compressed when gzip_output is set.
+
+    Each chunk is sync-flushed so compressed bytes reach the client right away.
+    """
+    if not gzip_output:
+        yield from chunks
+        return
+    comp = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for data in chunks:
+        yield comp.compress(data) + comp.flush(zlib.Z_SYNC_FLUSH)
+    yield comp.flush()
+
+def stream_export(engine, stmt, fmt: str = "csv", gzip_output: bool = False, batch_size: int = EXPORT_BATCH) -> Iterator[bytes]:
+    """Yield the encoded export of `stmt` batch by batch.
+
+    Opens its own connection so it outlives the request handler that returned
+    the StreamingResponse.
+    """
+    def batches() -> Iterator[bytes]:
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(stmt)
+            columns = list(result.keys())
+            if fmt == "csv":
+                yield _encode_csv(columns, [], header=True)
+            for rows in result.partitions():
+                if fmt == "csv":
+                    yield _encode_csv(columns, rows, header=False)
+                else:
+                    yield _encode_ndjson(columns, rows)
+
+    return gzip_stream(batches(), gzip_output)
@@ -0,0 +1,301 @@
+"""
+Offline address gazetteer
+
+Address points loaded from a local file (a city/state address points CSV, or
+an OSM extract exported to CSV with addr:* columns) go into address_points,
+keyed by normalize_address()d street, house number and zip. Lookups are
+batched index probes, so validating a whole city's addresses takes seconds
+instead of hours of 1 req/s Nominatim calls.
+
+A lookup only judges addresses the gazetteer covers (its zip, or its
+city/state, has points loaded). For those it reports whether the point
+exists, whether only the street does (a non-existent number), or neither,
+and whether the point is a commercial mail receiving agency (CMRA). Anything
+else is left to the network geocoder, if GEOCODE_NETWORK_FALLBACK allows it:
+"auto" (default) falls back only while no points are loaded at all, "1"
+always, "0" never.
+"""
+
+from __future__ import annotations
+import csv
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from sqlalchemy import select, delete, insert, tuple_
+from db.models import AddressPoint, Entity
+from core.utils import normalize_address, best_effort_zip
+
+GEOCODE_NETWORK_FALLBACK = os.getenv("GEOCODE_NETWORK_FALLBACK", "auto")
+
+# Lookup outcomes
+FOUND, NO_SUCH_NUMBER, NO_SUCH_STREET, UNPARSED, NOT_COVERED = "found", "no_such_number", "no_such_street", "unparsed", "not_covered"
+
+# Header names recognised in address point files (matched case-insensitively), per field
+ADDRESS_POINT_COLUMNS = {
+    "number": ("number", "house_number", "housenumber", "addr:housenumber", "street_number", "st_num", "add_number", "address_number"),
+    "street": ("street", "street_name", "streetname", "addr:street", "full_street_name", "st_name"),
+    "address": ("address", "full_address", "fulladdress", "street_address"),
+    "unit": ("unit", "addr:unit", "unit_num", "apt"),
+    "city": ("city", "addr:city", "municipality", "town", "mailing_neighborhood"),
+    "state": ("state", "addr:state"),
+    "zip": ("zip", "zipcode", "zip_code", "postcode", "addr:postcode", "postal_code"),
+    "lat": ("lat", "latitude", "y"),
+    "lon": ("lon", "lng", "long", "longitude", "x"),
+    "cmra": ("cmra", "is_cmra", "commercial_mail"),
+}
+
+COVERAGE_TTL = 60  # seconds; other workers see newly loaded points within this
+CMRA_DETAILS = "Commercial mail receiving agency address (mailbox store)"
+LOAD_CHUNK = 5000
+LOOKUP_CHUNK = 400
+
+_UNIT = re.compile(r"\s+(?:apartment|suite|ste|unit|room|rm|floor|fl|pmb)\s+\S+.*$")
+_NUMBER_STREET = re.compile(r"^(\d+[a-z]?)\s+(?:\d+\s+(?=\D))?(.+)$")  # "10-12 main st" -> 10, main street
+_PMB = re.compile(r"\b(?:pmb|private\s+mail\s*box)\b", re.IGNORECASE)
+_PO_BOX = re.compile(r"\b(?:p\s*o\s*box|post\s+office\s+box)\b")
+
+def split_address(address: Optional[str]) -> Tuple[Optional[str], str, Optional[str]]:
+    """(house number, street, unit) of the street line of an address, normalized."""
+    # Only the street line: "12 Main St, Suite 4, Boston MA" -> "12 Main St"
+    s = normalize_address((address or "").split(",")[0])
+    unit = None
+    m = _UNIT.search(s)
+    if m:
+        unit, s = m.group(0).strip(), s[:m.start()]
+    m = _NUMBER_STREET.match(s)
+    if not m:
+        return None, s, unit
+    return m.group(1), m.group(2).strip(), unit
+
+def mail_drop(address: Optional[str]) -> Optional[str]:
+    """Why the address text is a mail drop rather than a premises, if it is one."""
+    if not address:
+        return None
+    if _PMB.search(address):
+        return "Private mailbox (PMB) at a commercial mail receiving agency"
+    if _PO_BOX.search(normalize_address(address)):
+        return "P.O. Box, not a street address"
+    return None
+
+def _truthy(v) -> bool:
+    return str(v or "").strip().lower() in ("1", "true", "t", "yes", "y")
+
+def _float(v) -> Optional[float]:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+def resolve_columns(fieldnames: Sequence[str], overrides: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Map gazetteer fields to the file's headers: explicit overrides first, then known names."""
+    by_lower = {f.strip().lower(): f for f in fieldnames or []}
+    columns = {k: v for k, v in (overrides or {}).items() if v}
+    for field, names in ADDRESS_POINT_COLUMNS.items():
+        if field not in columns:
+            found = next((by_lower[n] for n in names if n in by_lower), None)
+            if found:
+                columns[field] = found
+    if "street" not in columns and "address" not in columns:
+        raise ValueError("address point file needs a street (plus number) or a full address column")
+    return columns
+
+def _point(row: Dict[str, str], columns: Dict[str, str], source: str, now: datetime) -> Optional[Dict]:
+    get = lambda f: (row.get(columns[f]) or "").strip() if f in columns else ""
+    if "street" in columns:
+        number, street = get("number").lower() or None, normalize_address(get("street"))
+        if number and not street:
+            return None
+        if not number:
+            number, street, _ = split_address(street)
+    else:
+        number, street, _ = split_address(get("address"))
+    if not number or not street:
+        return None
+    return {
+        "source": source,
+        "number": number.split("-")[0].strip(),
+        "street": street,
+        "unit": get("unit") or None,
+        "city": normalize_address(get("city")) or None,
+        "state": normalize_address(get("state")) or None,
+        "zip": best_effort_zip(get("zip")),
+        "lat": _float(get("lat")),
+        "lon": _float(get("lon")),
+        "is_cmra": _truthy(get("cmra")),
+        "created_at": now,
+    }
+
+def load_address_points(session, rows: Iterable[Dict[str, str]], columns: Dict[str, str], source: str,
+                        replace: bool = True) -> Dict[str, int]:
+    """Bulk-load address points (dict rows, e.g. from csv.DictReader). The caller commits."""
+    if replace:
+        session.execute(delete(AddressPoint).where(AddressPoint.source == source))
+    now = datetime.utcnow()
+    loaded = skipped = 0
+    batch: List[Dict] = []
+    for row in rows:
+        p = _point(row, columns, source, now)
+        if p is None:
+            skipped += 1
+            continue
+        batch.append(p)
+        if len(batch) >= LOAD_CHUNK:
+            session.execute(insert(AddressPoint), batch)
+            loaded += len(batch)
+            batch = []
+    if batch:
+        session.execute(insert(AddressPoint), batch)
+        loaded += len(batch)
+    return {"loaded": loaded, "skipped": skipped}
+
+def load_address_points_csv(session, path: str, source: Optional[str] = None,
+                            columns: Optional[Dict[str, str]] = None, replace: bool = True) -> Dict[str, int]:
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        return load_address_points(session, reader, resolve_columns(reader.fieldnames, columns),
+                                   source or os.path.basename(path), replace)
+
+def gazetteer_coverage(session) -> Tuple[Set[str], Set[Tuple[str, str]]]:
+    """Zips and (city, state) pairs that have address points."""
+    zips = {z for (z,) in session.execute(select(AddressPoint.zip).where(AddressPoint.zip.isnot(None)).distinct())}
+    cities = {(c, s or "") for c, s in session.execute(
+        select(AddressPoint.city, AddressPoint.state).where(AddressPoint.city.isnot(None)).distinct()
+    )}
+    return zips, cities
+
+def lookup_addresses(session, items: Sequence[Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]],
+                     coverage: Optional[Tuple[Set[str], Set[Tuple[str, str]]]] = None) -> List[Dict]:
+    """Resolve (address, city, state, zip) tuples against the gazetteer in bulk.
+
+    Each result has status (found, no_such_number, no_such_street, unparsed,
+    not_covered), cmra, and lat/lon for found points.
+    """
+    zips, cities = coverage if coverage is not None else gazetteer_coverage(session)
+    city_names = {c for c, _ in cities}
+    parsed = []
+    for address, city, state, zip_code in items:
+        number, street, unit = split_address(address)
+        zip5 = best_effort_zip(zip_code)
+        place = (normalize_address(city), normalize_address(state))
+        covered = zip5 in zips or (place[0] in city_names and (not place[1] or place in cities or (place[0], "") in cities))
+        parsed.append((number, street, zip5, place, covered))
+
+    # One probe per (street, number) pair, then match zip or city in memory
+    pairs = sorted({(p[1], p[0]) for p in parsed if p[4] and p[0] and p[1]})
+    points: Dict[Tuple[str, str], List] = {}
+    for i in range(0, len(pairs), LOOKUP_CHUNK):
+        for r in session.execute(
+            select(AddressPoint.street, AddressPoint.number, AddressPoint.zip, AddressPoint.city, AddressPoint.state,
+                   AddressPoint.lat, AddressPoint.lon, AddressPoint.is_cmra)
+            .where(tuple_(AddressPoint.street, AddressPoint.number).in_(pairs[i:i + LOOKUP_CHUNK]))
+        ).all():
+            points.setdefault((r.street, r.number), []).append(r)
+
+    def same_place(r, zip5, place) -> bool:
+        if zip5 and r.zip:
+            return r.zip == zip5
+        if place[0] and r.city:
+            return r.city == place[0] and (not place[1] or not r.state or r.state == place[1])
+        return True
+
+    out: List[Optional[Dict]] = [None] * len(parsed)
+    misses = []
+    for i, (number, street, zip5, place, covered) in enumerate(parsed):
+        if not covered:
+            out[i] = {"status": NOT_COVERED, "cmra": False}
+        elif not number or not street:
+            out[i] = {"status": UNPARSED, "cmra": False}
+        else:
+            hits = [r for r in points.get((street, number), ()) if same_place(r, zip5, place)]
+            if hits:
+                out[i] = {"status": FOUND, "cmra": any(r.is_cmra for r in hits), "lat": hits[0].lat, "lon": hits[0].lon}
+            else:
+                misses.append(i)
+
+    # Tell a wrong house number from an unknown street
+    streets = sorted({parsed[i][1] for i in misses})
+    known: Dict[str, List] = {}
+    for j in range(0, len(streets), LOOKUP_CHUNK):
+        for r in session.execute(
+            select(AddressPoint.street, AddressPoint.zip, AddressPoint.city, AddressPoint.state)
+            .where(AddressPoint.street.in_(streets[j:j + LOOKUP_CHUNK])).distinct()
+        ).all():
+            known.setdefault(r.street, []).append(r)
+    for i in misses:
+        _, street, zip5, place, _ = parsed[i]
+        exists = any(same_place(r, zip5, place) for r in known.get(street, ()))
+        out[i] = {"status": NO_SUCH_NUMBER if exists else NO_SUCH_STREET, "cmra": False}
+    return out
+
+class Gazetteer:
+    """Engine-bound gazetteer for callers without a session (entity_validation), with cached coverage."""
+
+    def __init__(self, engine=None):
+        self.engine = engine
+        self._coverage = None
+        self._coverage_at = 0.0
+        self._lock = threading.Lock()
+
+    def bind(self, engine) -> None:
+        self.engine = engine
+        self.invalidate()
+
+    def invalidate(self) -> None:
+        """Forget cached coverage; call after loading points."""
+        with self._lock:
+            self._coverage = None
+
+    def coverage(self) -> Tuple[Set[str], Set[Tuple[str, str]]]:
+        with self._lock:
+            if self._coverage is None or time.monotonic() - self._coverage_at > COVERAGE_TTL:
+                if self.engine is None:
+                    self._coverage = (set(), set())
+                else:
+                    with self.engine.connect() as conn:
+                        self._coverage = gazetteer_coverage(conn)
+                self._coverage_at = time.monotonic()
+            return self._coverage
+
+    @property
+    def loaded(self) -> bool:
+        zips, cities = self.coverage()
+        return bool(zips or cities)
+
+    def network_fallback(self) -> bool:
+        """Whether addresses the gazetteer doesn't cover may go to the network geocoder."""
+        if GEOCODE_NETWORK_FALLBACK == "auto":
+            return not self.loaded
+        return GEOCODE_NETWORK_FALLBACK in ("1", "true", "True")
+
+    def lookup(self, address: str, city: Optional[str] = None, state: Optional[str] = None,
+               zip_code: Optional[str] = None) -> Dict:
+        if not self.loaded:
+            return {"status": NOT_COVERED, "cmra": False}
+        with self.engine.connect() as conn:
+            return lookup_addresses(conn, [(address, city, state, zip_code)], self.coverage())[0]
+
+GAZETTEER = Gazetteer()
+
+def check_entity_addresses(session, city_key: str, entity_type: Optional[str] = None, limit: int = 200) -> Dict:
+    """Run every address of the city's entities through the gazetteer; counts plus the flagged entities."""
+    q = select(Entity.id, Entity.name, Entity.address, Entity.city, Entity.state, Entity.zip).where(
+        Entity.city_key == city_key, Entity.address.isnot(None), Entity.address != "")
+    if entity_type:
+        q = q.where(Entity.entity_type == entity_type)
+    rows = session.execute(q.order_by(Entity.id)).all()
+    coverage = gazetteer_coverage(session)
+    results = lookup_addresses(session, [(r.address, r.city, r.state, r.zip) for r in rows], coverage)
+    counts: Dict[str, int] = {}
+    flagged = []
+    for r, res in zip(rows, results):
+        counts[res["status"]] = counts.get(res["status"], 0) + 1
+        drop = mail_drop(r.address) or (CMRA_DETAILS if res["cmra"] else None)
+        if drop:
+            counts["mail_drop"] = counts.get("mail_drop", 0) + 1
+        if (drop or res["status"] in (NO_SUCH_NUMBER, NO_SUCH_STREET)) and len(flagged) < limit:
+            flagged.append({"entity_id": r.id, "name": r.name, "address": r.address, "status": res["status"],
+                            "mail_drop": drop})
+    return {"checked": len(rows), "counts": counts, "flagged": flagged}
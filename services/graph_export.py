@@ -0,0 +1,189 @@
+"""
+Entity network export
+
+Streams the persisted entity graph (services.entity_graph) for external graph
+tools as a CSV edge list, GraphML or GEXF. Nodes are the entities that have
+at least one edge; edges are the per-signal rows of entity_edges, so a pair
+linked by several signals appears once per signal. Like services.exports,
+nodes and edges are read through server-side cursors and encoded a batch at
+a time, so memory stays flat regardless of graph size.
+"""
+
+from __future__ import annotations
+import csv
+import io
+import re
+from typing import Iterator, Optional
+from xml.sax.saxutils import escape, quoteattr
+from sqlalchemy import select, func
+from sqlalchemy.orm import aliased
+from db.models import Entity, Payment, EntityEdge, EntityComponent
+from services.exports import EXPORT_BATCH, gzip_stream
+
+GRAPH_FORMATS = ("edgelist", "graphml", "gexf")
+GRAPH_MEDIA_TYPES = {"edgelist": "text/csv", "graphml": "application/graphml+xml", "gexf": "application/gexf+xml"}
+GRAPH_EXTENSIONS = {"edgelist": "csv", "graphml": "graphml", "gexf": "gexf"}
+
+# Characters XML 1.0 does not allow, even escaped
+_XML_INVALID = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+def network_nodes_query(city_key: str, entity_type: Optional[str] = None, component_id: Optional[int] = None):
+    totals = (
+        select(Payment.entity_id, func.sum(Payment.amount).label("total_dollars"))
+        .join(EntityComponent, EntityComponent.entity_id == Payment.entity_id)
+        .where(EntityComponent.city_key == city_key)
+        .group_by(Payment.entity_id)
+        .subquery()
+    )
+    q = (
+        select(
+            Entity.id, Entity.name, Entity.entity_type, EntityComponent.component_id, Entity.score,
+            func.coalesce(totals.c.total_dollars, 0.0).label("total_dollars"),
+        )
+        .join(EntityComponent, EntityComponent.entity_id == Entity.id)
+        .outerjoin(totals, totals.c.entity_id == Entity.id)
+        .where(EntityComponent.city_key == city_key)
+    )
+    if entity_type:
+        q = q.where(Entity.entity_type == entity_type)
+    if component_id is not None:
+        q = q.where(EntityComponent.component_id == component_id)
+    return q.order_by(Entity.id)
+
+def network_edges_query(city_key: str, entity_type: Optional[str] = None, component_id: Optional[int] = None,
+                        signal: Optional[str] = None):
+    """Edges whose endpoints both pass the node filters."""
+    comp = aliased(EntityComponent)
+    q = (
+        select(EntityEdge.id, EntityEdge.entity_a, EntityEdge.entity_b, EntityEdge.signal, EntityEdge.weight,
+               EntityEdge.key, comp.component_id)
+        .join(comp, comp.entity_id == EntityEdge.entity_a)
+        .where(EntityEdge.city_key == city_key)
+    )
+    if entity_type:
+        ea, eb = aliased(Entity), aliased(Entity)
+        q = (q.join(ea, ea.id == EntityEdge.entity_a).join(eb, eb.id == EntityEdge.entity_b)
+             .where(ea.entity_type == entity_type, eb.entity_type == entity_type))
+    if component_id is not None:
+        q = q.where(comp.component_id == component_id)
+    if signal:
+        q = q.where(EntityEdge.signal == signal)
+    return q.order_by(EntityEdge.id)
+
+def _x(v) -> str:
+    return _XML_INVALID.sub("", "" if v is None else str(v))
+
+def _num(v) -> str:
+    return repr(float(v or 0.0))
+
+def _edgelist_header() -> bytes:
+    return b"source,target,signal,weight,shared,component_id\r\n"
+
+def _edgelist_edges(rows) -> bytes:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    for r in rows:
+        w.writerow([r.entity_a, r.entity_b, r.signal, r.weight, r.key or "", r.component_id])
+    return buf.getvalue().encode("utf-8")
+
+_GRAPHML_HEAD = """<?xml version="1.0" encoding="UTF-8"?>
+<graphml xmlns="http://graphml.graphdrawing.org/xmlns">
+<key id="name" for="node" attr.name="name" attr.type="string"/>
+<key id="entity_type" for="node" attr.name="entity_type" attr.type="string"/>
+<key id="component_id" for="node" attr.name="component_id" attr.type="long"/>
+<key id="score" for="node" attr.name="score" attr.type="double"/>
+<key id="total_dollars" for="node" attr.name="total_dollars" attr.type="double"/>
+<key id="signal" for="edge" attr.name="signal" attr.type="string"/>
+<key id="weight" for="edge" attr.name="weight" attr.type="double"/>
+<key id="shared" for="edge" attr.name="shared" attr.type="string"/>
+<graph id="{graph_id}" edgedefault="undirected">
+"""
+
+def _graphml_nodes(rows) -> bytes:
+    return "".join(
+        f'<node id="n{r.id}"><data key="name">{escape(_x(r.name))}</data>'
+        f'<data key="entity_type">{escape(_x(r.entity_type))}</data>'
+        f'<data key="component_id">{r.component_id}</data><data key="score">{_num(r.score)}</data>'
+        f'<data key="total_dollars">{_num(r.total_dollars)}</data></node>\n'
+        for r in rows
+    ).encode("utf-8")
+
+def _graphml_edges(rows) -> bytes:
+    return "".join(
+        f'<edge id="e{r.id}" source="n{r.entity_a}" target="n{r.entity_b}">'
+        f'<data key="signal">{escape(_x(r.signal))}</data><data key="weight">{_num(r.weight)}</data>'
+        + (f'<data key="shared">{escape(_x(r.key))}</data>' if r.key else "")
+        + "</edge>\n"
+        for r in rows
+    ).encode("utf-8")
+
+_GEXF_HEAD = """<?xml version="1.0" encoding="UTF-8"?>
+<gexf xmlns="http://gexf.net/1.3" version="1.3">
+<meta><description>{description}</description></meta>
+<graph mode="static" defaultedgetype="undirected">
+<attributes class="node">
+<attribute id="entity_type" title="entity_type" type="string"/>
+<attribute id="component_id" title="component_id" type="long"/>
+<attribute id="score" title="score" type="double"/>
+<attribute id="total_dollars" title="total_dollars" type="double"/>
+</attributes>
+<attributes class="edge">
+<attribute id="signal" title="signal" type="string"/>
+<attribute id="shared" title="shared" type="string"/>
+</attributes>
+<nodes>
+"""
+
+def _gexf_nodes(rows) -> bytes:
+    return "".join(
+        f'<node id="{r.id}" label={quoteattr(_x(r.name))}><attvalues>'
+        f'<attvalue for="entity_type" value={quoteattr(_x(r.entity_type))}/>'
+        f'<attvalue for="component_id" value="{r.component_id}"/>'
+        f'<attvalue for="score" value="{_num(r.score)}"/>'
+        f'<attvalue for="total_dollars" value="{_num(r.total_dollars)}"/></attvalues></node>\n'
+        for r in rows
+    ).encode("utf-8")
+
+def _gexf_edges(rows) -> bytes:
+    return "".join(
+        f'<edge id="{r.id}" source="{r.entity_a}" target="{r.entity_b}" weight="{_num(r.weight)}" label={quoteattr(_x(r.signal))}>'
+        f'<attvalues><attvalue for="signal" value={quoteattr(_x(r.signal))}/>'
+        + (f'<attvalue for="shared" value={quoteattr(_x(r.key))}/>' if r.key else "")
+        + "</attvalues></edge>\n"
+        for r in rows
+    ).encode("utf-8")
+
+def stream_network(engine, city_key: str, fmt: str = "graphml", entity_type: Optional[str] = None,
+                   component_id: Optional[int] = None, signal: Optional[str] = None,
+                   gzip_output: bool = False, batch_size: int = EXPORT_BATCH) -> Iterator[bytes]:
+    """Yield the network export batch by batch (nodes first, then edges).
+
+    Opens its own connection so it outlives the request handler that returned
+    the StreamingResponse.
+    """
+    def batches() -> Iterator[bytes]:
+        with engine.connect() as conn:
+            conn = conn.execution_options(stream_results=True, yield_per=batch_size)
+            if fmt == "edgelist":
+                yield _edgelist_header()
+            else:
+                if fmt == "graphml":
+                    yield _GRAPHML_HEAD.format(graph_id=escape(_x(city_key))).encode("utf-8")
+                else:
+                    yield _GEXF_HEAD.format(description=escape(_x(f"Entity network for {city_key}"))).encode("utf-8")
+                encode = _graphml_nodes if fmt == "graphml" else _gexf_nodes
+                for rows in conn.execute(network_nodes_query(city_key, entity_type, component_id)).partitions():
+                    yield encode(rows)
+                if fmt == "gexf":
+                    yield b"</nodes>\n<edges>\n"
+
+            encode = {"edgelist": _edgelist_edges, "graphml": _graphml_edges, "gexf": _gexf_edges}[fmt]
+            for rows in conn.execute(network_edges_query(city_key, entity_type, component_id, signal)).partitions():
+                yield encode(rows)
+
+            if fmt == "graphml":
+                yield b"</graph>\n</graphml>\n"
+            elif fmt == "gexf":
+                yield b"</edges>\n</graph>\n</gexf>\n"
+
+    return gzip_stream(batches(), gzip_output)
@@ -0,0 +1,194 @@
+"""
+Persistent cache for validation lookups
+
+services.entity_validation consults LOOKUP_CACHE before every web search,
+DNS resolution, website fetch and geocode, so entities sharing an address or
+domain - and repeat validation runs - don't hit the network again. Entries
+are keyed by kind plus a normalized query and live in the lookup_cache table
+with a per-kind TTL; failures (no results, unresolvable host, address not
+found, HTTP errors) are cached too, as negative entries with a shorter TTL.
+Transient errors (timeouts, connection failures, rate-limit responses) are
+not cached. A small in-process LRU sits in front of the table, and
+hit/miss counters are kept per worker.
+
+Until bind(engine) is called (app startup does it) the cache is memory-only.
+"""
+
+from __future__ import annotations
+import asyncio
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse
+from sqlalchemy import select, delete, insert, func, case
+from sqlalchemy.exc import SQLAlchemyError
+from db.models import LookupCacheEntry
+from core.utils import normalize_address
+
+SEARCH, DNS, HTTP, GEOCODE = "search", "dns", "http", "geocode"
+LOOKUP_KINDS = (SEARCH, DNS, HTTP, GEOCODE)
+
+# How long a successful / failed lookup is trusted
+LOOKUP_TTLS = {
+    SEARCH: timedelta(days=7),
+    DNS: timedelta(days=1),
+    HTTP: timedelta(days=1),
+    GEOCODE: timedelta(days=90),
+}
+NEGATIVE_TTLS = {
+    SEARCH: timedelta(days=1),
+    DNS: timedelta(hours=1),
+    HTTP: timedelta(hours=1),
+    GEOCODE: timedelta(days=7),
+}
+MEMORY_SIZE = 4096
+
+MISS = object()  # get() result when nothing usable is cached
+
+def search_key(query: str, max_results: int) -> str:
+    return f"{max_results}:{' '.join((query or '').lower().split())}"
+
+def host_key(host: str) -> str:
+    return (host or "").strip().lower().rstrip(".")
+
+def url_key(url: str) -> str:
+    parsed = urlparse((url or "").strip())
+    path = parsed.path.rstrip("/")
+    return f"{parsed.scheme.lower()}://{parsed.netloc.lower()}{path}" + (f"?{parsed.query}" if parsed.query else "")
+
+def address_key(address: str, city: Optional[str] = None, state: Optional[str] = None) -> str:
+    return "|".join(normalize_address(p) for p in (address, city, state))
+
+class LookupCache:
+    """Thread-safe TTL cache of lookup outcomes, persisted to lookup_cache when bound to an engine."""
+
+    def __init__(self, engine=None, ttls: Optional[Dict[str, timedelta]] = None,
+                 negative_ttls: Optional[Dict[str, timedelta]] = None, memory_size: int = MEMORY_SIZE):
+        self.engine = engine
+        self.ttls = {**LOOKUP_TTLS, **(ttls or {})}
+        self.negative_ttls = {**NEGATIVE_TTLS, **(negative_ttls or {})}
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[Tuple[str, str], Tuple[Any, bool, datetime]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = {kind: {"hits": 0, "negative_hits": 0, "misses": 0, "stores": 0} for kind in LOOKUP_KINDS}
+
+    def bind(self, engine) -> None:
+        self.engine = engine
+
+    def _remember(self, kind: str, key: str, value: Any, ok: bool, expires_at: datetime) -> None:
+        if self.memory_size <= 0:
+            return
+        self._memory[(kind, key)] = (value, ok, expires_at)
+        self._memory.move_to_end((kind, key))
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _count(self, kind: str, ok: Optional[bool]) -> None:
+        counts = self._counts[kind]
+        if ok is None:
+            counts["misses"] += 1
+        else:
+            counts["hits" if ok else "negative_hits"] += 1
+
+    def get(self, kind: str, key: str) -> Any:
+        """The cached value, or MISS if there is none or it has expired."""
+        now = datetime.utcnow()
+        with self._lock:
+            entry = self._memory.get((kind, key))
+            if entry is not None and entry[2] > now:
+                self._memory.move_to_end((kind, key))
+                self._count(kind, entry[1])
+                return entry[0]
+        row = None
+        if self.engine is not None:
+            try:
+                with self.engine.connect() as conn:
+                    row = conn.execute(
+                        select(LookupCacheEntry.value, LookupCacheEntry.ok, LookupCacheEntry.expires_at)
+                        .where(LookupCacheEntry.kind == kind, LookupCacheEntry.key == key,
+                               LookupCacheEntry.expires_at > now)
+                    ).first()
+            except SQLAlchemyError:
+                # A broken cache must never fail a validation; treat it as a miss
+                row = None
+        with self._lock:
+            if row is None:
+                self._count(kind, None)
+                return MISS
+            value = json.loads(row.value)
+            self._remember(kind, key, value, bool(row.ok), row.expires_at)
+            self._count(kind, bool(row.ok))
+            return value
+
+    def put(self, kind: str, key: str, value: Any, ok: bool = True) -> None:
+        """Store a lookup outcome; ok=False stores a negative entry with the shorter TTL."""
+        now = datetime.utcnow()
+        expires_at = now + (self.ttls if ok else self.negative_ttls)[kind]
+        with self._lock:
+            self._remember(kind, key, value, ok, expires_at)
+            self._counts[kind]["stores"] += 1
+        if self.engine is None:
+            return
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(delete(LookupCacheEntry).where(LookupCacheEntry.kind == kind, LookupCacheEntry.key == key))
+                conn.execute(insert(LookupCacheEntry), [{"kind": kind, "key": key, "ok": ok, "value": json.dumps(value),
+                                                         "created_at": now, "expires_at": expires_at}])
+        except SQLAlchemyError:
+            # Lost a race with another worker storing the same key, or the table is unavailable
+            pass
+
+    async def aget(self, kind: str, key: str) -> Any:
+        if self.engine is None:
+            return self.get(kind, key)
+        return await asyncio.to_thread(self.get, kind, key)
+
+    async def aput(self, kind: str, key: str, value: Any, ok: bool = True) -> None:
+        if self.engine is None:
+            return self.put(kind, key, value, ok)
+        await asyncio.to_thread(self.put, kind, key, value, ok)
+
+    def purge(self, kind: Optional[str] = None, expired_only: bool = True) -> int:
+        """Delete expired entries (or all of them), optionally for one kind. Returns rows deleted."""
+        now = datetime.utcnow()
+        with self._lock:
+            for k in [k for k, v in self._memory.items()
+                      if (kind is None or k[0] == kind) and (not expired_only or v[2] <= now)]:
+                del self._memory[k]
+        if self.engine is None:
+            return 0
+        stmt = delete(LookupCacheEntry)
+        if kind:
+            stmt = stmt.where(LookupCacheEntry.kind == kind)
+        if expired_only:
+            stmt = stmt.where(LookupCacheEntry.expires_at <= now)
+        with self.engine.begin() as conn:
+            return conn.execute(stmt).rowcount or 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-kind hit/miss counters for this worker, plus stored entry counts."""
+        with self._lock:
+            out = {"memory_size": len(self._memory), "kinds": {k: dict(v) for k, v in self._counts.items()}}
+        for counts in out["kinds"].values():
+            lookups = counts["hits"] + counts["negative_hits"] + counts["misses"]
+            counts["hit_rate"] = round((counts["hits"] + counts["negative_hits"]) / lookups, 4) if lookups else None
+        if self.engine is not None:
+            now = datetime.utcnow()
+            with self.engine.connect() as conn:
+                rows = conn.execute(
+                    select(
+                        LookupCacheEntry.kind,
+                        func.sum(case((LookupCacheEntry.expires_at > now, 1), else_=0)),
+                        func.sum(case(((LookupCacheEntry.expires_at > now) & (LookupCacheEntry.ok == False), 1), else_=0)),  # noqa: E712
+                        func.sum(case((LookupCacheEntry.expires_at <= now, 1), else_=0)),
+                    ).group_by(LookupCacheEntry.kind)
+                ).all()
+            for kind, live, negative, expired in rows:
+                out["kinds"].setdefault(kind, {}).update(
+                    {"stored": int(live or 0), "stored_negative": int(negative or 0), "expired": int(expired or 0)}
+                )
+        return out
+
+LOOKUP_CACHE = LookupCache()
@@ -1,29 +1,74 @@
 from __future__ import annotations
-from typing import Optional, Tuple
-from sqlalchemy import select
-from db.models import Entity
+from typing import Dict, Optional, Tuple
+from sqlalchemy import select, or_
+from db.models import Entity, Alias
 from core.utils import normalize_name, normalize_address, similarity
+from core.name_keys import name_keys
+
+MATCH_THRESHOLD = 0.72
+# A candidate found by an exact name-key lookup that scores at least this is accepted without the full scan
+# (without a candidate address no entity can score above NO_ADDRESS_MAX, so that is enough then)
+KEY_MATCH_ACCEPT = 0.9
+NO_ADDRESS_MAX = 0.75
+
+def _score(nname: str, naddr: str, ename: Optional[str], eaddr: Optional[str], same_tokens: bool = False) -> Tuple[float, str]:
+    name_sim = 1.0 if same_tokens else similarity(nname, ename or "")
+    addr_sim = similarity(naddr, eaddr or "") if naddr and eaddr else 0.0
+    score = 0.75 * name_sim + 0.25 * addr_sim
+    if naddr and not eaddr:
+        score = 0.85 * name_sim
+    return score, f"name_sim={name_sim:.2f}, addr_sim={addr_sim:.2f}"
+
+def _key_candidates(session, city_key: str, entity_type: str, sorted_key: str, phonetic_key: str) -> Dict[int, Dict]:
+    """Entities whose name or an alias has the same sorted or phonetic key (indexed exact lookups)."""
+    out: Dict[int, Dict] = {}
+    q = select(Entity.id, Entity.normalized_name, Entity.normalized_address, Entity.sorted_key).where(
+        Entity.city_key == city_key, or_(Entity.sorted_key == sorted_key, Entity.phonetic_key == phonetic_key)
+    )
+    aq = (
+        select(Entity.id, Entity.normalized_name, Entity.normalized_address, Alias.normalized_alias, Alias.sorted_key)
+        .join(Alias, Alias.entity_id == Entity.id)
+        .where(Entity.city_key == city_key, or_(Alias.sorted_key == sorted_key, Alias.phonetic_key == phonetic_key))
+    )
+    if entity_type:
+        q = q.where(Entity.entity_type == entity_type)
+        aq = aq.where(Entity.entity_type == entity_type)
+    for r in session.execute(q).all():
+        out[r.id] = {"address": r.normalized_address, "names": [(r.normalized_name, r.sorted_key == sorted_key)]}
+    for r in session.execute(aq).all():
+        c = out.setdefault(r.id, {"address": r.normalized_address, "names": [(r.normalized_name, False)]})
+        c["names"].append((r.normalized_alias, r.sorted_key == sorted_key))
+    return out
 
 def propose_match(session, city_key: str, entity_type: str, candidate_name: str, candidate_address: Optional[str]) -> Tuple[Optional[int], float, str]:
     nname = normalize_name(candidate_name)
     naddr = normalize_address(candidate_address) if candidate_address else ""
 
-    q = select(Entity).where(Entity.city_key == city_key)
+    best_id, best_score, best_reason = None, 0.0, ""
+    # Same tokens in any order, or the same sound, via the indexed name keys first.
+    # A reordered name scores like an exact one, so ties go to the exact normalized name
+    # (which always shares the sorted key, so the full scan can't find a better one)
+    sorted_key, phonetic_key, _ = name_keys(nname)
+    if sorted_key:
+        best_rank = (0.0, False)
+        for eid, c in sorted(_key_candidates(session, city_key, entity_type, sorted_key, phonetic_key).items()):
+            for name, same_tokens in c["names"]:
+                score, reason = _score(nname, naddr, name, c["address"], same_tokens)
+                exact = name == nname
+                if (score, exact) > best_rank:
+                    best_rank, best_score, best_id = (score, exact), score, eid
+                    best_reason = f"{reason}, key={'exact' if exact else 'sorted' if same_tokens else 'phonetic'}"
+        if best_score >= (KEY_MATCH_ACCEPT if naddr else NO_ADDRESS_MAX):
+            return best_id, float(best_score), best_reason
+
+    q = select(Entity.id, Entity.normalized_name, Entity.normalized_address).where(Entity.city_key == city_key)
     if entity_type:
         q = q.where(Entity.entity_type == entity_type)
-    ents = session.execute(q).scalars().all()
-
-    best_id, best_score, best_reason = None, 0.0, ""
-    for e in ents:
-        name_sim = similarity(nname, e.normalized_name or "")
-        addr_sim = similarity(naddr, e.normalized_address or "") if naddr and e.normalized_address else 0.0
-        score = 0.75 * name_sim + 0.25 * addr_sim
-        if naddr and not e.normalized_address:
-            score = 0.85 * name_sim
+    for e in session.execute(q).all():
+        score, reason = _score(nname, naddr, e.normalized_name, e.normalized_address)
         if score > best_score:
-            best_score, best_id = score, e.id
-            best_reason = f"name_sim={name_sim:.2f}, addr_sim={addr_sim:.2f}"
+            best_score, best_id, best_reason = score, e.id, reason
 
-    if best_score < 0.72:
+    if best_score < MATCH_THRESHOLD:
         return None, float(best_score), f"Low confidence ({best_score:.2f}) best={best_reason}"
     return best_id, float(best_score), best_reason
@@ -0,0 +1,189 @@
+"""
+Entity network metrics
+
+Per-component rollups of the persisted entity graph (services.entity_graph):
+size, edge count, total public dollars (members' payments), average score,
+and hotspot members ranked by betweenness centrality, then degree. A city is
+computed in one pass: one GROUP BY per aggregate, one scan of its edges, then
+Brandes' algorithm per component in memory. Results are stored in
+network_metrics tagged with the city's data version, so readers only pay for
+a recomputation after a write.
+
+Betweenness is exact for components of up to BETWEENNESS_EXACT_MAX members;
+larger ones use BETWEENNESS_SAMPLES deterministic source pivots scaled by
+n / samples (Brandes & Pich) and are flagged betweenness_sampled. Degree and
+betweenness are over distinct neighbours, whatever the signal; note that
+star-linked keys (EDGE_FANOUT_CAP) make their hub look central.
+"""
+
+from __future__ import annotations
+import json
+import random
+from collections import deque
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+from sqlalchemy import select, delete, insert, func
+from db.models import Entity, Payment, EntityEdge, EntityComponent, NetworkMetric
+from services.response_cache import get_data_version
+
+BETWEENNESS_EXACT_MAX = 500
+BETWEENNESS_SAMPLES = 64
+HOTSPOTS = 5
+
+METRIC_SORTS = ("total_dollars", "size", "avg_score", "max_degree", "edge_count")
+
+def betweenness(adj: Dict[int, Set[int]], sources: Optional[Iterable[int]] = None, scale: float = 1.0) -> Dict[int, float]:
+    """Brandes betweenness for an unweighted, undirected graph given as adjacency sets.
+
+    With `sources` (a sample of nodes) the partial sums are multiplied by `scale`.
+    """
+    bc = dict.fromkeys(adj, 0.0)
+    for s in (adj if sources is None else sources):
+        order = []
+        preds: Dict[int, List[int]] = {s: []}
+        sigma = {s: 1}
+        dist = {s: 0}
+        queue = deque([s])
+        while queue:
+            v = queue.popleft()
+            order.append(v)
+            dv = dist[v] + 1
+            for w in adj[v]:
+                if w not in dist:
+                    dist[w] = dv
+                    sigma[w] = 0
+                    preds[w] = []
+                    queue.append(w)
+                if dist[w] == dv:
+                    sigma[w] += sigma[v]
+                    preds[w].append(v)
+        delta = dict.fromkeys(order, 0.0)
+        for w in reversed(order):
+            coeff = (1.0 + delta[w]) / sigma[w]
+            for v in preds[w]:
+                delta[v] += sigma[v] * coeff
+            if w != s:
+                bc[w] += delta[w]
+    # Undirected: every shortest path was counted from both ends
+    factor = scale / 2.0
+    return {v: b * factor for v, b in bc.items()}
+
+def compute_network_metrics(session, city_key: str) -> List[Dict]:
+    """Metrics for every component of the city's entity graph."""
+    members: Dict[int, List[int]] = {}
+    for eid, comp in session.execute(
+        select(EntityComponent.entity_id, EntityComponent.component_id).where(EntityComponent.city_key == city_key)
+    ).all():
+        members.setdefault(comp, []).append(eid)
+    if not members:
+        return []
+
+    adj: Dict[int, Set[int]] = {}
+    edge_counts: Dict[int, int] = {}
+    comp_of = {eid: comp for comp, ids in members.items() for eid in ids}
+    for a, b in session.execute(
+        select(EntityEdge.entity_a, EntityEdge.entity_b).where(EntityEdge.city_key == city_key)
+    ).all():
+        comp = comp_of.get(a)
+        if comp is None:
+            continue
+        edge_counts[comp] = edge_counts.get(comp, 0) + 1
+        adj.setdefault(a, set()).add(b)
+        adj.setdefault(b, set()).add(a)
+
+    dollars = dict(session.execute(
+        select(EntityComponent.component_id, func.sum(Payment.amount))
+        .join(Payment, Payment.entity_id == EntityComponent.entity_id)
+        .where(EntityComponent.city_key == city_key)
+        .group_by(EntityComponent.component_id)
+    ).all())
+    scores = dict(session.execute(
+        select(EntityComponent.component_id, func.avg(Entity.score))
+        .join(Entity, Entity.id == EntityComponent.entity_id)
+        .where(EntityComponent.city_key == city_key)
+        .group_by(EntityComponent.component_id)
+    ).all())
+
+    out = []
+    for comp, ids in members.items():
+        sub = {v: adj.get(v, set()) for v in ids}
+        sampled = len(ids) > BETWEENNESS_EXACT_MAX
+        if sampled:
+            sources = random.Random(comp).sample(sorted(ids), BETWEENNESS_SAMPLES)
+            bc = betweenness(sub, sources, scale=len(ids) / BETWEENNESS_SAMPLES)
+        else:
+            bc = betweenness(sub)
+        top = sorted(ids, key=lambda v: (-bc[v], -len(sub[v]), v))[:HOTSPOTS]
+        out.append({
+            "component_id": comp,
+            "size": len(ids),
+            "edge_count": edge_counts.get(comp, 0),
+            "total_dollars": float(dollars.get(comp) or 0.0),
+            "avg_score": float(scores.get(comp) or 0.0),
+            "max_degree": max(len(sub[v]) for v in ids),
+            "betweenness_sampled": sampled,
+            "hotspots": [{"entity_id": v, "degree": len(sub[v]), "betweenness": round(bc[v], 2)} for v in top],
+        })
+
+    hot_ids = sorted({h["entity_id"] for m in out for h in m["hotspots"]})
+    names: Dict[int, str] = {}
+    for i in range(0, len(hot_ids), 500):
+        names.update(session.execute(select(Entity.id, Entity.name).where(Entity.id.in_(hot_ids[i:i + 500]))).all())
+    for m in out:
+        for h in m["hotspots"]:
+            h["name"] = names.get(h["entity_id"])
+    return out
+
+def metrics_stale(session, city_key: str) -> bool:
+    """True if the stored metrics were computed at an older data version (or never).
+
+    Every component gets a row, so a city with no components has nothing to
+    store; its empty result is fresh (and stays so without a recomputation).
+    """
+    stored = session.execute(
+        select(func.min(NetworkMetric.data_version)).where(NetworkMetric.city_key == city_key)
+    ).scalar()
+    if stored is None:
+        return session.execute(
+            select(EntityComponent.entity_id).where(EntityComponent.city_key == city_key).limit(1)
+        ).first() is not None
+    return int(stored) != get_data_version(session, city_key)
+
+def refresh_network_metrics(session, city_key: str) -> int:
+    """Recompute and store the city's network metrics at its current data version. The caller commits."""
+    version = get_data_version(session, city_key)
+    metrics = compute_network_metrics(session, city_key)
+    session.execute(delete(NetworkMetric).where(NetworkMetric.city_key == city_key))
+    now = datetime.utcnow()
+    rows = [{**m, "city_key": city_key, "data_version": version, "hotspots": json.dumps(m["hotspots"]), "computed_at": now}
+            for m in metrics]
+    for i in range(0, len(rows), 1000):
+        session.execute(insert(NetworkMetric), rows[i:i + 1000])
+    return len(rows)
+
+def list_network_metrics(session, city_key: str, sort: str = "total_dollars", min_size: int = 2,
+                         limit: int = 50, offset: int = 0) -> Dict:
+    """Stored network metrics, highest `sort` first."""
+    col = getattr(NetworkMetric, sort)
+    q = select(*NetworkMetric.__table__.c).where(NetworkMetric.city_key == city_key, NetworkMetric.size >= min_size)
+    total = int(session.execute(select(func.count()).select_from(q.subquery())).scalar() or 0)
+    rows = session.execute(
+        q.order_by(col.desc(), NetworkMetric.component_id.asc()).limit(limit).offset(offset)
+    ).all()
+    return {
+        "networks": [
+            {
+                "component_id": r.component_id,
+                "size": r.size,
+                "edge_count": r.edge_count,
+                "total_dollars": float(r.total_dollars or 0.0),
+                "avg_score": round(float(r.avg_score or 0.0), 4),
+                "max_degree": r.max_degree,
+                "betweenness_sampled": bool(r.betweenness_sampled),
+                "hotspots": json.loads(r.hotspots or "[]"),
+                "data_version": r.data_version,
+            }
+            for r in rows
+        ],
+        "total": total,
+    }
@@ -1,5 +1,24 @@
+"""
+Public records (FOIA) request letters
+
+build_request renders one letter from the precompiled TEMPLATE. For batches,
+create_request_drafts selects entities (request_batch_query), loads all
+their aliases in one query per chunk, renders the letters and bulk-inserts
+them as FOIARequest drafts; stream_request_letters then streams those drafts
+as a ZIP (one .txt per letter plus manifest.csv) or as a single merged text
+document, reading them back in chunks through its own connection.
+"""
+
 from __future__ import annotations
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from jinja2 import Template
+from sqlalchemy import select, insert
+from db.models import Entity, Alias, EntityComponent, FOIARequest
 
 TEMPLATE = Template("""Subject: Public records request ({{ city_display }}): payments/contracts for {{ entity_name }}
 
@@ -29,3 +48,134 @@ def build_request(city_display: str, entity_name: str, aliases: str, start_date:
         start_date=start_date,
         end_date=end_date
     )
+
+LETTER_FORMATS = ("zip", "txt")
+LETTER_MEDIA_TYPES = {"zip": "application/zip", "txt": "text/plain; charset=utf-8"}
+BATCH_CHUNK = 500
+PAGE_BREAK = "\f\n"  # between letters in the merged document
+
+def request_period(years_back: int = 2, today: Optional[date] = None) -> Tuple[str, str]:
+    """(start, end) ISO dates: January 1st `years_back` years ago through today."""
+    today = today or date.today()
+    return date(today.year - years_back, 1, 1).isoformat(), today.isoformat()
+
+def aliases_by_entity(session, entity_ids: Iterable[int]) -> Dict[int, List[str]]:
+    ids = list(entity_ids)
+    out: Dict[int, List[str]] = {}
+    for i in range(0, len(ids), BATCH_CHUNK):
+        for eid, alias in session.execute(
+            select(Alias.entity_id, Alias.alias).where(Alias.entity_id.in_(ids[i:i + BATCH_CHUNK])).order_by(Alias.id)
+        ).all():
+            out.setdefault(eid, []).append(alias)
+    return out
+
+def request_batch_query(city_key: str, entity_type: Optional[str] = None, min_score: Optional[float] = None,
+                        component_id: Optional[int] = None, min_network_size: Optional[int] = None, limit: int = 500):
+    """The city's entities to write to, highest score first.
+
+    `component_id` keeps one network of the entity graph; `min_network_size`
+    keeps entities in networks of at least that many members.
+    """
+    q = select(Entity.id, Entity.name).where(Entity.city_key == city_key)
+    if entity_type:
+        q = q.where(Entity.entity_type == entity_type)
+    if min_score is not None:
+        q = q.where(Entity.score >= min_score)
+    if component_id is not None or min_network_size:
+        q = q.join(EntityComponent, EntityComponent.entity_id == Entity.id)
+        if component_id is not None:
+            q = q.where(EntityComponent.component_id == component_id)
+        if min_network_size:
+            q = q.where(EntityComponent.size >= min_network_size)
+    return q.order_by(Entity.score.desc(), Entity.id).limit(limit)
+
+def create_request_drafts(session, city_key: str, city_display: str, stmt, years_back: int = 2) -> List[int]:
+    """Render a letter for every entity `stmt` selects and insert them as FOIARequest drafts.
+
+    Returns the draft ids in selection order. The caller commits.
+    """
+    rows = session.execute(stmt).all()
+    aliases = aliases_by_entity(session, [r.id for r in rows])
+    start, end = request_period(years_back)
+    now = datetime.utcnow()
+    drafts = [
+        {
+            "entity_id": r.id,
+            "city_key": city_key,
+            "status": "draft",
+            "request_text": build_request(city_display, r.name, ", ".join(aliases.get(r.id, ())), start, end),
+            "created_at": now,
+            "updated_at": now,
+        }
+        for r in rows
+    ]
+    ids: List[int] = []
+    for i in range(0, len(drafts), BATCH_CHUNK):
+        ids.extend(session.execute(
+            insert(FOIARequest).returning(FOIARequest.id, sort_by_parameter_order=True), drafts[i:i + BATCH_CHUNK]
+        ).scalars())
+    return ids
+
+def _draft_rows(engine, draft_ids: List[int]) -> Iterator:
+    with engine.connect() as conn:
+        for i in range(0, len(draft_ids), BATCH_CHUNK):
+            chunk = draft_ids[i:i + BATCH_CHUNK]
+            rows = {
+                r.id: r
+                for r in conn.execute(
+                    select(FOIARequest.id, FOIARequest.entity_id, FOIARequest.request_text, Entity.name)
+                    .join(Entity, Entity.id == FOIARequest.entity_id)
+                    .where(FOIARequest.id.in_(chunk))
+                ).all()
+            }
+            for draft_id in chunk:
+                if draft_id in rows:
+                    yield rows[draft_id]
+
+def _slug(name: Optional[str]) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", name or "").strip("_")[:60] or "entity"
+
+class _ZipSink:
+    """Write-only (unseekable) file for zipfile; take() hands over the bytes written since the last call."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts.clear()
+        return data
+
+def _zip_letters(rows: Iterable) -> Iterator[bytes]:
+    sink = _ZipSink()
+    manifest = io.StringIO()
+    w = csv.writer(manifest)
+    w.writerow(["draft_id", "entity_id", "entity_name", "filename"])
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+        for n, r in enumerate(rows, 1):
+            filename = f"{n:04d}_{_slug(r.name)}_{r.entity_id}.txt"
+            zf.writestr(filename, r.request_text or "")
+            w.writerow([r.id, r.entity_id, r.name, filename])
+            yield sink.take()
+        zf.writestr("manifest.csv", manifest.getvalue())
+    yield sink.take()
+
+def _merged_letters(rows: Iterable) -> Iterator[bytes]:
+    for n, r in enumerate(rows):
+        yield ((PAGE_BREAK if n else "") + (r.request_text or "")).encode("utf-8")
+
+def stream_request_letters(engine, draft_ids: List[int], fmt: str = "zip") -> Iterator[bytes]:
+    """Yield the drafts' letters as a ZIP archive or one merged document, letter by letter.
+
+    Opens its own connection so it outlives the request handler that returned
+    the StreamingResponse.
+    """
+    rows = _draft_rows(engine, draft_ids)
+    return _zip_letters(rows) if fmt == "zip" else _merged_letters(rows)
@@ -0,0 +1,186 @@
+"""
+Renormalize stored name/address columns
+
+Recomputes entities.normalized_name / normalized_address and
+aliases.normalized_alias from the raw columns with a core.normalize
+Normalizer (by default the configured one). Run it after changing
+ADDRESS_NORMALIZATION. Only rows whose value changes are written, with the
+batch API over whole columns.
+
+Collisions:
+  entities  a change that would give two entities of the same city and type
+            the same (normalized_name, normalized_address) - the uq_entity
+            key upsert_entity matches on - is not applied; the group is
+            reported so the entities can be reviewed and merged by hand
+  aliases   two aliases of one entity that normalize the same are
+            duplicates by add_alias's rule; the lowest id is kept and the
+            others deleted
+
+Bulk updates skip the ORM events, so the derived name keys
+(core.name_keys) are written alongside; ensure_name_keys backfills them for
+rows stored before the key columns existed.
+
+Rows are first moved to placeholder values and then to their final ones, so
+chains and swaps of keys never trip the unique constraints mid-update.
+Address points keep only normalized streets, so they are renormalized from
+those (exact when moving to a profile that expands more abbreviations).
+"""
+
+from __future__ import annotations
+from typing import Dict, List, Optional, Set, Tuple
+from sqlalchemy import select, update, delete
+from core.normalize import NORMALIZER, Normalizer
+from core.name_keys import name_key_columns
+from db.models import Entity, Alias, AddressPoint
+
+UPDATE_CHUNK = 1000
+COLLISION_SAMPLE = 100
+
+def _placeholder(row_id: int) -> str:
+    return f"\x00renormalize:{row_id}"
+
+def _apply(session, model, column: str, changes: List[Dict]) -> None:
+    for phase in ("placeholder", "final"):
+        for i in range(0, len(changes), UPDATE_CHUNK):
+            chunk = changes[i:i + UPDATE_CHUNK]
+            if phase == "placeholder":
+                chunk = [{"id": c["id"], column: _placeholder(c["id"])} for c in chunk]
+            session.execute(update(model), chunk)
+
+def _entity_changes(session, city_key: str, normalizer: Normalizer) -> Tuple[List[Dict], List[Dict]]:
+    rows = session.execute(
+        select(Entity.id, Entity.entity_type, Entity.name, Entity.address, Entity.normalized_name, Entity.normalized_address)
+        .where(Entity.city_key == city_key).order_by(Entity.id)
+    ).all()
+    names = normalizer.names([r.name for r in rows])
+    addrs = normalizer.addresses([r.address or "" for r in rows])
+    current = {r.id: (r.entity_type, r.normalized_name, r.normalized_address) for r in rows}
+    wanted = {
+        r.id: (r.entity_type, nname, naddr if r.address else None)
+        for r, nname, naddr in zip(rows, names, addrs)
+    }
+    pending = {eid for eid in wanted if wanted[eid] != current[eid]}
+
+    # Hold back changes until no two entities share a key; held-back rows keep their (unique) old key
+    collisions: Dict[Tuple, Set[int]] = {}
+    while True:
+        owners: Dict[Tuple, List[int]] = {}
+        for eid in current:
+            owners.setdefault(wanted[eid] if eid in pending else current[eid], []).append(eid)
+        # Unchanged rows can already share a key with a NULL address (NULLs never clash in uq_entity)
+        clashing = {k: ids for k, ids in owners.items() if len(ids) > 1 and any(eid in pending for eid in ids)}
+        blocked = {eid for ids in clashing.values() for eid in ids if eid in pending}
+        for k, ids in clashing.items():
+            collisions.setdefault(k, set()).update(ids)
+        if not blocked:
+            break
+        pending -= blocked
+
+    changes = [
+        {"id": eid, "normalized_name": wanted[eid][1], "normalized_address": wanted[eid][2], **name_key_columns(wanted[eid][1])}
+        for eid in sorted(pending)
+    ]
+    reported = [
+        {"entity_type": k[0], "normalized_name": k[1], "normalized_address": k[2], "entity_ids": sorted(ids)}
+        for k, ids in collisions.items()
+    ]
+    return changes, reported
+
+def _alias_changes(session, city_key: str, normalizer: Normalizer) -> Tuple[List[Dict], List[int], Set[int]]:
+    rows = session.execute(
+        select(Alias.id, Alias.entity_id, Alias.alias, Alias.normalized_alias)
+        .join(Entity, Entity.id == Alias.entity_id)
+        .where(Entity.city_key == city_key).order_by(Alias.id)
+    ).all()
+    norms = normalizer.names([(r.alias or "").strip() for r in rows])
+    kept: Set[Tuple[int, str]] = set()
+    changes, dropped, entity_ids = [], [], set()
+    for r, norm in zip(rows, norms):
+        if (r.entity_id, norm) in kept:
+            dropped.append(r.id)
+            entity_ids.add(r.entity_id)
+            continue
+        kept.add((r.entity_id, norm))
+        if norm != r.normalized_alias:
+            changes.append({"id": r.id, "normalized_alias": norm, **name_key_columns(norm)})
+            entity_ids.add(r.entity_id)
+    return changes, dropped, entity_ids
+
+def renormalize_city(session, city_key: str, normalizer: Optional[Normalizer] = None, dry_run: bool = False) -> Dict:
+    """Bring the city's normalized entity and alias columns up to `normalizer`. The caller commits.
+
+    Returns counts, the collision groups (first COLLISION_SAMPLE), and the
+    ids of entities whose normalized values were written.
+    """
+    normalizer = normalizer or NORMALIZER
+    entity_changes, collisions = _entity_changes(session, city_key, normalizer)
+    alias_changes, dropped, alias_entities = _alias_changes(session, city_key, normalizer)
+    if not dry_run:
+        for i in range(0, len(dropped), UPDATE_CHUNK):
+            session.execute(delete(Alias).where(Alias.id.in_(dropped[i:i + UPDATE_CHUNK])))
+        # A moved alias may take a key a dropped duplicate held
+        session.flush()
+        _apply(session, Entity, "normalized_name", entity_changes)
+        _apply(session, Alias, "normalized_alias", alias_changes)
+    return {
+        "city_key": city_key,
+        "profile": normalizer.profile,
+        "dry_run": dry_run,
+        "entities_changed": len(entity_changes),
+        "aliases_changed": len(alias_changes),
+        "aliases_dropped": len(dropped),
+        "collision_count": len(collisions),
+        "collisions": collisions[:COLLISION_SAMPLE],
+        "entity_ids": sorted({c["id"] for c in entity_changes} | alias_entities),
+    }
+
+def renormalize_address_points(session, normalizer: Optional[Normalizer] = None, dry_run: bool = False) -> int:
+    """Re-apply the normalizer to stored gazetteer streets/cities/states. Returns rows changed; the caller commits."""
+    normalizer = normalizer or NORMALIZER
+    last, changed = 0, 0
+    while True:
+        rows = session.execute(
+            select(AddressPoint.id, AddressPoint.street, AddressPoint.city, AddressPoint.state)
+            .where(AddressPoint.id > last).order_by(AddressPoint.id).limit(UPDATE_CHUNK * 10)
+        ).all()
+        if not rows:
+            return changed
+        last = rows[-1].id
+        streets = normalizer.addresses([r.street for r in rows])
+        cities = normalizer.addresses([r.city for r in rows])
+        states = normalizer.addresses([r.state for r in rows])
+        updates = [
+            {"id": r.id, "street": s, "city": c or None, "state": st or None}
+            for r, s, c, st in zip(rows, streets, cities, states)
+            if (s, c or None, st or None) != (r.street, r.city, r.state)
+        ]
+        changed += len(updates)
+        if updates and not dry_run:
+            session.execute(update(AddressPoint), updates)
+
+def _backfill_keys(session, model, source) -> Set[int]:
+    """Fill the name keys of rows that have a normalized name but no keys; returns the rows' entity ids."""
+    entity_col = model.id if model is Entity else model.entity_id
+    last, touched = 0, set()
+    while True:
+        rows = session.execute(
+            select(model.id, entity_col.label("entity_id"), source.label("norm"))
+            .where(model.id > last, model.sorted_key.is_(None), source.isnot(None), source != "")
+            .order_by(model.id).limit(UPDATE_CHUNK * 10)
+        ).all()
+        if not rows:
+            return touched
+        last = rows[-1].id
+        session.execute(update(model), [{"id": r.id, **name_key_columns(r.norm)} for r in rows])
+        touched.update(r.entity_id for r in rows)
+
+def ensure_name_keys(session) -> List[str]:
+    """Backfill entity and alias name keys (e.g. databases predating the columns). Returns the cities touched."""
+    ids = _backfill_keys(session, Entity, Entity.normalized_name) | _backfill_keys(session, Alias, Alias.normalized_alias)
+    cities: Set[str] = set()
+    ids = sorted(ids)
+    for i in range(0, len(ids), UPDATE_CHUNK):
+        cities.update(session.execute(
+            select(Entity.city_key).distinct().where(Entity.id.in_(ids[i:i + UPDATE_CHUNK]))
+        ).scalars())
+    return sorted(cities)
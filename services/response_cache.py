@@ -0,0 +1,92 @@
+"""
+Versioned response cache
+
+Every write path bumps a per-city counter in the data_versions table (in the
+same transaction as the write). Read endpoints key their cached responses on
+(endpoint, query params, data version), so a bump invalidates every worker's
+in-process cache at once without any cross-process messaging.
+"""
+
+from __future__ import annotations
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Hashable, Optional
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from db.models import DataVersion
+
+def get_data_version(session, city_key: str) -> int:
+    v = session.execute(select(DataVersion.version).where(DataVersion.city_key == city_key)).scalar_one_or_none()
+    return int(v or 0)
+
+def bump_data_version(session, city_key: str) -> None:
+    """Increment the city's data version. Call before committing a write."""
+    now = datetime.utcnow()
+    result = session.execute(
+        update(DataVersion)
+        .where(DataVersion.city_key == city_key)
+        .values(version=DataVersion.version + 1, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        return
+    try:
+        with session.begin_nested():
+            session.add(DataVersion(city_key=city_key, version=1, updated_at=now))
+    except IntegrityError:
+        # Another worker created the row first; bump that one instead
+        session.execute(
+            update(DataVersion)
+            .where(DataVersion.city_key == city_key)
+            .values(version=DataVersion.version + 1, updated_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+def make_etag(key: Hashable) -> str:
+    return '"' + hashlib.sha1(repr(key).encode("utf-8")).hexdigest() + '"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return any((t[2:] if t.startswith("W/") else t) == etag for t in tags)
+
+class ResponseCache:
+    """Thread-safe LRU of rendered responses."""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
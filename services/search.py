@@ -0,0 +1,233 @@
+"""
+Entity search
+
+One row per entity in entity_search_docs (names + aliases, identifiers,
+address) is the source of truth. It is indexed natively per backend:
+
+- SQLite: two external-content FTS5 tables over the docs table, one with the
+  unicode61 tokenizer and prefix indexes (word / prefix queries) and one with
+  the trigram tokenizer (typo-tolerant candidate generation).
+- PostgreSQL: pg_trgm GIN index on names plus a GIN tsvector expression index.
+
+Ingest paths call index_entities() for the entities they touch.
+"""
+
+from __future__ import annotations
+import re
+from typing import Dict, Iterable, List
+from sqlalchemy import select, text, or_, func
+from db.models import Entity, Alias, Identifier, SearchDoc, dialect_name
+from core.utils import normalize_name, similarity
+
+FTS_TABLE = "entity_search_fts"
+TRGM_TABLE = "entity_search_trgm"
+ID_CHUNK = 500
+FUZZY_CANDIDATES = 200
+FUZZY_MIN_SIMILARITY = 0.5
+
+_TSV_EXPR = "to_tsvector('simple', coalesce(names, '') || ' ' || coalesce(identifiers, '') || ' ' || coalesce(address, ''))"
+
+def ensure_search_schema(engine) -> bool:
+    """Create the backend-specific text indexes. Returns False if unsupported (LIKE fallback)."""
+    try:
+        with engine.begin() as conn:
+            if engine.dialect.name == "sqlite":
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                    "names, identifiers, address, content='entity_search_docs', content_rowid='entity_id', prefix='2 3')"
+                ))
+                conn.execute(text(
+                    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TRGM_TABLE} USING fts5("
+                    "names, content='entity_search_docs', content_rowid='entity_id', tokenize='trigram')"
+                ))
+                return True
+            if engine.dialect.name == "postgresql":
+                conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                conn.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_search_names_trgm ON entity_search_docs USING gin (names gin_trgm_ops)"
+                ))
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_search_tsv ON entity_search_docs USING gin ({_TSV_EXPR})"))
+                return True
+    except Exception as e:
+        print(f"Warning: search index unavailable, falling back to LIKE: {e}")
+    return False
+
+def _has_native_index(session) -> bool:
+    dialect = dialect_name(session)
+    if dialect == "sqlite":
+        return session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type='table' AND name=:n"), {"n": TRGM_TABLE}
+        ).first() is not None
+    return dialect == "postgresql"
+
+def _build_docs(session, ids: List[int]) -> Dict[int, Dict]:
+    docs: Dict[int, Dict] = {}
+    for e in session.execute(
+        select(Entity.id, Entity.city_key, Entity.name, Entity.address, Entity.city, Entity.zip, Entity.license_id, Entity.npi)
+        .where(Entity.id.in_(ids))
+    ).all():
+        docs[e.id] = {
+            "entity_id": e.id, "city_key": e.city_key,
+            "names": [e.name or ""],
+            "identifiers": [v for v in (e.license_id, e.npi) if v],
+            "address": " ".join(v for v in (e.address, e.city, e.zip) if v),
+        }
+    for eid, alias in session.execute(select(Alias.entity_id, Alias.alias).where(Alias.entity_id.in_(ids))).all():
+        if eid in docs and alias and alias not in docs[eid]["names"]:
+            docs[eid]["names"].append(alias)
+    for eid, value in session.execute(select(Identifier.entity_id, Identifier.value).where(Identifier.entity_id.in_(ids))).all():
+        if eid in docs and value and value not in docs[eid]["identifiers"]:
+            docs[eid]["identifiers"].append(value)
+    for d in docs.values():
+        d["names"] = "\n".join(d["names"])
+        d["identifiers"] = " ".join(d["identifiers"])
+    return docs
+
+def index_entities(session, entity_ids: Iterable[int]) -> int:
+    """(Re)index the given entities. Call after flushing their names/aliases/identifiers."""
+    ids = sorted({int(i) for i in entity_ids if i is not None})
+    if not ids:
+        return 0
+    sqlite_fts = dialect_name(session) == "sqlite" and _has_native_index(session)
+    indexed = 0
+    for i in range(0, len(ids), ID_CHUNK):
+        chunk = ids[i:i + ID_CHUNK]
+        docs = _build_docs(session, chunk)
+        old = {d.entity_id: d for d in session.execute(select(SearchDoc).where(SearchDoc.entity_id.in_(chunk))).scalars().all()}
+        if sqlite_fts:
+            # External-content FTS tables must be told the old values before they change
+            for d in old.values():
+                params = {"rowid": d.entity_id, "names": d.names or "", "identifiers": d.identifiers or "", "address": d.address or ""}
+                session.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, names, identifiers, address) VALUES ('delete', :rowid, :names, :identifiers, :address)"), params)
+                session.execute(text(f"INSERT INTO {TRGM_TABLE}({TRGM_TABLE}, rowid, names) VALUES ('delete', :rowid, :names)"), params)
+        for eid, doc in docs.items():
+            row = old.get(eid)
+            if row is None:
+                session.add(SearchDoc(**doc))
+            else:
+                row.city_key, row.names, row.identifiers, row.address = doc["city_key"], doc["names"], doc["identifiers"], doc["address"]
+        session.flush()
+        if sqlite_fts and docs:
+            rows = [{"rowid": d["entity_id"], "names": d["names"], "identifiers": d["identifiers"], "address": d["address"]} for d in docs.values()]
+            session.execute(text(f"INSERT INTO {FTS_TABLE}(rowid, names, identifiers, address) VALUES (:rowid, :names, :identifiers, :address)"), rows)
+            session.execute(text(f"INSERT INTO {TRGM_TABLE}(rowid, names) VALUES (:rowid, :names)"), rows)
+        indexed += len(docs)
+    return indexed
+
+def reindex_city(session, city_key: str) -> int:
+    ids = session.execute(select(Entity.id).where(Entity.city_key == city_key)).scalars().all()
+    return index_entities(session, ids)
+
+def _terms(q: str) -> List[str]:
+    return re.findall(r"\w+", q.lower())
+
+def _identifier_hits(session, city_key: str, q: str) -> List[int]:
+    v = q.strip()
+    if not v:
+        return []
+    values = {v, v.upper()}
+    ids = set(session.execute(
+        select(Identifier.entity_id).join(Entity, Entity.id == Identifier.entity_id)
+        .where(Entity.city_key == city_key, Identifier.value.in_(values))
+    ).scalars().all())
+    ids.update(session.execute(
+        select(Entity.id).where(Entity.city_key == city_key, or_(Entity.npi.in_(values), Entity.license_id.in_(values)))
+    ).scalars().all())
+    return sorted(ids)
+
+def _prefix_hits(session, city_key: str, terms: List[str], limit: int) -> List[int]:
+    if not terms:
+        return []
+    dialect = dialect_name(session)
+    if dialect == "sqlite":
+        match = " ".join(f'"{t}"*' for t in terms)
+        return list(session.execute(text(
+            f"SELECT d.entity_id FROM {FTS_TABLE} f JOIN entity_search_docs d ON d.entity_id = f.rowid "
+            f"WHERE {FTS_TABLE} MATCH :m AND d.city_key = :c ORDER BY bm25({FTS_TABLE}, 10.0, 5.0, 1.0) LIMIT :l"
+        ), {"m": match, "c": city_key, "l": limit}).scalars())
+    tsq = " & ".join(f"{t}:*" for t in terms)
+    return list(session.execute(text(
+        f"SELECT entity_id FROM entity_search_docs WHERE city_key = :c AND {_TSV_EXPR} @@ to_tsquery('simple', :q) "
+        f"ORDER BY ts_rank({_TSV_EXPR}, to_tsquery('simple', :q)) DESC LIMIT :l"
+    ), {"c": city_key, "q": tsq, "l": limit}).scalars())
+
+def _window_similarity(nq: str, name: str) -> float:
+    """Best similarity of nq to a run of as many consecutive words of name as nq has.
+
+    A one-word query with a typo is scored against the closest word, not the
+    whole name, so "smiht" finds "Smith Child Care".
+    """
+    words = name.split()
+    k = len(nq.split())
+    if len(words) <= k:
+        return similarity(nq, name)
+    return max(similarity(nq, " ".join(words[i:i + k])) for i in range(len(words) - k + 1))
+
+def _fuzzy_hits(session, city_key: str, q: str, limit: int) -> List[tuple]:
+    """Typo-tolerant name matches as (entity_id, similarity), best first."""
+    nq = normalize_name(q)
+    if len(nq) < 3:
+        return []
+    dialect = dialect_name(session)
+    if dialect == "sqlite":
+        grams = sorted({g for g in (nq[i:i + 3] for i in range(len(nq) - 2)) if " " not in g})
+        if not grams:
+            return []
+        match = " OR ".join(f'"{g}"' for g in grams)
+        rows = session.execute(text(
+            f"SELECT d.entity_id, d.names FROM {TRGM_TABLE} t JOIN entity_search_docs d ON d.entity_id = t.rowid "
+            f"WHERE {TRGM_TABLE} MATCH :m AND d.city_key = :c ORDER BY rank LIMIT :l"
+        ), {"m": match, "c": city_key, "l": FUZZY_CANDIDATES}).all()
+    else:
+        rows = session.execute(text(
+            "SELECT entity_id, names FROM entity_search_docs WHERE city_key = :c AND :q <% names "
+            "ORDER BY word_similarity(:q, names) DESC LIMIT :l"
+        ), {"c": city_key, "q": nq, "l": FUZZY_CANDIDATES}).all()
+    scored = []
+    for eid, names in rows:
+        best = max((_window_similarity(nq, normalize_name(n)) for n in (names or "").split("\n")), default=0.0)
+        if best >= FUZZY_MIN_SIMILARITY:
+            scored.append((eid, best))
+    scored.sort(key=lambda x: -x[1])
+    return scored[:limit]
+
+def _like_hits(session, city_key: str, terms: List[str], limit: int) -> List[int]:
+    q = select(SearchDoc.entity_id).where(SearchDoc.city_key == city_key)
+    for t in terms:
+        q = q.where(func.lower(SearchDoc.names + " " + SearchDoc.identifiers + " " + SearchDoc.address).like(f"%{t}%"))
+    return list(session.execute(q.limit(limit)).scalars())
+
+def search_entities(session, city_key: str, q: str, limit: int = 20) -> List[Dict]:
+    """Identifier-exact, then prefix/full-text, then typo-tolerant matches, deduplicated."""
+    ranked: List[tuple] = [(eid, "identifier", 1.0) for eid in _identifier_hits(session, city_key, q)]
+    terms = _terms(q)
+    if _has_native_index(session):
+        ranked += [(eid, "text", None) for eid in _prefix_hits(session, city_key, terms, limit)]
+        if len({r[0] for r in ranked}) < limit:
+            ranked += [(eid, "fuzzy", sim) for eid, sim in _fuzzy_hits(session, city_key, q, limit)]
+    else:
+        ranked += [(eid, "text", None) for eid in _like_hits(session, city_key, terms, limit)]
+
+    seen, order = set(), []
+    for eid, kind, sim in ranked:
+        if eid not in seen:
+            seen.add(eid)
+            order.append((eid, kind, sim))
+    order = order[:limit]
+    if not order:
+        return []
+    ents = {e.id: e for e in session.execute(
+        select(Entity.id, Entity.name, Entity.entity_type, Entity.address, Entity.score)
+        .where(Entity.id.in_([o[0] for o in order]))
+    ).all()}
+    out = []
+    for eid, kind, sim in order:
+        e = ents.get(eid)
+        if e is None:
+            continue
+        out.append({
+            "id": e.id, "name": e.name, "type": e.entity_type, "address": e.address,
+            "score": float(e.score or 0.0), "match": kind,
+            "similarity": round(sim, 3) if sim is not None else None,
+        })
+    return out
@@ -0,0 +1,125 @@
+"""
+Per-city source statistics
+
+source_stats holds one row per (city, stat_type, key): payment counts, dollar
+totals and first-seen time by payment source, evidence source, tag and
+data_source. Write paths call refresh_source_stats() with just the keys they
+touched, so each refresh is a small indexed GROUP BY. The dashboard's
+by-source and categories endpoints then read this table and never scan
+payments.
+"""
+
+from __future__ import annotations
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import select, delete, insert, func, or_, literal, exists
+from db.models import Entity, Payment, EvidenceItem, SourceStat
+
+PAYMENT_SOURCE = "payment_source"
+EVIDENCE_SOURCE = "evidence_source"
+TAG = "tag"
+DATA_SOURCE = "data_source"
+
+KEY_CHUNK = 500
+
+def _spec(stat_type: str):
+    """(model, key column, amount expression) for a stat type."""
+    if stat_type == EVIDENCE_SOURCE:
+        return EvidenceItem, EvidenceItem.source, literal(0.0)
+    col = {PAYMENT_SOURCE: Payment.source, TAG: Payment.tag, DATA_SOURCE: Payment.data_source}[stat_type]
+    return Payment, col, func.sum(Payment.amount)
+
+def _key_filter(col, keys: List[Optional[str]]):
+    values = [k for k in keys if k is not None]
+    conds = [col.in_(values)] if values else []
+    if None in keys:
+        conds.append(col.is_(None))
+    return or_(*conds)
+
+def _refresh(session, city_key: str, stat_type: str, keys: Optional[List[Optional[str]]], now: datetime) -> None:
+    model, col, amount = _spec(stat_type)
+    q = (
+        select(col, func.count(model.id), amount, func.min(model.created_at))
+        .where(model.entity_id.in_(select(Entity.id).where(Entity.city_key == city_key)))
+        .group_by(col)
+    )
+    d = delete(SourceStat).where(SourceStat.city_key == city_key, SourceStat.stat_type == stat_type)
+    if keys is not None:
+        q = q.where(_key_filter(col, keys))
+        d = d.where(_key_filter(SourceStat.key, keys))
+    rows = session.execute(q).all()
+    session.execute(d)
+    if rows:
+        session.execute(insert(SourceStat), [
+            {"city_key": city_key, "stat_type": stat_type, "key": key, "row_count": int(n or 0),
+             "total_amount": float(total or 0.0), "first_created": first, "updated_at": now}
+            for key, n, total, first in rows
+        ])
+
+def refresh_source_stats(session, city_key: str, payment_sources: Iterable[Optional[str]] = (),
+                         evidence_sources: Iterable[Optional[str]] = (), tags: Iterable[Optional[str]] = (),
+                         data_sources: Iterable[Optional[str]] = (), full: bool = False) -> None:
+    """Recompute the stats rows for the given keys (or every row of the city with full=True)."""
+    now = datetime.utcnow()
+    if full:
+        for stat_type in (PAYMENT_SOURCE, EVIDENCE_SOURCE, TAG, DATA_SOURCE):
+            _refresh(session, city_key, stat_type, None, now)
+        return
+    for stat_type, keys in ((PAYMENT_SOURCE, payment_sources), (EVIDENCE_SOURCE, evidence_sources),
+                            (TAG, tags), (DATA_SOURCE, data_sources)):
+        keys = sorted(set(keys), key=lambda k: (k is None, k or ""))
+        for i in range(0, len(keys), KEY_CHUNK):
+            _refresh(session, city_key, stat_type, keys[i:i + KEY_CHUNK], now)
+
+def ensure_source_stats(session) -> List[str]:
+    """Build stats for cities that have data but no stats rows yet (e.g. databases predating the table)."""
+    has_stats = exists().where(SourceStat.city_key == Entity.city_key)
+    cities = session.execute(
+        select(Entity.city_key).distinct()
+        .where(~has_stats)
+        .where(or_(
+            exists().where(Payment.entity_id == Entity.id),
+            exists().where(EvidenceItem.entity_id == Entity.id),
+        ))
+    ).scalars().all()
+    for city_key in cities:
+        refresh_source_stats(session, city_key, full=True)
+    return list(cities)
+
+def _stats(session, city_key: str, *stat_types: str):
+    return session.execute(
+        select(SourceStat.stat_type, SourceStat.key, SourceStat.row_count, SourceStat.first_created)
+        .where(SourceStat.city_key == city_key, SourceStat.stat_type.in_(stat_types), SourceStat.row_count > 0)
+    ).all()
+
+def sources_summary(session, city_key: str) -> Dict[str, List[Dict]]:
+    """Payment sources plus uploaded evidence sources, combined by name, oldest first."""
+    all_sources: Dict[Optional[str], Dict] = {}
+    for r in _stats(session, city_key, PAYMENT_SOURCE, EVIDENCE_SOURCE):
+        if r.stat_type == EVIDENCE_SOURCE and not (r.key or "").startswith("uploaded_"):
+            continue
+        s = all_sources.setdefault(r.key, {"source": r.key, "count": 0, "first_created": r.first_created})
+        s["count"] += r.row_count
+        if r.first_created and (not s["first_created"] or r.first_created < s["first_created"]):
+            s["first_created"] = r.first_created
+    sources_list = sorted(all_sources.values(), key=lambda x: x["first_created"] if x["first_created"] else "")
+    return {
+        "sources": [
+            {
+                "source": s["source"],
+                "count": s["count"],
+                "first_created": s["first_created"].isoformat() if s["first_created"] else None
+            }
+            for s in sources_list
+        ]
+    }
+
+def category_summary(session, city_key: str) -> Dict[str, List[str]]:
+    """Distinct non-empty data sources and tags used by the city's payments."""
+    out: Dict[str, List[str]] = {"data_sources": [], "tags": []}
+    for r in _stats(session, city_key, DATA_SOURCE, TAG):
+        if r.key:
+            out["data_sources" if r.stat_type == DATA_SOURCE else "tags"].append(r.key)
+    out["data_sources"].sort()
+    out["tags"].sort()
+    return out
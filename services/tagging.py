@@ -0,0 +1,76 @@
+"""
+Bulk payment tagging
+
+Tag/category changes are single UPDATE statements scoped to the city through
+an entity-id subquery, so no Payment rows (or their raw_json) are loaded into
+Python no matter how many rows match. Tag changes refresh the per-tag rows of
+source_stats for the old and new tags.
+"""
+
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Sequence
+from sqlalchemy import select, update
+from db.models import Entity, Payment
+from core.utils import normalize_fiscal_year
+from services.source_stats import refresh_source_stats
+
+UPDATABLE_COLUMNS = ("tag", "category")
+
+def _fiscal_year_values(session, city_key: str, year: Any) -> List[str]:
+    """Stored fiscal_year strings in the city that normalize to `year` ("FY2024", "2023-24", ...)."""
+    target = normalize_fiscal_year(year)
+    if target is None:
+        return [str(year)]
+    raw = session.execute(
+        select(Payment.fiscal_year).distinct()
+        .where(Payment.entity_id.in_(select(Entity.id).where(Entity.city_key == city_key)))
+        .where(Payment.fiscal_year.isnot(None))
+    ).scalars().all()
+    return [fy for fy in raw if normalize_fiscal_year(fy) == target]
+
+def payment_conditions(session, city_key: str, payment_ids: Optional[Sequence[int]] = None,
+                       source: Optional[str] = None, data_source: Optional[str] = None,
+                       fiscal_year: Any = None, min_amount: Optional[float] = None,
+                       max_amount: Optional[float] = None, entity_type: Optional[str] = None) -> list:
+    """WHERE clauses selecting a city's payments by the given filters (None = no filter)."""
+    entities = select(Entity.id).where(Entity.city_key == city_key)
+    if entity_type:
+        entities = entities.where(Entity.entity_type == entity_type)
+    conds = [Payment.entity_id.in_(entities)]
+    if payment_ids is not None:
+        conds.append(Payment.id.in_(list(payment_ids)))
+    if source is not None:
+        conds.append(Payment.source == source)
+    if data_source is not None:
+        conds.append(Payment.data_source == data_source)
+    if fiscal_year is not None and str(fiscal_year).strip():
+        conds.append(Payment.fiscal_year.in_(_fiscal_year_values(session, city_key, fiscal_year)))
+    if min_amount is not None:
+        conds.append(Payment.amount >= min_amount)
+    if max_amount is not None:
+        conds.append(Payment.amount <= max_amount)
+    return conds
+
+def update_payments(session, city_key: str, values: Dict[str, Any], **filters) -> int:
+    """Set `values` (tag and/or category) on every matching payment; returns the row count.
+
+    `filters` are passed to payment_conditions(). The caller commits (and
+    bumps the city's data version).
+    """
+    bad = set(values) - set(UPDATABLE_COLUMNS)
+    if bad:
+        raise ValueError(f"Cannot bulk-update {', '.join(sorted(bad))}")
+    if not values:
+        return 0
+    conds = payment_conditions(session, city_key, **filters)
+    old_tags = session.execute(select(Payment.tag).distinct().where(*conds)).scalars().all() if "tag" in values else []
+    result = session.execute(
+        update(Payment)
+        .where(*conds)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    updated = int(result.rowcount or 0)
+    if updated and "tag" in values:
+        refresh_source_stats(session, city_key, tags=set(old_tags) | {values["tag"]})
+    return updated
@@ -0,0 +1,151 @@
+from __future__ import annotations
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import select, delete, insert, func
+from db.models import Entity, Payment, PaymentYearTotal
+from core.utils import normalize_fiscal_year
+
+# A year counts as a spike when it is at least SPIKE_MIN_GROWTH times the
+# previous recorded year and the jump is at least SPIKE_MIN_INCREASE dollars.
+SPIKE_MIN_GROWTH = 2.0
+SPIKE_MIN_INCREASE = 50_000.0
+
+# Keep IN (...) lists bounded when refreshing a set of entities
+ID_CHUNK = 500
+
+def _chunks(ids: List[int], size: int = ID_CHUNK):
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+def refresh_payment_year_totals(session, city_key: str, entity_ids: Optional[Iterable[int]] = None) -> int:
+    """Rebuild PaymentYearTotal rows for `entity_ids` (or the whole city when None).
+
+    Fiscal years are grouped as stored, then normalized to integer years here so
+    "FY2024", "2023-24" and "2024" all land in the same bucket.
+    Returns the number of aggregate rows written.
+    """
+    if entity_ids is None:
+        scopes = [None]
+    else:
+        ids = sorted({int(i) for i in entity_ids if i is not None})
+        if not ids:
+            return 0
+        scopes = list(_chunks(ids))
+
+    written = 0
+    now = datetime.utcnow()
+    for scope in scopes:
+        q = (
+            select(Payment.entity_id, Payment.fiscal_year, func.sum(Payment.amount), func.count(Payment.id))
+            .join(Entity, Entity.id == Payment.entity_id)
+            .where(Entity.city_key == city_key)
+            .group_by(Payment.entity_id, Payment.fiscal_year)
+        )
+        d = delete(PaymentYearTotal).where(PaymentYearTotal.city_key == city_key)
+        if scope is not None:
+            q = q.where(Payment.entity_id.in_(scope))
+            d = d.where(PaymentYearTotal.entity_id.in_(scope))
+
+        totals: Dict[tuple, List[float]] = {}
+        for entity_id, fy, amount, count in session.execute(q).all():
+            year = normalize_fiscal_year(fy)
+            if year is None:
+                continue
+            acc = totals.setdefault((entity_id, year), [0.0, 0])
+            acc[0] += float(amount or 0.0)
+            acc[1] += int(count or 0)
+
+        session.execute(d)
+        if totals:
+            session.execute(insert(PaymentYearTotal), [
+                {"city_key": city_key, "entity_id": eid, "fiscal_year": year,
+                 "total_amount": acc[0], "payment_count": acc[1], "updated_at": now}
+                for (eid, year), acc in totals.items()
+            ])
+        written += len(totals)
+    return written
+
+def _yoy_subquery(city_key: str):
+    """Year-over-year view of the aggregate table using LAG() window functions."""
+    order = PaymentYearTotal.fiscal_year
+    part = PaymentYearTotal.entity_id
+    return (
+        select(
+            PaymentYearTotal.entity_id,
+            PaymentYearTotal.fiscal_year,
+            PaymentYearTotal.total_amount,
+            func.lag(PaymentYearTotal.total_amount).over(partition_by=part, order_by=order).label("prev_total"),
+            func.lag(PaymentYearTotal.fiscal_year).over(partition_by=part, order_by=order).label("prev_year"),
+        )
+        .where(PaymentYearTotal.city_key == city_key)
+        .subquery()
+    )
+
+def _spike_query(city_key: str, min_growth: float, min_increase: float):
+    yoy = _yoy_subquery(city_key)
+    growth = (yoy.c.total_amount / yoy.c.prev_total).label("growth")
+    return (
+        select(yoy.c.entity_id, yoy.c.fiscal_year, yoy.c.prev_year, yoy.c.total_amount, yoy.c.prev_total, growth)
+        .where(
+            yoy.c.prev_total > 0,
+            yoy.c.total_amount >= yoy.c.prev_total * min_growth,
+            yoy.c.total_amount - yoy.c.prev_total >= min_increase,
+        )
+    )
+
+def _spike_row(r) -> Dict:
+    return {
+        "entity_id": r.entity_id,
+        "fiscal_year": int(r.fiscal_year),
+        "prev_year": int(r.prev_year),
+        "total_amount": float(r.total_amount),
+        "prev_total": float(r.prev_total),
+        "growth": float(r.growth),
+        "increase": float(r.total_amount - r.prev_total),
+    }
+
+def detect_spikes(session, city_key: str, min_growth: float = SPIKE_MIN_GROWTH, min_increase: float = SPIKE_MIN_INCREASE) -> Dict[int, Dict]:
+    """Largest year-over-year payment spike per entity, computed in one set-based query."""
+    q = _spike_query(city_key, min_growth, min_increase)
+    out: Dict[int, Dict] = {}
+    for r in session.execute(q).all():
+        spike = _spike_row(r)
+        best = out.get(spike["entity_id"])
+        if best is None or spike["growth"] > best["growth"]:
+            out[spike["entity_id"]] = spike
+    return out
+
+def top_spikes(session, city_key: str, limit: int = 50, min_growth: float = SPIKE_MIN_GROWTH, min_increase: float = SPIKE_MIN_INCREASE) -> List[Dict]:
+    """City-wide spikes ordered by growth ratio, with entity names attached."""
+    spikes = _spike_query(city_key, min_growth, min_increase).subquery()
+    rows = session.execute(
+        select(spikes, Entity.name, Entity.entity_type)
+        .join(Entity, Entity.id == spikes.c.entity_id)
+        .order_by(spikes.c.growth.desc(), spikes.c.entity_id)
+        .limit(limit)
+    ).all()
+    out = []
+    for r in rows:
+        spike = _spike_row(r)
+        spike.update({"name": r.name, "type": r.entity_type})
+        out.append(spike)
+    return out
+
+def entity_year_series(session, entity_id: int) -> List[Dict]:
+    """Yearly totals for one entity with growth against the previous recorded year."""
+    rows = session.execute(
+        select(PaymentYearTotal.fiscal_year, PaymentYearTotal.total_amount, PaymentYearTotal.payment_count)
+        .where(PaymentYearTotal.entity_id == entity_id)
+        .order_by(PaymentYearTotal.fiscal_year)
+    ).all()
+    out, prev = [], None
+    for year, total, count in rows:
+        total = float(total or 0.0)
+        out.append({
+            "fiscal_year": int(year),
+            "total_amount": total,
+            "payment_count": int(count or 0),
+            "growth": (total / prev) if prev else None,
+        })
+        prev = total
+    return out
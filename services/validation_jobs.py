@@ -0,0 +1,236 @@
+"""
+Resumable validation jobs
+
+A ValidationJob walks a city's entities by descending (score, id) - riskiest
+first - a batch at a time. Each batch is claimed (next_validation_batch),
+validated off the database (services.validation_runner), then written
+together with the job's keyset checkpoint in one transaction
+(record_validation_batch). A crash loses at most the batch in flight; the
+job resumes from the last checkpoint. Entities validated within the job's
+freshness window are skipped.
+
+Jobs are owned by one worker at a time: the owner refreshes heartbeat_at on
+every claim and record, and claim_validation_job only hands over a running
+job whose heartbeat has gone stale (its worker died). Pausing keeps the
+owner, so the batch in flight is still recorded; the owner lets go then.
+"""
+
+from __future__ import annotations
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import select, update, or_, tuple_
+from db.models import Entity, EntityValidation, ValidationJob
+from services.validation_runner import VALIDATION_CONCURRENCY, store_validation_results
+
+RUNNING, PAUSED, DONE, FAILED = "running", "paused", "done", "failed"
+JOB_STATUSES = (RUNNING, PAUSED, DONE, FAILED)
+
+VALIDATION_FRESHNESS_DAYS = int(os.getenv("VALIDATION_FRESHNESS_DAYS", "30"))
+VALIDATION_BATCH_SIZE = 50
+HEARTBEAT_STALE = timedelta(seconds=int(os.getenv("VALIDATION_JOB_STALE_SECONDS", "300")))
+
+def job_dict(job: ValidationJob) -> Dict:
+    return {
+        "id": job.id,
+        "city_key": job.city_key,
+        "entity_type": job.entity_type,
+        "status": job.status,
+        "max_entities": job.max_entities,
+        "batch_size": job.batch_size,
+        "concurrency": job.concurrency,
+        "freshness_days": job.freshness_days,
+        "search_web": bool(job.search_web),
+        "processed": job.processed,
+        "validated": job.validated,
+        "skipped": job.skipped,
+        "errors": job.errors,
+        "last_error": job.last_error,
+        "checkpoint": [job.cursor_score, job.cursor_id] if job.cursor_id is not None else None,
+        "heartbeat_at": job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+def create_validation_job(session, city_key: str, entity_type: Optional[str] = None, max_entities: Optional[int] = None,
+                          batch_size: int = VALIDATION_BATCH_SIZE, concurrency: int = VALIDATION_CONCURRENCY,
+                          freshness_days: int = VALIDATION_FRESHNESS_DAYS, search_web: bool = True,
+                          owner: Optional[str] = None) -> ValidationJob:
+    now = datetime.utcnow()
+    job = ValidationJob(city_key=city_key, entity_type=entity_type, status=RUNNING, max_entities=max_entities,
+                        batch_size=batch_size, concurrency=concurrency, freshness_days=freshness_days,
+                        search_web=search_web, owner=owner, heartbeat_at=now if owner else None,
+                        created_at=now, updated_at=now)
+    session.add(job)
+    session.flush()
+    return job
+
+def claim_validation_job(session, job_id: int, owner: str, force: bool = False) -> bool:
+    """Take over a running job if nobody else holds a live heartbeat on it (always with force)."""
+    now = datetime.utcnow()
+    q = update(ValidationJob).where(ValidationJob.id == job_id, ValidationJob.status == RUNNING)
+    if not force:
+        q = q.where(or_(ValidationJob.owner.is_(None), ValidationJob.owner == owner,
+                        ValidationJob.heartbeat_at.is_(None), ValidationJob.heartbeat_at < now - HEARTBEAT_STALE))
+    result = session.execute(q.values(owner=owner, heartbeat_at=now).execution_options(synchronize_session=False))
+    return bool(result.rowcount)
+
+def orphaned_validation_jobs(session) -> List[int]:
+    """Running jobs whose owner stopped heartbeating (e.g. the process crashed)."""
+    cutoff = datetime.utcnow() - HEARTBEAT_STALE
+    return list(session.execute(
+        select(ValidationJob.id).where(
+            ValidationJob.status == RUNNING,
+            or_(ValidationJob.heartbeat_at.is_(None), ValidationJob.heartbeat_at < cutoff),
+        ).order_by(ValidationJob.id)
+    ).scalars())
+
+def _owned_job(session, job_id: int, owner: str, statuses=(RUNNING,)) -> Optional[ValidationJob]:
+    job = session.get(ValidationJob, job_id, populate_existing=True)
+    if job is None or job.status not in statuses or job.owner != owner:
+        return None
+    return job
+
+def _finish(job: ValidationJob, status: str, error: Optional[str] = None) -> None:
+    now = datetime.utcnow()
+    job.status = status
+    job.owner = None
+    job.updated_at = job.finished_at = now
+    if error:
+        job.last_error = error[:2000]
+
+def next_validation_batch(session, job_id: int, owner: str) -> Optional[Dict]:
+    """The next entities to validate, from the job's checkpoint.
+
+    Entities validated within the freshness window are skipped (counted and
+    passed over by the cursor). Returns None when the job has stopped, is
+    owned elsewhere, or is finished (then marked done). The caller commits.
+    """
+    job = _owned_job(session, job_id, owner)
+    if job is None:
+        return None
+    job.heartbeat_at = datetime.utcnow()
+    remaining = None if job.max_entities is None else job.max_entities - job.processed
+    cutoff = datetime.utcnow() - timedelta(days=job.freshness_days or 0)
+
+    q = select(Entity.id, Entity.name, Entity.address, Entity.city, Entity.state, Entity.zip,
+               Entity.license_id, Entity.score).where(Entity.city_key == job.city_key)
+    if job.entity_type:
+        q = q.where(Entity.entity_type == job.entity_type)
+
+    cursor = (job.cursor_score, job.cursor_id) if job.cursor_id is not None else None
+    entities: List[Dict] = []
+    skipped = 0
+    while len(entities) < job.batch_size and (remaining is None or remaining > 0):
+        page_q = q
+        if cursor:
+            page_q = page_q.where(tuple_(Entity.score, Entity.id) < tuple_(float(cursor[0]), int(cursor[1])))
+        n = job.batch_size - len(entities)
+        if remaining is not None:
+            n = min(n, remaining)
+        rows = session.execute(page_q.order_by(Entity.score.desc(), Entity.id.desc()).limit(n)).all()
+        if not rows:
+            break
+        fresh = set()
+        if job.freshness_days:
+            fresh = set(session.execute(
+                select(EntityValidation.entity_id).where(
+                    EntityValidation.entity_id.in_([r.id for r in rows]), EntityValidation.validated_at >= cutoff)
+            ).scalars())
+        for r in rows:
+            if r.id in fresh:
+                skipped += 1
+            else:
+                entities.append({k: v for k, v in r._mapping.items() if k != "score"})
+        cursor = (float(r.score or 0.0), r.id)
+        if remaining is not None:
+            remaining -= len(rows)
+
+    if not entities and not skipped:
+        _finish(job, DONE)
+        return None
+    return {"job": job_dict(job), "entities": entities, "skipped": skipped, "cursor": cursor}
+
+def record_validation_batch(session, job_id: int, owner: str, outcomes: List[Dict], skipped: int, cursor) -> Optional[Dict]:
+    """Store a batch's results and advance the job's checkpoint in the same transaction. The caller commits.
+
+    A job paused meanwhile still gets the batch, and is released. Returns
+    None (storing nothing) if the job was taken over or stopped otherwise.
+    """
+    job = _owned_job(session, job_id, owner, (RUNNING, PAUSED))
+    if job is None:
+        return None
+    stored = store_validation_results(session, job.city_key, outcomes, job.id)
+    errors = [o for o in outcomes if "error" in o]
+    job.cursor_score, job.cursor_id = cursor
+    job.processed += len(outcomes) + skipped
+    job.validated += stored
+    job.skipped += skipped
+    job.errors += len(errors)
+    if errors:
+        job.last_error = f"entity {errors[-1]['entity_id']}: {errors[-1]['error']}"[:2000]
+    job.heartbeat_at = job.updated_at = datetime.utcnow()
+    if job.max_entities is not None and job.processed >= job.max_entities:
+        _finish(job, DONE)
+    elif job.status == PAUSED:
+        job.owner = None
+    return job_dict(job)
+
+def fail_validation_job(session, job_id: int, owner: str, error: str) -> None:
+    job = _owned_job(session, job_id, owner)
+    if job is not None:
+        _finish(job, FAILED, error)
+
+def set_validation_job_status(session, job_id: int, status: str) -> Optional[Dict]:
+    """Pause a running job, or set a paused/failed one running again (resumes from its checkpoint).
+
+    A paused job keeps its owner until the batch in flight is recorded.
+    """
+    job = session.get(ValidationJob, job_id)
+    if job is None:
+        return None
+    if status == PAUSED and job.status == RUNNING:
+        job.status = PAUSED
+    elif status == RUNNING and job.status in (PAUSED, FAILED):
+        job.status, job.owner, job.heartbeat_at, job.finished_at = RUNNING, None, None, None
+    job.updated_at = datetime.utcnow()
+    session.flush()
+    return job_dict(job)
+
+def list_validation_jobs(session, city_key: str, limit: int = 20) -> List[Dict]:
+    jobs = session.execute(
+        select(ValidationJob).where(ValidationJob.city_key == city_key).order_by(ValidationJob.id.desc()).limit(limit)
+    ).scalars().all()
+    return [job_dict(j) for j in jobs]
+
+def validation_scores(session, city_key: str, max_score: Optional[float] = None, limit: int = 100,
+                      after=None) -> List[Dict]:
+    """Stored validation scores, lowest (most suspicious) first, keyset-paged on (score, entity_id).
+
+    `after` is a decoded (float, int) cursor, validated by the caller.
+    """
+    q = (
+        select(EntityValidation.entity_id, EntityValidation.validation_score, EntityValidation.red_flag_count,
+               EntityValidation.red_flags, EntityValidation.validated_at, Entity.name, Entity.entity_type, Entity.score)
+        .join(Entity, Entity.id == EntityValidation.entity_id)
+        .where(EntityValidation.city_key == city_key)
+    )
+    if max_score is not None:
+        q = q.where(EntityValidation.validation_score <= max_score)
+    if after:
+        q = q.where(tuple_(EntityValidation.validation_score, EntityValidation.entity_id) > tuple_(*after))
+    rows = session.execute(q.order_by(EntityValidation.validation_score, EntityValidation.entity_id).limit(limit)).all()
+    return [
+        {
+            "entity_id": r.entity_id,
+            "name": r.name,
+            "type": r.entity_type,
+            "validation_score": float(r.validation_score),
+            "red_flag_count": r.red_flag_count,
+            "red_flags": json.loads(r.red_flags or "[]"),
+            "validated_at": r.validated_at.isoformat() if r.validated_at else None,
+            "score": float(r.score or 0.0),
+        }
+        for r in rows
+    ]
@@ -0,0 +1,189 @@
+"""
+Batch entity validation
+
+Runs services.entity_validation's checks for many entities concurrently on
+one event loop. All requests go through a shared RateLimitedClient: one token
+bucket per host (Nominatim's usage policy is 1 req/s; the search page
+throttles aggressive clients too), plus retries with exponential backoff on
+timeouts, connection errors, 429 and 5xx responses (honouring Retry-After).
+Outcomes are written in bulk as EvidenceItems (evidence_type="validation"),
+and each entity's latest score goes to entity_validations.
+
+Endpoints come from entity_validation.SEARCH_URL / GEOCODE_URL
+(VALIDATION_SEARCH_URL / VALIDATION_GEOCODE_URL), so a batch can be run
+against local stub servers.
+"""
+
+from __future__ import annotations
+import asyncio
+import json
+import os
+import random
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+from sqlalchemy import select, insert, delete
+from db.models import Entity, EvidenceItem, EntityValidation
+from services.entity_validation import httpx, run_validation_checks_async, calculate_validation_score
+
+VALIDATION_SOURCE = "entity_validation"
+VALIDATION_CONCURRENCY = int(os.getenv("VALIDATION_CONCURRENCY", "8"))
+DEFAULT_HOST_RATE = float(os.getenv("VALIDATION_HOST_RATE", "5"))  # requests/second for hosts not listed below
+HOST_RATE_LIMITS = {
+    "nominatim.openstreetmap.org": 1.0,
+    "html.duckduckgo.com": 1.0,
+}
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5  # seconds; doubled per attempt, plus jitter
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+INSERT_CHUNK = 1000
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # Waiters queue on the lock, so tokens are handed out first come, first served
+        async with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1.0:
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+                self.tokens = 1.0
+                self.updated = time.monotonic()
+            self.tokens -= 1.0
+
+class RateLimitedClient:
+    """Wraps an httpx.AsyncClient's get() with per-host rate limits and retry/backoff.
+
+    `rates` maps a host (or host:port) to requests/second, overriding
+    HOST_RATE_LIMITS. Stands in for the client in entity_validation's *_async checks.
+    """
+
+    def __init__(self, client, rates: Optional[Dict[str, float]] = None, default_rate: float = DEFAULT_HOST_RATE,
+                 retries: int = MAX_RETRIES, backoff: float = BACKOFF_BASE):
+        self.client = client
+        self.rates = {**HOST_RATE_LIMITS, **(rates or {})}
+        self.default_rate = default_rate
+        self.retries = retries
+        self.backoff = backoff
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+
+    def _bucket(self, url: str) -> TokenBucket:
+        parsed = urlparse(url)
+        host = parsed.netloc.lower()
+        bucket = self.buckets.get(host)
+        if bucket is None:
+            rate = self.rates.get(host, self.rates.get(parsed.hostname or "", self.default_rate))
+            bucket = self.buckets[host] = TokenBucket(rate)
+        return bucket
+
+    def _delay(self, attempt: int, response=None) -> float:
+        if response is not None:
+            try:
+                return float(response.headers.get("retry-after"))
+            except (TypeError, ValueError):
+                pass
+        delay = self.backoff * (2 ** attempt)
+        return delay + random.uniform(0, delay / 4)
+
+    async def get(self, url: str, **kwargs):
+        bucket = self._bucket(url)
+        for attempt in range(self.retries + 1):
+            await bucket.acquire()
+            self.stats["requests"] += 1
+            try:
+                response = await self.client.get(url, **kwargs)
+            except (httpx.TimeoutException, httpx.TransportError):
+                if attempt == self.retries:
+                    self.stats["failures"] += 1
+                    raise
+                response = None
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                    return response
+            self.stats["retries"] += 1
+            await asyncio.sleep(self._delay(attempt, response))
+
+def risky_entities(session, city_key: str, limit: int = 1000, entity_type: Optional[str] = None) -> List[Dict]:
+    """The city's highest-scored entities, in the shape validate_entities expects."""
+    q = select(Entity.id, Entity.name, Entity.address, Entity.city, Entity.state, Entity.zip, Entity.license_id).where(Entity.city_key == city_key)
+    if entity_type:
+        q = q.where(Entity.entity_type == entity_type)
+    rows = session.execute(q.order_by(Entity.score.desc(), Entity.id).limit(limit)).all()
+    return [dict(r._mapping) for r in rows]
+
+async def validate_entities(entities: List[Dict], search_web: bool = True, concurrency: int = VALIDATION_CONCURRENCY,
+                            client=None, rates: Optional[Dict[str, float]] = None) -> Dict:
+    """Validate entities concurrently (at most `concurrency` in flight).
+
+    Each entity dict needs id and name; address, city, state, zip and
+    license_id are optional. Returns {"outcomes": [...], "http": request
+    stats}; an entity whose checks raised gets an "error" instead of results.
+    """
+    own_client = client is None and httpx is not None
+    if own_client:
+        client = httpx.AsyncClient(follow_redirects=True)
+    limited = RateLimitedClient(client, rates) if client is not None else None
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(e: Dict) -> Dict:
+        async with sem:
+            try:
+                results = await run_validation_checks_async(
+                    e["name"], e.get("address"), e.get("city"), e.get("state"),
+                    license_id=e.get("license_id"), search_web=search_web, client=limited, zip_code=e.get("zip"),
+                )
+            except Exception as ex:
+                return {"entity_id": e["id"], "error": str(ex)}
+            score, red_flags = calculate_validation_score(results)
+            return {"entity_id": e["id"], "score": score, "red_flags": red_flags, "results": results,
+                    "checked_at": datetime.utcnow()}
+
+    try:
+        outcomes = await asyncio.gather(*(one(e) for e in entities))
+    finally:
+        if own_client:
+            await client.aclose()
+    return {"outcomes": list(outcomes), "http": dict(limited.stats) if limited else {}}
+
+def store_validation_results(session, city_key: str, outcomes: List[Dict], job_id: Optional[int] = None) -> int:
+    """Insert one validation EvidenceItem per successful outcome and replace the entities' EntityValidation rows.
+
+    The caller refreshes stats and commits.
+    """
+    done = [o for o in outcomes if "error" not in o]
+    rows = [
+        {
+            "entity_id": o["entity_id"],
+            "evidence_type": "validation",
+            "source": VALIDATION_SOURCE,
+            "category": "Payees",
+            "confidence": round(o["score"] / 100.0, 4),
+            "title": f"Validation score {o['score']:.0f}/100",
+            "extracted_json": json.dumps({"validation_score": round(o["score"], 2), "red_flags": o["red_flags"],
+                                          "checks": o["results"]})[:200000],
+            "created_at": o["checked_at"],
+        }
+        for o in done
+    ]
+    for i in range(0, len(rows), INSERT_CHUNK):
+        session.execute(insert(EvidenceItem), rows[i:i + INSERT_CHUNK])
+        ids = [o["entity_id"] for o in done[i:i + INSERT_CHUNK]]
+        session.execute(delete(EntityValidation).where(EntityValidation.entity_id.in_(ids)))
+        session.execute(insert(EntityValidation), [
+            {"entity_id": o["entity_id"], "city_key": city_key, "validation_score": round(o["score"], 2),
+             "red_flag_count": len(o["red_flags"]), "red_flags": json.dumps(o["red_flags"]), "job_id": job_id,
+             "validated_at": o["checked_at"]}
+            for o in done[i:i + INSERT_CHUNK]
+        ])
+    return len(rows)